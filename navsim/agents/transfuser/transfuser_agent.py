@@ -9,7 +9,11 @@ from torch.optim.lr_scheduler import LRScheduler
 from navsim.agents.abstract_agent import AbstractAgent
 from navsim.agents.transfuser.transfuser_callback import TransfuserCallback
 from navsim.agents.transfuser.transfuser_config import TransfuserConfig
-from navsim.agents.transfuser.transfuser_features import TransfuserFeatureBuilder, TransfuserTargetBuilder
+from navsim.agents.transfuser.transfuser_features import (
+    TransfuserFeatureBuilder,
+    TransfuserTargetBuilder,
+    get_camera_decode_hints,
+)
 from navsim.agents.transfuser.transfuser_loss import transfuser_loss
 from navsim.agents.transfuser.transfuser_model import TransfuserModel
 from navsim.common.dataclasses import SensorConfig
@@ -69,6 +73,7 @@ class TransfuserAgent(AbstractAgent):
             cam_r2=False,
             cam_b0=False,
             lidar_pc=history_steps if not self._config.latent else False,
+            camera_decode_hints=get_camera_decode_hints(self._config) if self._config.use_camera_decode_hints else None,
         )
 
     def get_target_builders(self) -> List[AbstractTargetBuilder]:
@@ -33,6 +33,8 @@ class TransfuserConfig:
 
     camera_width: int = 1024
     camera_height: int = 256
+    # if true, cameras are decoded cropped and at the target resolution (faster, slightly different resampling)
+    use_camera_decode_hints: bool = False
     lidar_resolution_width = 256
     lidar_resolution_height = 256
 
@@ -15,12 +15,29 @@ from shapely.geometry import LineString, Polygon
 from torchvision import transforms
 
 from navsim.agents.transfuser.transfuser_config import TransfuserConfig
-from navsim.common.dataclasses import AgentInput, Annotations, Scene
+from navsim.common.dataclasses import AgentInput, Annotations, CameraDecodeHint, Scene
 from navsim.common.enums import BoundingBoxIndex, LidarIndex
 from navsim.planning.scenario_builder.navsim_scenario_utils import tracked_object_types
 from navsim.planning.training.abstract_feature_target_builder import AbstractFeatureBuilder, AbstractTargetBuilder
 
 
+def get_camera_decode_hints(config: TransfuserConfig) -> Dict[str, CameraDecodeHint]:
+    """
+    Decoding hints to load the cropped cameras directly at the resolution of the stitched camera feature.
+    :param config: global config dataclass of TransFuser
+    :return: dictionary of camera identifiers and decoding hints
+    """
+    # crop of 1920x1080 images to a 4:1 panorama of 4096x1024 pixels (l0, f0, r0)
+    scale = config.camera_width / 4096
+    side_crop_box = (416, 28, 1920 - 416, 1080 - 28)
+    front_crop_box = (0, 28, 1920, 1080 - 28)
+    return {
+        "cam_l0": CameraDecodeHint(scale=scale, crop_box=side_crop_box),
+        "cam_f0": CameraDecodeHint(scale=scale, crop_box=front_crop_box),
+        "cam_r0": CameraDecodeHint(scale=scale, crop_box=side_crop_box),
+    }
+
+
 class TransfuserFeatureBuilder(AbstractFeatureBuilder):
     """Input feature builder for TransFuser."""
 
@@ -61,10 +78,14 @@ class TransfuserFeatureBuilder(AbstractFeatureBuilder):
 
         cameras = agent_input.cameras[-1]
 
-        # Crop to ensure 4:1 aspect ratio
-        l0 = cameras.cam_l0.image[28:-28, 416:-416]
-        f0 = cameras.cam_f0.image[28:-28]
-        r0 = cameras.cam_r0.image[28:-28, 416:-416]
+        if self._config.use_camera_decode_hints:
+            # images are already cropped and scaled while decoding, see get_camera_decode_hints
+            l0, f0, r0 = cameras.cam_l0.image, cameras.cam_f0.image, cameras.cam_r0.image
+        else:
+            # Crop to ensure 4:1 aspect ratio
+            l0 = cameras.cam_l0.image[28:-28, 416:-416]
+            f0 = cameras.cam_f0.image[28:-28]
+            r0 = cameras.cam_r0.image[28:-28, 416:-416]
 
         # stitch l0, f0, r0 images
         stitched_image = np.concatenate([l0, f0, r0], axis=1)
@@ -0,0 +1,344 @@
+from __future__ import annotations
+
+import json
+import os
+import pickle
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Union
+
+import numpy as np
+import numpy.typing as npt
+
+COLUMNAR_LOG_VERSION: int = 1
+COLUMNAR_LOG_SUFFIX: str = ".npcol"
+PICKLE_LOG_SUFFIX: str = ".pkl"
+
+_MAGIC: bytes = b"NAVSIMCL"
+_ALIGNMENT: int = 64
+
+# frame entries that are stored per log, as they are constant across frames
+_LOG_KEYS = ["log_name", "map_location"]
+# frame entries stored as one row per frame
+_FRAME_STRING_KEYS = ["token", "scene_token", "lidar_path"]
+_FRAME_ARRAY_KEYS = [
+    "timestamp",
+    "ego2global_translation",
+    "ego2global_rotation",
+    "ego_dynamic_state",
+    "driving_command",
+]
+# annotation entries stored as one row per box, with per-frame offsets
+_ANNOTATION_STRING_KEYS = ["gt_names", "instance_tokens", "track_tokens"]
+_ANNOTATION_ARRAY_KEYS = ["gt_boxes", "gt_velocity_3d"]
+# camera entries stored as one row per frame and camera
+_CAMERA_ARRAY_KEYS = ["sensor2lidar_rotation", "sensor2lidar_translation", "cam_intrinsic", "distortion"]
+
+FRAME_KEYS = _LOG_KEYS + _FRAME_STRING_KEYS + _FRAME_ARRAY_KEYS + ["roadblock_ids", "traffic_lights", "anns", "cams"]
+
+
+def get_log_name_from_path(log_path: Path) -> str:
+    """
+    Extracts the log name from a log file path, independent of the storage format.
+    :param log_path: path to log pickle or columnar log
+    :return: name of the log
+    """
+    for suffix in [PICKLE_LOG_SUFFIX, COLUMNAR_LOG_SUFFIX]:
+        if log_path.name.endswith(suffix):
+            return log_path.name[: -len(suffix)]
+    return log_path.name
+
+
+def load_scene_dict_list(log_path: Path) -> Sequence[Mapping]:
+    """
+    Loads the frames of a log, either from pickle or from the columnar format.
+    :param log_path: path to log pickle or columnar log
+    :return: sequence of frame dictionaries (or read-only views for columnar logs)
+    """
+    if log_path.name.endswith(COLUMNAR_LOG_SUFFIX):
+        return ColumnarLog(log_path)
+    with open(log_path, "rb") as f:
+        return pickle.load(f)
+
+
+def _to_fixed_width_strings(values: List[Optional[str]]) -> npt.NDArray[np.str_]:
+    """Helper function to convert strings to a fixed-width array, None is stored as empty string."""
+    strings = ["" if value is None else str(value) for value in values]
+    max_length = max([len(string) for string in strings], default=0)
+    return np.array(strings, dtype=f"<U{max(max_length, 1)}")
+
+
+def _stack(values: List[Any], shape: Sequence[int], dtype: np.dtype) -> npt.NDArray:
+    """Helper function to stack per-frame arrays, while also supporting empty lists."""
+    if len(values) == 0:
+        return np.zeros((0, *shape), dtype=dtype)
+    return np.stack([np.asarray(value) for value in values])
+
+
+def _offsets(lengths: List[int]) -> npt.NDArray[np.int64]:
+    """Helper function to convert lengths into (n+1) offsets."""
+    return np.concatenate([[0], np.cumsum(lengths, dtype=np.int64)]).astype(np.int64)
+
+
+def _concatenate(values: List[Any], shape: Sequence[int], dtype: Union[np.dtype, str]) -> npt.NDArray:
+    """Helper function to concatenate variable-length per-frame arrays."""
+    values = [np.asarray(value, dtype=dtype).reshape(-1, *shape) for value in values]
+    if len(values) == 0:
+        return np.zeros((0, *shape), dtype=dtype)
+    return np.concatenate(values, axis=0)
+
+
+def convert_scene_dict_list_to_arrays(scene_dict_list: List[Dict[str, Any]]) -> Dict[str, npt.NDArray]:
+    """
+    Converts the frame dictionaries of a log into contiguous arrays, with per-frame offsets for variable-length fields.
+    :param scene_dict_list: list of frame dictionaries of a single log
+    :return: dictionary of array names and arrays
+    """
+    num_frames = len(scene_dict_list)
+    arrays: Dict[str, npt.NDArray] = {}
+
+    for key in _FRAME_STRING_KEYS:
+        arrays[key] = _to_fixed_width_strings([frame[key] for frame in scene_dict_list])
+    for key in _FRAME_ARRAY_KEYS:
+        arrays[key] = _stack([frame[key] for frame in scene_dict_list], (), np.float64)
+
+    # route
+    roadblock_ids = [frame["roadblock_ids"] for frame in scene_dict_list]
+    arrays["roadblock_ids/offsets"] = _offsets([len(ids) for ids in roadblock_ids])
+    arrays["roadblock_ids/values"] = _to_fixed_width_strings([id_ for ids in roadblock_ids for id_ in ids])
+
+    # traffic lights, as (lane_connector_id, is_red)
+    traffic_lights = [frame["traffic_lights"] for frame in scene_dict_list]
+    arrays["traffic_lights/offsets"] = _offsets([len(lights) for lights in traffic_lights])
+    arrays["traffic_lights/lane_connector_ids"] = np.array(
+        [lane_connector_id for lights in traffic_lights for lane_connector_id, _ in lights], dtype=np.int64
+    )
+    arrays["traffic_lights/is_red"] = np.array(
+        [is_red for lights in traffic_lights for _, is_red in lights], dtype=np.bool_
+    )
+
+    # annotations
+    annotations = [frame["anns"] for frame in scene_dict_list]
+    arrays["anns/offsets"] = _offsets([len(anns["gt_names"]) for anns in annotations])
+    for key in _ANNOTATION_STRING_KEYS:
+        arrays[f"anns/{key}"] = _to_fixed_width_strings([value for anns in annotations for value in anns[key]])
+    arrays["anns/gt_boxes"] = _concatenate([anns["gt_boxes"] for anns in annotations], (7,), np.float32)
+    arrays["anns/gt_velocity_3d"] = _concatenate([anns["gt_velocity_3d"] for anns in annotations], (3,), np.float32)
+
+    # cameras, assumes every frame holds the same set of cameras
+    camera_names = list(scene_dict_list[0]["cams"].keys()) if num_frames > 0 else []
+    for camera_name in camera_names:
+        camera_dicts = [frame["cams"][camera_name] for frame in scene_dict_list]
+        arrays[f"cams/{camera_name}/data_path"] = _to_fixed_width_strings(
+            [camera_dict["data_path"] for camera_dict in camera_dicts]
+        )
+        for key in _CAMERA_ARRAY_KEYS:
+            arrays[f"cams/{camera_name}/{key}"] = _stack([camera_dict[key] for camera_dict in camera_dicts], (), None)
+
+    return arrays
+
+
+def save_columnar_log(scene_dict_list: List[Dict[str, Any]], file_path: Path) -> None:
+    """
+    Writes the frames of a log into a single memory-mappable file.
+    Layout: magic, header length (uint64), json header, aligned raw array buffers.
+    :param scene_dict_list: list of frame dictionaries of a single log
+    :param file_path: output file path, should end with COLUMNAR_LOG_SUFFIX
+    """
+    arrays = convert_scene_dict_list_to_arrays(scene_dict_list)
+
+    array_specs: Dict[str, Dict[str, Any]] = {}
+    offset = 0
+    for name, array in arrays.items():
+        assert not array.dtype.hasobject, f"Columnar logs do not support object arrays, got {name}"
+        offset = -(-offset // _ALIGNMENT) * _ALIGNMENT
+        array_specs[name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+        offset += array.nbytes
+
+    header = {
+        "version": COLUMNAR_LOG_VERSION,
+        "num_frames": len(scene_dict_list),
+        "log_name": scene_dict_list[0]["log_name"] if len(scene_dict_list) > 0 else None,
+        "map_location": scene_dict_list[0]["map_location"] if len(scene_dict_list) > 0 else None,
+        "camera_names": list(scene_dict_list[0]["cams"].keys()) if len(scene_dict_list) > 0 else [],
+        "arrays": array_specs,
+    }
+    header_bytes = json.dumps(header).encode("utf-8")
+    data_start = -(-(len(_MAGIC) + 8 + len(header_bytes)) // _ALIGNMENT) * _ALIGNMENT
+
+    tmp_path = file_path.with_name(f"{file_path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(_MAGIC)
+        f.write(np.uint64(len(header_bytes)).tobytes())
+        f.write(header_bytes)
+        for name, array in arrays.items():
+            f.seek(data_start + array_specs[name]["offset"])
+            f.write(np.ascontiguousarray(array).tobytes())
+    os.replace(tmp_path, file_path)
+
+
+class ColumnarLog:
+    """Read-only, memory-mapped view of a log in the columnar format. Behaves like a list of frame dictionaries."""
+
+    def __init__(self, file_path: Path):
+        """
+        Initializes the columnar log, the file is mapped lazily on first access.
+        :param file_path: path to the columnar log file
+        """
+        self._file_path = file_path
+        self._header: Optional[Dict[str, Any]] = None
+        self._data_start: int = 0
+        self._buffer: Optional[np.memmap] = None
+        self._arrays: Dict[str, npt.NDArray] = {}
+
+    def __getstate__(self) -> Dict[str, Any]:
+        """Only pickle the file path, such that memory-mapped data is not copied into workers."""
+        return {"_file_path": self._file_path}
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        """Re-initializes the lazy memory mapping after unpickling."""
+        self.__init__(state["_file_path"])
+
+    def _open(self) -> None:
+        """Helper method to read the header and map the file."""
+        with open(self._file_path, "rb") as f:
+            magic = f.read(len(_MAGIC))
+            assert magic == _MAGIC, f"{self._file_path} is not a columnar NAVSIM log."
+            header_length = int(np.frombuffer(f.read(8), dtype=np.uint64)[0])
+            header = json.loads(f.read(header_length).decode("utf-8"))
+        assert (
+            header["version"] == COLUMNAR_LOG_VERSION
+        ), f"Columnar log version {header['version']} is not supported, expected {COLUMNAR_LOG_VERSION}."
+
+        self._data_start = -(-(len(_MAGIC) + 8 + header_length) // _ALIGNMENT) * _ALIGNMENT
+        self._buffer = np.memmap(self._file_path, dtype=np.uint8, mode="r")
+        self._header = header
+
+    @property
+    def header(self) -> Dict[str, Any]:
+        """
+        :return: metadata of the columnar log.
+        """
+        if self._header is None:
+            self._open()
+        return self._header
+
+    def get_array(self, name: str) -> npt.NDArray:
+        """
+        Returns a read-only view of an array in the mapped file.
+        :param name: name of the array
+        :return: memory-mapped array
+        """
+        if name not in self._arrays:
+            spec = self.header["arrays"][name]
+            dtype, shape = np.dtype(spec["dtype"]), tuple(spec["shape"])
+            if int(np.prod(shape)) == 0:
+                array = np.zeros(shape, dtype=dtype)
+            else:
+                array = np.ndarray(shape, dtype=dtype, buffer=self._buffer, offset=self._data_start + spec["offset"])
+            self._arrays[name] = array
+        return self._arrays[name]
+
+    def get_range(self, name: str, frame_idx: int) -> npt.NDArray:
+        """
+        Returns the rows of a variable-length field for a single frame.
+        :param name: name of the field, with offsets stored as "<name>/offsets"
+        :param frame_idx: index of the frame
+        :return: array slice of the frame
+        """
+        prefix = name.split("/")[0]
+        offsets = self.get_array(f"{prefix}/offsets")
+        return self.get_array(name)[offsets[frame_idx] : offsets[frame_idx + 1]]
+
+    def __len__(self) -> int:
+        """
+        :return: number of frames in the log.
+        """
+        return self.header["num_frames"]
+
+    def __getitem__(self, idx: Union[int, slice]) -> Union[ColumnarFrame, List[ColumnarFrame]]:
+        """
+        :param idx: frame index or slice
+        :return: frame view(s)
+        """
+        if isinstance(idx, slice):
+            return [ColumnarFrame(self, frame_idx) for frame_idx in range(*idx.indices(len(self)))]
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError(f"Frame index {idx} out of range for log with {len(self)} frames.")
+        return ColumnarFrame(self, idx)
+
+    def __iter__(self) -> Iterator[ColumnarFrame]:
+        """
+        :return: iterator over frame views.
+        """
+        for frame_idx in range(len(self)):
+            yield ColumnarFrame(self, frame_idx)
+
+
+class ColumnarFrame(Mapping):
+    """Read-only frame dictionary, which materializes entries from the columnar log on access."""
+
+    def __init__(self, log: ColumnarLog, frame_idx: int):
+        """
+        Initializes the frame view.
+        :param log: columnar log containing the frame
+        :param frame_idx: index of the frame in the log
+        """
+        self._log = log
+        self._frame_idx = frame_idx
+
+    def __getitem__(self, key: str) -> Any:
+        """
+        Materializes a frame entry, in the same format as the log pickles.
+        :param key: frame dictionary key
+        :return: value of the entry
+        """
+        log, idx = self._log, self._frame_idx
+        if key in _LOG_KEYS:
+            return log.header[key]
+        if key == "lidar_path":
+            lidar_path = str(log.get_array(key)[idx])
+            return lidar_path if len(lidar_path) > 0 else None
+        if key in _FRAME_STRING_KEYS:
+            return str(log.get_array(key)[idx])
+        if key == "timestamp":
+            return int(log.get_array(key)[idx])
+        if key in _FRAME_ARRAY_KEYS:
+            return log.get_array(key)[idx]
+        if key == "roadblock_ids":
+            return log.get_range("roadblock_ids/values", idx).tolist()
+        if key == "traffic_lights":
+            lane_connector_ids = log.get_range("traffic_lights/lane_connector_ids", idx).tolist()
+            is_red = log.get_range("traffic_lights/is_red", idx).tolist()
+            return list(zip(lane_connector_ids, is_red))
+        if key == "anns":
+            annotations = {
+                ann_key: log.get_range(f"anns/{ann_key}", idx).tolist() for ann_key in _ANNOTATION_STRING_KEYS
+            }
+            annotations.update(
+                {ann_key: np.array(log.get_range(f"anns/{ann_key}", idx)) for ann_key in _ANNOTATION_ARRAY_KEYS}
+            )
+            return annotations
+        if key == "cams":
+            return {
+                camera_name: {
+                    "data_path": str(log.get_array(f"cams/{camera_name}/data_path")[idx]),
+                    **{cam_key: log.get_array(f"cams/{camera_name}/{cam_key}")[idx] for cam_key in _CAMERA_ARRAY_KEYS},
+                }
+                for camera_name in log.header["camera_names"]
+            }
+        raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        """
+        :return: iterator over available frame keys.
+        """
+        return iter(FRAME_KEYS)
+
+    def __len__(self) -> int:
+        """
+        :return: number of available frame keys.
+        """
+        return len(FRAME_KEYS)
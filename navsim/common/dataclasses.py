@@ -1,33 +1,89 @@
 from __future__ import annotations
 
-import io
 import os
 import pickle
 import warnings
 from dataclasses import asdict, dataclass, fields
+from functools import partial
 from pathlib import Path
-from typing import Any, BinaryIO, Dict, List, Optional, Tuple, Union
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
 
 import numpy as np
 import numpy.typing as npt
 from nuplan.common.actor_state.state_representation import StateSE2
 from nuplan.common.maps.abstract_map import AbstractMap
 from nuplan.common.maps.maps_datatypes import TrafficLightStatuses
-from nuplan.common.maps.nuplan_map.map_factory import get_maps_api
-from nuplan.database.maps_db.gpkg_mapsdb import MAP_LOCATIONS
-from nuplan.database.utils.pointclouds.lidar import LidarPointCloud
 from nuplan.planning.simulation.observation.observation_type import DetectionsTracks
 from nuplan.planning.simulation.trajectory.trajectory_sampling import TrajectorySampling
 from PIL import Image
-from pyquaternion import Quaternion
 
+from navsim.common.lidar_io import load_lidar_points
+from navsim.common.map_registry import NUPLAN_MAP_VERSION, NUPLAN_MAPS_ROOT, get_map_api
+from navsim.common.sensor_cache import SensorBlobCache
 from navsim.planning.simulation.planner.pdm_planner.utils.pdm_geometry_utils import (
     convert_absolute_to_relative_se2_array,
 )
 
 NAVSIM_INTERVAL_LENGTH: float = 0.5
 OPENSCENE_DATA_ROOT = os.environ.get("OPENSCENE_DATA_ROOT")
-NUPLAN_MAPS_ROOT = os.environ.get("NUPLAN_MAPS_ROOT")
+
+
+@dataclass
+class CameraDecodeHint:
+    """Decoding hints of a camera, to only materialize the image region and resolution needed by an agent."""
+
+    # target scale w.r.t. the full image resolution, JPEGs are decoded with reduced size (DCT scaling) if scale <= 0.5
+    scale: float = 1.0
+    # (left, upper, right, lower) in pixels of the full resolution image, applied before scaling
+    crop_box: Optional[Tuple[int, int, int, int]] = None
+    # if true, images are decoded as (h,w) uint8 luminance, otherwise as (h,w,3) uint8 RGB
+    grayscale: bool = False
+
+    def __post_init__(self):
+        assert 0.0 < self.scale <= 1.0, "CameraDecodeHint: scale must be in (0, 1]."
+
+    def load_image(self, image_path: Path) -> npt.NDArray[np.uint8]:
+        """
+        Decodes an image according to the hints.
+        :param image_path: path to the image file
+        :return: decoded image as uint8 array
+        """
+        mode = "L" if self.grayscale else "RGB"
+        with Image.open(image_path) as image:
+            full_width, full_height = image.size
+            crop_box = self.crop_box if self.crop_box is not None else (0, 0, full_width, full_height)
+            target_size = (
+                round((crop_box[2] - crop_box[0]) * self.scale),
+                round((crop_box[3] - crop_box[1]) * self.scale),
+            )
+
+            # reduced-size decoding, only takes effect for JPEGs and never goes below the requested size
+            image.draft(mode, (round(full_width * self.scale), round(full_height * self.scale)))
+            reduction_x, reduction_y = full_width / image.size[0], full_height / image.size[1]
+            image = image.crop(
+                (
+                    round(crop_box[0] / reduction_x),
+                    round(crop_box[1] / reduction_y),
+                    round(crop_box[2] / reduction_x),
+                    round(crop_box[3] / reduction_y),
+                )
+            )
+            if image.size != target_size:
+                image = image.resize(target_size, Image.BILINEAR)
+            return np.asarray(image.convert(mode))
+
+    def transform_intrinsics(self, intrinsics: npt.NDArray[np.float32]) -> npt.NDArray[np.float32]:
+        """
+        Adapts camera intrinsics to the cropped and scaled image.
+        :param intrinsics: (3,3) intrinsics of the full resolution image
+        :return: (3,3) intrinsics of the decoded image
+        """
+        intrinsics = np.array(intrinsics, copy=True)
+        if self.crop_box is not None:
+            intrinsics[0, 2] -= self.crop_box[0]
+            intrinsics[1, 2] -= self.crop_box[1]
+        intrinsics[:2] *= self.scale
+        return intrinsics
 
 
 @dataclass
@@ -57,18 +113,29 @@ class Cameras:
     cam_r2: Camera
     cam_b0: Camera
 
+    @staticmethod
+    def _load_image(image_path: Path, decode_hint: Optional[CameraDecodeHint]) -> npt.NDArray[np.uint8]:
+        """Helper static method to decode an image, optionally according to decoding hints."""
+        if decode_hint is not None:
+            return decode_hint.load_image(image_path)
+        return np.array(Image.open(image_path))
+
     @classmethod
     def from_camera_dict(
         cls,
         sensor_blobs_path: Path,
         camera_dict: Dict[str, Any],
         sensor_names: List[str],
+        decode_hints: Optional[Dict[str, CameraDecodeHint]] = None,
+        sensor_cache: Optional[SensorBlobCache] = None,
     ) -> Cameras:
         """
         Load camera dataclass from dictionary.
         :param sensor_blobs_path: root directory of sensor data.
         :param camera_dict: dictionary containing camera specifications.
         :param sensor_names: list of camera identifiers to include.
+        :param decode_hints: optional dictionary of camera identifiers and decoding hints, defaults to full images.
+        :param sensor_cache: optional cache of decoded images, shared with other scenes (images are read-only).
         :return: Cameras dataclass.
         """
 
@@ -77,11 +144,22 @@ class Cameras:
             camera_identifier = camera_name.lower()
             if camera_identifier in sensor_names:
                 image_path = sensor_blobs_path / camera_dict[camera_name]["data_path"]
+                decode_hint = decode_hints.get(camera_identifier) if decode_hints is not None else None
+                if sensor_cache is not None:
+                    image = sensor_cache.get_or_load(
+                        (image_path, repr(decode_hint)), partial(cls._load_image, image_path, decode_hint)
+                    )
+                else:
+                    image = cls._load_image(image_path, decode_hint)
+                if decode_hint is not None:
+                    intrinsics = decode_hint.transform_intrinsics(camera_dict[camera_name]["cam_intrinsic"])
+                else:
+                    intrinsics = camera_dict[camera_name]["cam_intrinsic"]
                 data_dict[camera_identifier] = Camera(
-                    image=np.array(Image.open(image_path)),
+                    image=image,
                     sensor2lidar_rotation=camera_dict[camera_name]["sensor2lidar_rotation"],
                     sensor2lidar_translation=camera_dict[camera_name]["sensor2lidar_translation"],
-                    intrinsics=camera_dict[camera_name]["cam_intrinsic"],
+                    intrinsics=intrinsics,
                     distortion=camera_dict[camera_name]["distortion"],
                     camera_path=camera_dict[camera_name]["data_path"],
                 )
@@ -110,26 +188,34 @@ class Lidar:
     lidar_pc: Optional[npt.NDArray[np.float32]] = None
     lidar_path: Optional[Path] = None
 
-    @staticmethod
-    def _load_bytes(lidar_path: Path) -> BinaryIO:
-        """Helper static method to load lidar point cloud stream."""
-        with open(lidar_path, "rb") as fp:
-            return io.BytesIO(fp.read())
-
     @classmethod
-    def from_paths(cls, sensor_blobs_path: Path, lidar_path: Path, sensor_names: List[str]) -> Lidar:
+    def from_paths(
+        cls,
+        sensor_blobs_path: Path,
+        lidar_path: Path,
+        sensor_names: List[str],
+        lidar_ids: Optional[List[int]] = None,
+        sensor_cache: Optional[SensorBlobCache] = None,
+    ) -> Lidar:
         """
         Loads lidar point cloud dataclass in log loading.
         :param sensor_blobs_path: root directory to sensor data
         :param lidar_path: relative lidar path from logs.
         :param sensor_names: list of sensor identifiers to load`
+        :param lidar_ids: optional list of lidar identifiers to keep from the merged pc, defaults to all
+        :param sensor_cache: optional cache of decoded point clouds, shared with other scenes (read-only)
         :return: lidar point cloud dataclass
         """
 
-        # NOTE: this could be extended to load specific LiDARs in the merged pc
         if "lidar_pc" in sensor_names:
             global_lidar_path = sensor_blobs_path / lidar_path
-            lidar_pc = LidarPointCloud.from_buffer(cls._load_bytes(global_lidar_path), "pcd").points
+            if sensor_cache is not None:
+                lidar_pc = sensor_cache.get_or_load(
+                    (global_lidar_path, tuple(lidar_ids) if lidar_ids is not None else None),
+                    partial(load_lidar_points, global_lidar_path, lidar_ids),
+                )
+            else:
+                lidar_pc = load_lidar_points(global_lidar_path, lidar_ids)
             return Lidar(lidar_pc, lidar_path)
         return Lidar()  # empty lidar
 
@@ -145,6 +231,47 @@ class EgoStatus:
     in_global_frame: bool = False  # False for AgentInput
 
 
+def get_global_ego_poses(scene_dict_list: Sequence[Dict[str, Any]]) -> npt.NDArray[np.float64]:
+    """
+    Stacks the global ego poses of frames, with the yaw of the ego2global quaternions computed in closed form.
+    :param scene_dict_list: list of scene frames (in logs)
+    :return: array of (x, y, heading) poses, shape (num_frames, 3)
+    """
+    translations = np.array([frame["ego2global_translation"][:2] for frame in scene_dict_list], dtype=np.float64)
+    quaternions = np.array([frame["ego2global_rotation"] for frame in scene_dict_list], dtype=np.float64)
+    quaternions /= np.linalg.norm(quaternions, axis=-1, keepdims=True)
+    w, x, y, z = quaternions.T
+    # same as Quaternion(w, x, y, z).yaw_pitch_roll[0]
+    headings = np.arctan2(2 * (w * z - x * y), 1 - 2 * (y**2 + z**2))
+    return np.column_stack([translations.reshape(-1, 2), headings])
+
+
+def build_ego_statuses(
+    scene_dict_list: Sequence[Dict[str, Any]], ego_poses: npt.NDArray[np.float64], in_global_frame: bool
+) -> List[EgoStatus]:
+    """
+    Builds the ego status of frames, as views into preallocated arrays.
+    :param scene_dict_list: list of scene frames (in logs)
+    :param ego_poses: array of (x, y, heading) poses of the frames
+    :param in_global_frame: whether the poses are in global frame, stored as float64 if so and float32 otherwise
+    :return: list of ego status dataclasses
+    """
+    ego_poses = np.array(ego_poses, dtype=np.float64 if in_global_frame else np.float32)
+    ego_dynamic_states = np.array(
+        [frame["ego_dynamic_state"] for frame in scene_dict_list[: len(ego_poses)]], dtype=np.float32
+    )
+    return [
+        EgoStatus(
+            ego_pose=ego_poses[frame_idx],
+            ego_velocity=ego_dynamic_states[frame_idx, :2],
+            ego_acceleration=ego_dynamic_states[frame_idx, 2:],
+            driving_command=scene_dict_list[frame_idx]["driving_command"],
+            in_global_frame=in_global_frame,
+        )
+        for frame_idx in range(len(ego_poses))
+    ]
+
+
 @dataclass
 class AgentInput:
     """Dataclass for agent inputs with current and past ego statuses and sensors."""
@@ -160,6 +287,7 @@ class AgentInput:
         sensor_blobs_path: Path,
         num_history_frames: int,
         sensor_config: SensorConfig,
+        sensor_cache: Optional[SensorBlobCache] = None,
     ) -> AgentInput:
         """
         Load agent input from scene dictionary.
@@ -167,50 +295,27 @@ class AgentInput:
         :param sensor_blobs_path: root directory of sensor data
         :param num_history_frames: number of agent input frames
         :param sensor_config: sensor config dataclass
+        :param sensor_cache: optional cache of decoded sensor blobs, shared with other scenes
         :return: agent input dataclass
         """
         assert len(scene_dict_list) > 0, "Scene list is empty!"
 
-        global_ego_poses = []
-        for frame_idx in range(num_history_frames):
-            ego_translation = scene_dict_list[frame_idx]["ego2global_translation"]
-            ego_quaternion = Quaternion(*scene_dict_list[frame_idx]["ego2global_rotation"])
-            global_ego_pose = np.array(
-                [
-                    ego_translation[0],
-                    ego_translation[1],
-                    ego_quaternion.yaw_pitch_roll[0],
-                ],
-                dtype=np.float64,
-            )
-            global_ego_poses.append(global_ego_pose)
+        global_ego_poses = get_global_ego_poses(scene_dict_list[:num_history_frames])
+        local_ego_poses = convert_absolute_to_relative_se2_array(StateSE2(*global_ego_poses[-1]), global_ego_poses)
+        ego_statuses = build_ego_statuses(scene_dict_list, local_ego_poses, in_global_frame=False)
 
-        local_ego_poses = convert_absolute_to_relative_se2_array(
-            StateSE2(*global_ego_poses[-1]),
-            np.array(global_ego_poses, dtype=np.float64),
-        )
-
-        ego_statuses: List[EgoStatus] = []
         cameras: List[EgoStatus] = []
         lidars: List[Lidar] = []
 
         for frame_idx in range(num_history_frames):
-
-            ego_dynamic_state = scene_dict_list[frame_idx]["ego_dynamic_state"]
-            ego_status = EgoStatus(
-                ego_pose=np.array(local_ego_poses[frame_idx], dtype=np.float32),
-                ego_velocity=np.array(ego_dynamic_state[:2], dtype=np.float32),
-                ego_acceleration=np.array(ego_dynamic_state[2:], dtype=np.float32),
-                driving_command=scene_dict_list[frame_idx]["driving_command"],
-            )
-            ego_statuses.append(ego_status)
-
             sensor_names = sensor_config.get_sensors_at_iteration(frame_idx)
             cameras.append(
                 Cameras.from_camera_dict(
                     sensor_blobs_path=sensor_blobs_path,
                     camera_dict=scene_dict_list[frame_idx]["cams"],
                     sensor_names=sensor_names,
+                    decode_hints=sensor_config.camera_decode_hints,
+                    sensor_cache=sensor_cache,
                 )
             )
 
@@ -219,6 +324,8 @@ class AgentInput:
                     sensor_blobs_path=sensor_blobs_path,
                     lidar_path=Path(scene_dict_list[frame_idx]["lidar_path"]) if scene_dict_list[frame_idx]["lidar_path"] is not None else None,
                     sensor_names=sensor_names,
+                    lidar_ids=sensor_config.lidar_ids,
+                    sensor_cache=sensor_cache,
                 )
             )
 
@@ -437,8 +544,7 @@ class Scene:
     @classmethod
     def _build_map_api(cls, map_name: str) -> AbstractMap:
         """Helper classmethod to load map api from name."""
-        assert map_name in MAP_LOCATIONS, f"The map name {map_name} is invalid, must be in {MAP_LOCATIONS}"
-        return get_maps_api(NUPLAN_MAPS_ROOT, "nuplan-maps-v1.0", map_name)
+        return get_map_api(NUPLAN_MAPS_ROOT, NUPLAN_MAP_VERSION, map_name)
 
     @classmethod
     def _build_annotations(cls, scene_frame: Dict) -> Annotations:
@@ -452,22 +558,9 @@ class Scene:
         )
 
     @classmethod
-    def _build_ego_status(cls, scene_frame: Dict) -> EgoStatus:
-        """Helper classmethod to load ego status dataclass from logs."""
-        ego_translation = scene_frame["ego2global_translation"]
-        ego_quaternion = Quaternion(*scene_frame["ego2global_rotation"])
-        global_ego_pose = np.array(
-            [ego_translation[0], ego_translation[1], ego_quaternion.yaw_pitch_roll[0]],
-            dtype=np.float64,
-        )
-        ego_dynamic_state = scene_frame["ego_dynamic_state"]
-        return EgoStatus(
-            ego_pose=global_ego_pose,
-            ego_velocity=np.array(ego_dynamic_state[:2], dtype=np.float32),
-            ego_acceleration=np.array(ego_dynamic_state[2:], dtype=np.float32),
-            driving_command=scene_frame["driving_command"],
-            in_global_frame=True,
-        )
+    def _build_ego_statuses(cls, scene_dict_list: List[Dict]) -> List[EgoStatus]:
+        """Helper classmethod to load ego status dataclasses of all frames from logs."""
+        return build_ego_statuses(scene_dict_list, get_global_ego_poses(scene_dict_list), in_global_frame=True)
 
     @classmethod
     def from_scene_dict_list(
@@ -477,6 +570,7 @@ class Scene:
         num_history_frames: int,
         num_future_frames: int,
         sensor_config: SensorConfig,
+        sensor_cache: Optional[SensorBlobCache] = None,
     ) -> Scene:
         """
         Load scene dataclass from scene dictionary list (for log loading).
@@ -485,6 +579,7 @@ class Scene:
         :param num_history_frames: number of past and current frames to load
         :param num_future_frames: number of future frames to load
         :param sensor_config: sensor config dataclass
+        :param sensor_cache: optional cache of decoded sensor blobs, shared with other scenes
         :return: scene dataclass
         """
         assert len(scene_dict_list) >= 0, "Scene list is empty!"
@@ -498,9 +593,11 @@ class Scene:
         )
         map_api = cls._build_map_api(scene_metadata.map_name)
 
+        global_ego_statuses = cls._build_ego_statuses(scene_dict_list)
+
         frames: List[Frame] = []
         for frame_idx in range(len(scene_dict_list)):
-            global_ego_status = cls._build_ego_status(scene_dict_list[frame_idx])
+            global_ego_status = global_ego_statuses[frame_idx]
             annotations = cls._build_annotations(scene_dict_list[frame_idx])
 
             sensor_names = sensor_config.get_sensors_at_iteration(frame_idx)
@@ -509,12 +606,16 @@ class Scene:
                 sensor_blobs_path=sensor_blobs_path,
                 camera_dict=scene_dict_list[frame_idx]["cams"],
                 sensor_names=sensor_names,
+                decode_hints=sensor_config.camera_decode_hints,
+                sensor_cache=sensor_cache,
             )
 
             lidar = Lidar.from_paths(
                 sensor_blobs_path=sensor_blobs_path,
                 lidar_path=Path(scene_dict_list[frame_idx]["lidar_path"]),
                 sensor_names=sensor_names,
+                lidar_ids=sensor_config.lidar_ids,
+                sensor_cache=sensor_cache,
             )
 
             frame = Frame(
@@ -559,40 +660,20 @@ class Scene:
             num_future_frames=num_future_frames,
         )
 
-        global_ego_poses = []
-        for frame_idx in range(num_history_frames):
-            ego_translation = scene_dict_list[frame_idx]["ego2global_translation"]
-            ego_quaternion = Quaternion(*scene_dict_list[frame_idx]["ego2global_rotation"])
-            global_ego_pose = np.array(
-                [
-                    ego_translation[0],
-                    ego_translation[1],
-                    ego_quaternion.yaw_pitch_roll[0],
-                ],
-                dtype=np.float64,
-            )
-            global_ego_poses.append(global_ego_pose)
-
-        local_ego_poses = convert_absolute_to_relative_se2_array(
-            StateSE2(*global_ego_poses[-1]),
-            np.array(global_ego_poses, dtype=np.float64),
-        )
+        global_ego_poses = get_global_ego_poses(scene_dict_list[:num_history_frames])
+        local_ego_poses = convert_absolute_to_relative_se2_array(StateSE2(*global_ego_poses[-1]), global_ego_poses)
+        ego_statuses = build_ego_statuses(scene_dict_list, local_ego_poses, in_global_frame=False)
 
         frames: List[Frame] = []
         for frame_idx in range(len(scene_dict_list)):
-            ego_dynamic_state = scene_dict_list[frame_idx]["ego_dynamic_state"]
-            ego_status = EgoStatus(
-                ego_pose=np.array(local_ego_poses[frame_idx], dtype=np.float32),
-                ego_velocity=np.array(ego_dynamic_state[:2], dtype=np.float32),
-                ego_acceleration=np.array(ego_dynamic_state[2:], dtype=np.float32),
-                driving_command=scene_dict_list[frame_idx]["driving_command"],
-            )
+            ego_status = ego_statuses[frame_idx]
 
             sensor_names = sensor_config.get_sensors_at_iteration(frame_idx)
             cameras = Cameras.from_camera_dict(
                 sensor_blobs_path=sensor_blobs_path,
                 camera_dict=scene_dict_list[frame_idx]["cams"],
                 sensor_names=sensor_names,
+                decode_hints=sensor_config.camera_decode_hints,
             )
 
             frame = Frame(
@@ -676,6 +757,7 @@ class Scene:
         file_path: Path,
         sensor_blobs_path: Path,
         sensor_config: SensorConfig = None,
+        sensor_cache: Optional[SensorBlobCache] = None,
     ) -> Scene:
         """
         Load scene dataclass from disk. Only used for synthesized views.
@@ -700,12 +782,16 @@ class Scene:
                 sensor_blobs_path=sensor_blobs_path,
                 lidar_path=lidar_path,
                 sensor_names=sensor_names,
+                lidar_ids=sensor_config.lidar_ids,
+                sensor_cache=sensor_cache,
             )
 
             cameras = Cameras.from_camera_dict(
                 sensor_blobs_path=sensor_blobs_path,
                 camera_dict=frame_data["camera_dict"],
                 sensor_names=sensor_names,
+                decode_hints=sensor_config.camera_decode_hints,
+                sensor_cache=sensor_cache,
             )
 
             scene_frames.append(
@@ -750,6 +836,20 @@ class SceneFilter:
     reactive_synthetic_initial_tokens: Optional[List[str]] = None
     non_reactive_synthetic_initial_tokens: Optional[List[str]] = None
 
+    # answer filter queries from a persistent scene index, and only unpickle logs with selected scenes
+    use_scene_index: bool = False
+    scene_index_path: Optional[str] = None  # defaults to a sidecar file next to the log folder
+
+    # number of processes to load and filter logs in parallel, 1 loads logs sequentially
+    num_log_loading_workers: int = 1
+
+    # keep only scene locations (from the scene index) and load frames on demand, with a bounded cache of logs
+    lazy_loading: bool = False
+    max_cached_logs: int = 4
+
+    # budget of decoded sensor blobs shared by overlapping scenes (frame_interval < num_frames) per process, 0 disables
+    sensor_blob_cache_max_bytes: int = 512 * 1024**2
+
     # TODO: expand filter options
 
     def __post_init__(self):
@@ -760,6 +860,9 @@ class SceneFilter:
         assert self.num_history_frames >= 1, "SceneFilter: num_history_frames must greater equal one."
         assert self.num_future_frames >= 0, "SceneFilter: num_future_frames must greater equal zero."
         assert self.frame_interval >= 1, "SceneFilter: frame_interval must greater equal one."
+        assert self.num_log_loading_workers >= 1, "SceneFilter: num_log_loading_workers must greater equal one."
+        assert self.max_cached_logs >= 1, "SceneFilter: max_cached_logs must greater equal one."
+        assert self.sensor_blob_cache_max_bytes >= 0, "SceneFilter: sensor_blob_cache_max_bytes must be non-negative."
 
         if (
             not self.include_synthetic_scenes
@@ -795,6 +898,11 @@ class SensorConfig:
     cam_b0: Union[bool, List[int]]
     lidar_pc: Union[bool, List[int]]
 
+    # optional decoding hints per camera identifier, e.g. {"cam_f0": CameraDecodeHint(scale=0.25)}
+    camera_decode_hints: Optional[Dict[str, CameraDecodeHint]] = None
+    # optional lidar identifiers to keep from the merged point cloud, see LidarIndex.ID
+    lidar_ids: Optional[List[int]] = None
+
     def get_sensors_at_iteration(self, iteration: int) -> List[str]:
         """
         Creates a list of sensor identifiers given iteration.
@@ -803,6 +911,8 @@ class SensorConfig:
         """
         sensors_at_iteration: List[str] = []
         for sensor_name, sensor_include in asdict(self).items():
+            if sensor_name in ("camera_decode_hints", "lidar_ids"):  # loading options, not sensors
+                continue
             if isinstance(sensor_include, bool) and sensor_include:
                 sensors_at_iteration.append(sensor_name)
             elif isinstance(sensor_include, list) and iteration in sensor_include:
@@ -1,18 +1,111 @@
 from __future__ import annotations
 
-import lzma
+import itertools
 import pickle
+import threading
+from collections import OrderedDict, deque
+from collections.abc import Mapping
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
-from typing import Any, Dict, List, Tuple
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Sequence, Set, Tuple
 
 from tqdm import tqdm
 
+from navsim.common.columnar_log import get_log_name_from_path, load_scene_dict_list
 from navsim.common.dataclasses import AgentInput, Scene, SceneFilter, SensorConfig
+from navsim.common.scene_catalog import SceneCatalog, SceneRecord
+from navsim.common.scene_index import (
+    SceneIndex,
+    SceneWindow,
+    SyntheticSceneManifest,
+    get_frame_driving_command,
+    get_frame_ego_speed,
+)
+from navsim.common.sensor_cache import SensorBlobCache, configure_sensor_blob_cache
 from navsim.planning.metric_caching.metric_cache import MetricCache
+from navsim.planning.metric_caching.metric_cache_pool import MetricCachePool
 
 FrameList = List[Dict[str, Any]]
 
 
+def filter_log_scenes(
+    log_pickle_path: Path, scene_filter: SceneFilter, tokens: Optional[Set[str]] = None
+) -> List[Tuple[str, FrameList, str]]:
+    """
+    Load a single log, while applying scene filter configuration.
+    :param log_pickle_path: path to the log file
+    :param scene_filter: scene filtering configuration class
+    :param tokens: optional set of tokens to extract, defaults to None
+    :return: list of tuples with token, raw frames and final frame token of each scene in log order
+    """
+
+    def split_list(input_list: List[Any], num_frames: int, frame_interval: int) -> List[List[Any]]:
+        """Helper function to split frame list according to sampling specification."""
+        return [input_list[i : i + num_frames] for i in range(0, len(input_list), frame_interval)]
+
+    log_scenes: List[Tuple[str, FrameList, str]] = []
+
+    scene_dict_list = load_scene_dict_list(log_pickle_path)
+    for frame_list in split_list(scene_dict_list, scene_filter.num_frames, scene_filter.frame_interval):
+        # Filter scenes which are too short
+        if len(frame_list) < scene_filter.num_frames:
+            continue
+
+        # Filter scenes with no route
+        if scene_filter.has_route and len(frame_list[scene_filter.num_history_frames - 1]["roadblock_ids"]) == 0:
+            continue
+
+        # Filter by token
+        token = frame_list[scene_filter.num_history_frames - 1]["token"]
+        if tokens is not None and token not in tokens:
+            continue
+
+        final_frame_token = frame_list[scene_filter.num_frames - 1]["token"]
+        log_scenes.append((token, frame_list, final_frame_token))
+
+        if (scene_filter.max_scenes is not None) and (len(log_scenes) >= scene_filter.max_scenes):
+            break
+
+    return log_scenes
+
+
+def _iterate_log_scenes(
+    log_files: List[Path], scene_filter: SceneFilter, tokens: Optional[Set[str]]
+) -> Iterator[List[Tuple[str, FrameList, str]]]:
+    """
+    Helper generator to load and filter logs, either sequentially or in a bounded process pool.
+    Results are yielded in the order of the log files, independent of the completion order of the workers.
+    :param log_files: list of log files to load
+    :param scene_filter: scene filtering configuration class
+    :param tokens: optional set of tokens to extract
+    :return: iterator over filtered scenes per log
+    """
+    num_workers = min(scene_filter.num_log_loading_workers, len(log_files))
+    if num_workers <= 1:
+        for log_pickle_path in tqdm(log_files, desc="Loading logs"):
+            yield filter_log_scenes(log_pickle_path, scene_filter, tokens)
+        return
+
+    # bound the number of submitted logs, such that results waiting for in-order consumption stay small
+    max_pending_logs = 2 * num_workers
+    executor = ProcessPoolExecutor(max_workers=num_workers)
+    try:
+        pending_futures: Deque[Future] = deque()
+        log_files_iterator = iter(log_files)
+        for log_pickle_path in itertools.islice(log_files_iterator, max_pending_logs):
+            pending_futures.append(executor.submit(filter_log_scenes, log_pickle_path, scene_filter, tokens))
+
+        for _ in tqdm(range(len(log_files)), desc=f"Loading logs ({num_workers} workers)"):
+            log_scenes = pending_futures.popleft().result()
+            next_log_pickle_path = next(log_files_iterator, None)
+            if next_log_pickle_path is not None:
+                pending_futures.append(executor.submit(filter_log_scenes, next_log_pickle_path, scene_filter, tokens))
+            yield log_scenes
+    finally:
+        # cancels logs which are not required anymore, e.g. when reaching max_scenes
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
 def filter_scenes(data_path: Path, scene_filter: SceneFilter) -> Tuple[Dict[str, FrameList], List[str]]:
     """
     Load a set of scenes from dataset, while applying scene filter configuration.
@@ -21,9 +114,8 @@ def filter_scenes(data_path: Path, scene_filter: SceneFilter) -> Tuple[Dict[str,
     :return: dictionary of raw logs format, and list of final frame tokens that can be used to filter synthetic scenes
     """
 
-    def split_list(input_list: List[Any], num_frames: int, frame_interval: int) -> List[List[Any]]:
-        """Helper function to split frame list according to sampling specification."""
-        return [input_list[i : i + num_frames] for i in range(0, len(input_list), frame_interval)]
+    if scene_filter.use_scene_index:
+        return filter_scenes_from_index(data_path, scene_filter)
 
     filtered_scenes: Dict[str, Scene] = {}
     # keep track of the final frame tokens which refer to the original scene of potential second stage synthetic scenes
@@ -33,82 +125,219 @@ def filter_scenes(data_path: Path, scene_filter: SceneFilter) -> Tuple[Dict[str,
     # filter logs
     log_files = list(data_path.iterdir())
     if scene_filter.log_names is not None:
-        log_files = [log_file for log_file in log_files if log_file.name.replace(".pkl", "") in scene_filter.log_names]
+        log_files = [log_file for log_file in log_files if get_log_name_from_path(log_file) in scene_filter.log_names]
 
-    if scene_filter.tokens is not None:
-        filter_tokens = True
-        tokens = set(scene_filter.tokens)
-    else:
-        filter_tokens = False
+    tokens = set(scene_filter.tokens) if scene_filter.tokens is not None else None
 
-    for log_pickle_path in tqdm(log_files, desc="Loading logs"):
+    log_scenes_iterator = _iterate_log_scenes(log_files, scene_filter, tokens)
+    for log_scenes in log_scenes_iterator:
+        for token, frame_list, final_frame_token in log_scenes:
+            filtered_scenes[token] = frame_list
+            #  TODO: if num_future_frames > proposal_sampling frames, then the final_frame_token index is wrong
+            final_frame_tokens.append(final_frame_token)
 
-        scene_dict_list = pickle.load(open(log_pickle_path, "rb"))
-        for frame_list in split_list(scene_dict_list, scene_filter.num_frames, scene_filter.frame_interval):
-            # Filter scenes which are too short
-            if len(frame_list) < scene_filter.num_frames:
-                continue
+            if (scene_filter.max_scenes is not None) and (len(filtered_scenes) >= scene_filter.max_scenes):
+                stop_loading = True
+                break
 
-            # Filter scenes with no route
-            if scene_filter.has_route and len(frame_list[scene_filter.num_history_frames - 1]["roadblock_ids"]) == 0:
-                continue
+        if stop_loading:
+            break
+    log_scenes_iterator.close()
+
+    return filtered_scenes, final_frame_tokens
+
+
+def filter_scene_windows(data_path: Path, scene_filter: SceneFilter) -> Tuple[Dict[str, SceneWindow], List[str]]:
+    """
+    Select the scenes of the dataset by answering the scene filter queries from the persistent scene index.
+    No log is deserialized, unless its index entry is missing or outdated.
+    :param data_path: root directory of log folder
+    :param scene_filter: scene filtering configuration class
+    :return: dictionary of tokens and scene windows, and list of final frame tokens
+    """
+    index_path = Path(scene_filter.scene_index_path) if scene_filter.scene_index_path is not None else None
+    scene_index = SceneIndex(data_path, index_path)
 
-            # Filter by token
-            token = frame_list[scene_filter.num_history_frames - 1]["token"]
-            if filter_tokens and token not in tokens:
+    # filter logs
+    log_files = list(data_path.iterdir())
+    if scene_filter.log_names is not None:
+        log_files = [log_file for log_file in log_files if get_log_name_from_path(log_file) in scene_filter.log_names]
+
+    filter_tokens = scene_filter.tokens is not None
+    tokens = set(scene_filter.tokens) if filter_tokens else None
+
+    scene_windows: Dict[str, SceneWindow] = {}
+    final_frame_tokens: List[str] = []
+    stop_loading: bool = False
+    for log_pickle_path in tqdm(log_files, desc="Querying scene index"):
+        for scene_window in scene_index.get_log_entry(log_pickle_path).get_scene_windows(log_pickle_path, scene_filter):
+            if filter_tokens and scene_window.token not in tokens:
                 continue
 
-            filtered_scenes[token] = frame_list
-            final_frame_token = frame_list[scene_filter.num_frames - 1]["token"]
+            scene_windows[scene_window.token] = scene_window
             #  TODO: if num_future_frames > proposal_sampling frames, then the final_frame_token index is wrong
-            final_frame_tokens.append(final_frame_token)
+            final_frame_tokens.append(scene_window.final_frame_token)
 
-            if (scene_filter.max_scenes is not None) and (len(filtered_scenes) >= scene_filter.max_scenes):
+            if (scene_filter.max_scenes is not None) and (len(scene_windows) >= scene_filter.max_scenes):
                 stop_loading = True
                 break
 
         if stop_loading:
             break
 
+    scene_index.save()
+
+    return scene_windows, final_frame_tokens
+
+
+def filter_scenes_from_index(data_path: Path, scene_filter: SceneFilter) -> Tuple[Dict[str, FrameList], List[str]]:
+    """
+    Load a set of scenes from dataset, while answering the scene filter queries from the persistent scene index.
+    Only logs containing selected scenes are unpickled. Results are identical to the non-indexed filtering.
+    :param data_path: root directory of log folder
+    :param scene_filter: scene filtering configuration class
+    :return: dictionary of raw logs format, and list of final frame tokens that can be used to filter synthetic scenes
+    """
+    scene_windows, final_frame_tokens = filter_scene_windows(data_path, scene_filter)
+
+    # deserialize only the logs of selected windows, which are grouped by log
+    filtered_scenes: Dict[str, FrameList] = {}
+    loaded_log_path, scene_dict_list = None, None
+    for token, scene_window in tqdm(scene_windows.items(), desc="Loading scenes"):
+        if scene_window.log_file != loaded_log_path:
+            scene_dict_list = load_scene_dict_list(scene_window.log_file)
+            loaded_log_path = scene_window.log_file
+        filtered_scenes[token] = scene_dict_list[scene_window.start_idx : scene_window.end_idx]
+
     return filtered_scenes, final_frame_tokens
 
 
+class LazySceneFrames(Mapping):
+    """
+    Read-only mapping of tokens to raw scene frames, which only stores the location of each scene.
+    Frames are materialized on access, using a bounded cache of recently loaded logs in each process.
+    """
+
+    def __init__(self, scene_windows: Dict[str, SceneWindow], max_cached_logs: int):
+        """
+        Initializes the lazy scene frames.
+        :param scene_windows: dictionary of tokens and scene windows
+        :param max_cached_logs: maximum number of logs kept in memory
+        """
+        self._scene_windows = scene_windows
+        self._max_cached_logs = max_cached_logs
+        self._log_cache: OrderedDict[Path, Sequence[Mapping]] = OrderedDict()
+        self._log_cache_lock = threading.Lock()
+
+    def __getstate__(self) -> Dict[str, Any]:
+        """Drop the log cache when pickling, e.g. into dataloader workers or ray tasks."""
+        state = self.__dict__.copy()
+        state["_log_cache"] = OrderedDict()
+        del state["_log_cache_lock"]
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        """Restore the lock of the log cache after unpickling."""
+        self.__dict__.update(state)
+        self._log_cache_lock = threading.Lock()
+
+    def _load_log(self, log_path: Path) -> Sequence[Mapping]:
+        """Helper method to load a log through the least-recently-used cache, safe to call from multiple threads."""
+        with self._log_cache_lock:
+            if log_path in self._log_cache:
+                self._log_cache.move_to_end(log_path)
+            else:
+                self._log_cache[log_path] = load_scene_dict_list(log_path)
+                while len(self._log_cache) > self._max_cached_logs:
+                    self._log_cache.popitem(last=False)
+            return self._log_cache[log_path]
+
+    def get_scene_window(self, token: str) -> SceneWindow:
+        """
+        :param token: scene identifier string
+        :return: location and metadata of the scene
+        """
+        return self._scene_windows[token]
+
+    def __getitem__(self, token: str) -> FrameList:
+        """
+        Materializes the raw frames of a scene.
+        :param token: scene identifier string
+        :return: list of frame dictionaries
+        """
+        scene_window = self._scene_windows[token]
+        return list(self._load_log(scene_window.log_file)[scene_window.start_idx : scene_window.end_idx])
+
+    def __iter__(self) -> Iterator[str]:
+        """
+        :return: iterator over tokens.
+        """
+        return iter(self._scene_windows)
+
+    def __contains__(self, token: object) -> bool:
+        """
+        Checks for a token without loading its log.
+        :param token: scene identifier string
+        :return: whether the token is a scene
+        """
+        return token in self._scene_windows
+
+    def __len__(self) -> int:
+        """
+        :return: number of scenes.
+        """
+        return len(self._scene_windows)
+
+
 def filter_synthetic_scenes(
     data_path: Path, scene_filter: SceneFilter, stage1_scenes_final_frames_tokens: List[str]
 ) -> Dict[str, Tuple[Path, str]]:
     # Load all the synthetic scenes that belong to the original scenes already loaded
     loaded_scenes: Dict[str, Tuple[Path, str, int]] = {}
     synthetic_scenes_paths = list(data_path.iterdir())
+    stage1_scenes_final_frames_tokens = set(stage1_scenes_final_frames_tokens)
 
     filter_logs = scene_filter.log_names is not None
     filter_tokens = scene_filter.synthetic_scene_tokens is not None
 
+    # the manifest provides the scene metadata without building frames and map APIs of every synthetic scene
+    manifest = SyntheticSceneManifest(data_path) if scene_filter.use_scene_index else None
+
     for scene_path in tqdm(synthetic_scenes_paths, desc="Loading synthetic scenes"):
-        synthetic_scene = Scene.load_from_disk(scene_path, None, None)
+        if manifest is not None:
+            scene_metadata = manifest.get_scene_metadata(scene_path)
+        else:
+            scene_metadata = Scene.load_from_disk(scene_path, None, None).scene_metadata
 
         # if a token is requested specifically, we load it even if it is not related to the original scenes loaded
-        if filter_tokens and synthetic_scene.scene_metadata.initial_token not in scene_filter.synthetic_scene_tokens:
+        if filter_tokens and scene_metadata.initial_token not in scene_filter.synthetic_scene_tokens:
             continue
 
         # filter by log names
-        log_name = synthetic_scene.scene_metadata.log_name
+        log_name = scene_metadata.log_name
         if filter_logs and log_name not in scene_filter.log_names:
             continue
 
         # if we don't filter for tokens explicitly, we load only the synthetic scenes required to run a second stage for the original scenes loaded
-        if (
-            not filter_tokens
-            and synthetic_scene.scene_metadata.corresponding_original_scene not in stage1_scenes_final_frames_tokens
-        ):
+        if not filter_tokens and scene_metadata.corresponding_original_scene not in stage1_scenes_final_frames_tokens:
             continue
 
-        loaded_scenes.update({synthetic_scene.scene_metadata.initial_token: [scene_path, log_name]})
+        loaded_scenes.update({scene_metadata.initial_token: [scene_path, log_name]})
+
+    if manifest is not None:
+        # drop entries of removed scenes, such that the manifest stays in sync with the folder
+        manifest.prune(synthetic_scenes_paths)
+        manifest.save()
 
     return loaded_scenes
 
 
 class SceneLoader:
-    """Simple data loader of scenes from logs."""
+    """
+    Simple data loader of scenes from logs.
+    Sensor blobs of overlapping scenes are decoded once and shared (see sensor_blob_cache_max_bytes of SceneFilter), such
+    that camera images and lidar point clouds of loaded scenes are read-only and have to be copied before in-place edits.
+    """
 
     def __init__(
         self,
@@ -128,11 +357,17 @@ class SceneLoader:
         :param sensor_config: dataclass for sensor loading specification, defaults to no sensors
         """
 
-        self.scene_frames_dicts, stage1_scenes_final_frames_tokens = filter_scenes(data_path, scene_filter)
+        if scene_filter.lazy_loading:
+            scene_windows, stage1_scenes_final_frames_tokens = filter_scene_windows(data_path, scene_filter)
+            self.scene_frames_dicts = LazySceneFrames(scene_windows, scene_filter.max_cached_logs)
+        else:
+            self.scene_frames_dicts, stage1_scenes_final_frames_tokens = filter_scenes(data_path, scene_filter)
         self._synthetic_sensor_path = synthetic_sensor_path
         self._original_sensor_path = original_sensor_path
         self._scene_filter = scene_filter
         self._sensor_config = sensor_config
+        # overlapping scenes share frames, which are only decoded once when tokens are loaded in log order
+        self._use_sensor_cache = scene_filter.frame_interval < scene_filter.num_frames
 
         if scene_filter.include_synthetic_scenes:
             assert (
@@ -148,12 +383,67 @@ class SceneLoader:
             self.synthetic_scenes = {}
             self.synthetic_scenes_tokens = set()
 
+        self.scene_catalog = self._build_scene_catalog()
+
+    def _build_scene_catalog(self) -> SceneCatalog:
+        """Helper method to build the catalog of filtered original and synthetic scenes."""
+        current_idx = self._scene_filter.num_history_frames - 1
+        records: List[SceneRecord] = []
+        for token in self.scene_frames_dicts.keys():
+            if isinstance(self.scene_frames_dicts, LazySceneFrames):
+                scene_window = self.scene_frames_dicts.get_scene_window(token)
+                records.append(
+                    SceneRecord(
+                        token=token,
+                        log_name=scene_window.log_name,
+                        map_name=scene_window.map_name,
+                        is_synthetic=False,
+                        ego_speed=scene_window.ego_speed,
+                        driving_command=scene_window.driving_command,
+                        has_route=scene_window.has_route,
+                    )
+                )
+            else:
+                current_frame = self.scene_frames_dicts[token][current_idx]
+                records.append(
+                    SceneRecord(
+                        token=token,
+                        log_name=current_frame["log_name"],
+                        map_name=current_frame["map_location"],
+                        is_synthetic=False,
+                        ego_speed=get_frame_ego_speed(current_frame),
+                        driving_command=get_frame_driving_command(current_frame),
+                        has_route=len(current_frame["roadblock_ids"]) > 0,
+                    )
+                )
+
+        # synthetic scenes are not loaded, only their log and map location are known
+        map_names = {record.log_name: record.map_name for record in records}
+        for token, (_, log_name) in self.synthetic_scenes.items():
+            records.append(
+                SceneRecord(
+                    token=token,
+                    log_name=log_name,
+                    map_name=map_names.get(log_name),
+                    is_synthetic=True,
+                    ego_speed=float("nan"),
+                    driving_command=-1,
+                    has_route=None,
+                )
+            )
+
+        return SceneCatalog(
+            records,
+            reactive_synthetic_tokens=self._scene_filter.reactive_synthetic_initial_tokens,
+            non_reactive_synthetic_tokens=self._scene_filter.non_reactive_synthetic_initial_tokens,
+        )
+
     @property
     def tokens(self) -> List[str]:
         """
         :return: list of scene identifiers for loading.
         """
-        return list(self.scene_frames_dicts.keys()) + list(self.synthetic_scenes.keys())
+        return self.scene_catalog.tokens
 
     @property
     def tokens_stage_one(self) -> List[str]:
@@ -161,7 +451,7 @@ class SceneLoader:
         original scenes
         :return: list of scene identifiers for loading.
         """
-        return list(self.scene_frames_dicts.keys())
+        return self.scene_catalog.tokens_stage_one
 
     @property
     def reactive_tokens_stage_two(self) -> List[str]:
@@ -169,10 +459,7 @@ class SceneLoader:
         reactive synthetic scenes
         :return: list of scene identifiers for loading.
         """
-        reactive_synthetic_initial_tokens = self._scene_filter.reactive_synthetic_initial_tokens
-        if reactive_synthetic_initial_tokens is None:
-            return None
-        return list(set(self.synthetic_scenes_tokens) & set(reactive_synthetic_initial_tokens))
+        return self.scene_catalog.reactive_tokens_stage_two
 
     @property
     def non_reactive_tokens_stage_two(self) -> List[str]:
@@ -180,10 +467,7 @@ class SceneLoader:
         non reactive synthetic scenes
         :return: list of scene identifiers for loading.
         """
-        non_reactive_synthetic_initial_tokens = self._scene_filter.non_reactive_synthetic_initial_tokens
-        if non_reactive_synthetic_initial_tokens is None:
-            return None
-        return list(set(self.synthetic_scenes_tokens) & set(non_reactive_synthetic_initial_tokens))
+        return self.scene_catalog.non_reactive_tokens_stage_two
 
     @property
     def reactive_tokens(self) -> List[str]:
@@ -191,12 +475,7 @@ class SceneLoader:
         original scenes and reactive synthetic scenes
         :return: list of scene identifiers for loading.
         """
-        reactive_synthetic_initial_tokens = self._scene_filter.reactive_synthetic_initial_tokens
-        if reactive_synthetic_initial_tokens is None:
-            return list(self.scene_frames_dicts.keys())
-        return list(self.scene_frames_dicts.keys()) + list(
-            set(self.synthetic_scenes_tokens) & set(reactive_synthetic_initial_tokens)
-        )
+        return self.scene_catalog.reactive_tokens
 
     @property
     def non_reactive_tokens(self) -> List[str]:
@@ -204,12 +483,7 @@ class SceneLoader:
         original scenes and non reactive synthetic scenes
         :return: list of scene identifiers for loading.
         """
-        non_reactive_synthetic_initial_tokens = self._scene_filter.non_reactive_synthetic_initial_tokens
-        if non_reactive_synthetic_initial_tokens is None:
-            return list(self.scene_frames_dicts.keys())
-        return list(self.scene_frames_dicts.keys()) + list(
-            set(self.synthetic_scenes_tokens) & set(non_reactive_synthetic_initial_tokens)
-        )
+        return self.scene_catalog.non_reactive_tokens
 
     def __len__(self) -> int:
         """
@@ -224,18 +498,21 @@ class SceneLoader:
         """
         return self.tokens[idx]
 
-    def get_scene_from_token(self, token: str) -> Scene:
-        """
-        Loads scene given a scene identifier string (token).
-        :param token: scene identifier string.
-        :return: scene dataclass
-        """
-        assert token in self.tokens
+    def _get_sensor_cache(self) -> Optional[SensorBlobCache]:
+        """Helper method to get the process-wide sensor blob cache, if scenes overlap and the cache is enabled."""
+        if not self._use_sensor_cache:
+            return None
+        return configure_sensor_blob_cache(self._scene_filter.sensor_blob_cache_max_bytes)
+
+    def _load_scene(self, token: str, sensor_cache: Optional[SensorBlobCache]) -> Scene:
+        """Helper method to load a scene with a given sensor blob cache."""
+        assert token in self.scene_catalog, f"Unknown token {token}"
         if token in self.synthetic_scenes:
             return Scene.load_from_disk(
                 file_path=self.synthetic_scenes[token][0],
                 sensor_blobs_path=self._synthetic_sensor_path,
                 sensor_config=self._sensor_config,
+                sensor_cache=sensor_cache,
             )
         else:
             return Scene.from_scene_dict_list(
@@ -244,20 +521,18 @@ class SceneLoader:
                 num_history_frames=self._scene_filter.num_history_frames,
                 num_future_frames=self._scene_filter.num_future_frames,
                 sensor_config=self._sensor_config,
+                sensor_cache=sensor_cache,
             )
 
-    def get_agent_input_from_token(self, token: str) -> AgentInput:
-        """
-        Loads agent input given a scene identifier string (token).
-        :param token: scene identifier string.
-        :return: agent input dataclass
-        """
-        assert token in self.tokens
+    def _load_agent_input(self, token: str, sensor_cache: Optional[SensorBlobCache]) -> AgentInput:
+        """Helper method to load an agent input with a given sensor blob cache."""
+        assert token in self.scene_catalog, f"Unknown token {token}"
         if token in self.synthetic_scenes:
             return Scene.load_from_disk(
                 file_path=self.synthetic_scenes[token][0],
                 sensor_blobs_path=self._synthetic_sensor_path,
                 sensor_config=self._sensor_config,
+                sensor_cache=sensor_cache,
             ).get_agent_input()
         else:
             return AgentInput.from_scene_dict_list(
@@ -265,42 +540,181 @@ class SceneLoader:
                 self._original_sensor_path,
                 num_history_frames=self._scene_filter.num_history_frames,
                 sensor_config=self._sensor_config,
+                sensor_cache=sensor_cache,
             )
 
+    def get_scene_from_token(self, token: str) -> Scene:
+        """
+        Loads scene given a scene identifier string (token).
+        :param token: scene identifier string.
+        :return: scene dataclass
+        """
+        return self._load_scene(token, self._get_sensor_cache())
+
+    def get_agent_input_from_token(self, token: str) -> AgentInput:
+        """
+        Loads agent input given a scene identifier string (token).
+        :param token: scene identifier string.
+        :return: agent input dataclass
+        """
+        return self._load_agent_input(token, self._get_sensor_cache())
+
+    def _load_batch(
+        self, tokens: List[str], load_fn: Callable[[str, Optional[SensorBlobCache]], Any], num_workers: int
+    ) -> List[Any]:
+        """
+        Helper method to load a batch of tokens, grouped by synthetic/original scenes and logs.
+        :param tokens: list of scene identifiers
+        :param load_fn: function loading a token with a sensor blob cache
+        :param num_workers: number of loading threads
+        :return: list of loaded items in the order of tokens
+        """
+        # sensor blobs shared by scenes of the batch are only decoded once
+        sensor_cache = self._get_sensor_cache()
+        if sensor_cache is None and self._scene_filter.sensor_blob_cache_max_bytes > 0:
+            sensor_cache = SensorBlobCache(self._scene_filter.sensor_blob_cache_max_bytes)
+        unique_tokens = list(dict.fromkeys(tokens))
+        unique_tokens.sort(
+            key=lambda token: (token in self.synthetic_scenes, self.scene_catalog.get_record(token).log_name)
+        )
+
+        if num_workers <= 1 or len(unique_tokens) <= 1:
+            results = {token: load_fn(token, sensor_cache) for token in unique_tokens}
+        else:
+            with ThreadPoolExecutor(max_workers=num_workers) as executor:
+                futures = {token: executor.submit(load_fn, token, sensor_cache) for token in unique_tokens}
+                results = {token: future.result() for token, future in futures.items()}
+        return [results[token] for token in tokens]
+
+    def get_scenes(self, tokens: List[str], num_workers: int = 4) -> List[Scene]:
+        """
+        Loads scenes of multiple tokens concurrently.
+        :param tokens: list of scene identifiers
+        :param num_workers: number of loading threads, defaults to 4
+        :return: list of scene dataclasses in the order of tokens
+        """
+        return self._load_batch(tokens, self._load_scene, num_workers)
+
+    def get_agent_inputs(self, tokens: List[str], num_workers: int = 4) -> List[AgentInput]:
+        """
+        Loads agent inputs of multiple tokens concurrently.
+        :param tokens: list of scene identifiers
+        :param num_workers: number of loading threads, defaults to 4
+        :return: list of agent input dataclasses in the order of tokens
+        """
+        return self._load_batch(tokens, self._load_agent_input, num_workers)
+
     def get_tokens_list_per_log(self) -> Dict[str, List[str]]:
         """
         Collect tokens for each logs file given filtering.
         :return: dictionary of logs names and tokens
         """
-        # generate a dict that contains a list of tokens for each log-name
-        tokens_per_logs: Dict[str, List[str]] = {}
-        for token, scene_dict_list in self.scene_frames_dicts.items():
-            log_name = scene_dict_list[0]["log_name"]
-            if tokens_per_logs.get(log_name):
-                tokens_per_logs[log_name].append(token)
-            else:
-                tokens_per_logs.update({log_name: [token]})
+        return self.scene_catalog.get_tokens_per_log()
 
-        for scene_path, log_name in self.synthetic_scenes.values():
-            if tokens_per_logs.get(log_name):
-                tokens_per_logs[log_name].append(scene_path.stem)
-            else:
-                tokens_per_logs.update({log_name: [scene_path.stem]})
+    def prefetch_agent_inputs(
+        self, tokens: List[str], num_prefetch: int = 8, num_workers: int = 4
+    ) -> AgentInputPrefetcher:
+        """
+        Loads the agent inputs of upcoming tokens in background threads, e.g. to overlap sensor decoding with inference.
+        :param tokens: list of scene identifiers in the order they are requested
+        :param num_prefetch: maximum number of agent inputs loaded ahead, 0 loads synchronously
+        :param num_workers: number of loading threads
+        :return: prefetcher, yielding (token, agent input) tuples in order
+        """
+        return AgentInputPrefetcher(self, tokens, num_prefetch, num_workers)
+
+
+class AgentInputPrefetcher:
+    """Prefetches agent inputs (incl. decoded camera and lidar blobs) of a token sequence with a bounded buffer."""
+
+    def __init__(self, scene_loader: SceneLoader, tokens: List[str], num_prefetch: int, num_workers: int):
+        """
+        Initializes the prefetcher and starts loading the first tokens.
+        :param scene_loader: scene loader to load agent inputs from
+        :param tokens: list of scene identifiers in the order they are requested
+        :param num_prefetch: maximum number of agent inputs loaded ahead, 0 loads synchronously
+        :param num_workers: number of loading threads
+        """
+        assert num_prefetch >= 0, "AgentInputPrefetcher: num_prefetch must be non-negative."
+        assert num_workers >= 1, "AgentInputPrefetcher: num_workers must be at least 1."
+        self._scene_loader = scene_loader
+        self._tokens = tokens
+        self._num_prefetch = num_prefetch
+        self._next_idx = 0
+        self._buffer: Deque[Tuple[str, Future]] = deque()
+        self._executor = ThreadPoolExecutor(max_workers=num_workers) if num_prefetch > 0 else None
+        self._fill_buffer()
 
-        return tokens_per_logs
+    def _fill_buffer(self) -> None:
+        """Helper method to submit upcoming tokens until the buffer is full."""
+        if self._executor is None:
+            return
+        while len(self._buffer) < self._num_prefetch and self._next_idx < len(self._tokens):
+            token = self._tokens[self._next_idx]
+            self._buffer.append((token, self._executor.submit(self._scene_loader.get_agent_input_from_token, token)))
+            self._next_idx += 1
+
+    def get_agent_input_from_token(self, token: str) -> AgentInput:
+        """
+        Returns the agent input of the next token. Skipped tokens are dropped from the buffer and tokens
+        outside of the prefetched sequence are loaded synchronously.
+        :param token: scene identifier string
+        :return: agent input dataclass
+        """
+        while self._buffer and self._buffer[0][0] != token:
+            self._buffer.popleft()[1].cancel()
+
+        if not self._buffer:
+            # token was not prefetched, continue prefetching after it if it is part of the sequence
+            if self._next_idx < len(self._tokens) and self._tokens[self._next_idx] == token:
+                self._next_idx += 1
+            self._fill_buffer()
+            return self._scene_loader.get_agent_input_from_token(token)
+
+        _, future = self._buffer.popleft()
+        self._fill_buffer()
+        return future.result()
+
+    def __iter__(self) -> Iterator[Tuple[str, AgentInput]]:
+        """
+        :return: iterator over (token, agent input) tuples of the remaining tokens in order.
+        """
+        remaining_tokens = [token for token, _ in self._buffer] + self._tokens[self._next_idx :]
+        for token in remaining_tokens:
+            yield token, self.get_agent_input_from_token(token)
+        self.close()
+
+    def close(self) -> None:
+        """Cancels pending loads and stops the loading threads."""
+        self._buffer.clear()
+        self._next_idx = len(self._tokens)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def __enter__(self) -> AgentInputPrefetcher:
+        """Enters the context, closing the prefetcher on exit."""
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        """Closes the prefetcher when leaving the context."""
+        self.close()
 
 
 class MetricCacheLoader:
     """Simple dataloader for metric cache."""
 
-    def __init__(self, cache_path: Path, file_name: str = "metric_cache.pkl"):
+    def __init__(
+        self, cache_path: Path, file_name: str = "metric_cache.pkl", metric_cache_pool: Optional[MetricCachePool] = None
+    ):
         """
         Initializes the metric cache loader.
         :param cache_path: directory of cache folder
         :param file_name: file name of cached files, defaults to "metric_cache.pkl"
+        :param metric_cache_pool: optional node-local pool to load metric caches through, defaults to None
         """
 
         self._file_name = file_name
+        self._metric_cache_pool = metric_cache_pool
         self.metric_cache_paths = self._load_metric_cache_paths(cache_path)
 
     def _load_metric_cache_paths(self, cache_path: Path) -> Dict[str, Path]:
@@ -323,6 +737,13 @@ class MetricCacheLoader:
         """
         return list(self.metric_cache_paths.keys())
 
+    @property
+    def metric_cache_pool(self) -> Optional[MetricCachePool]:
+        """
+        :return: node-local pool to load metric caches through, if any.
+        """
+        return self._metric_cache_pool
+
     def __len__(self):
         """
         :return: number for scenes possible to load.
@@ -342,9 +763,10 @@ class MetricCacheLoader:
         :param token: unique identifier of scene
         :return: metric cache dataclass
         """
-        with lzma.open(self.metric_cache_paths[token], "rb") as f:
-            metric_cache: MetricCache = pickle.load(f)
-        return metric_cache
+        if self._metric_cache_pool is not None:
+            return self._metric_cache_pool.get(self.metric_cache_paths[token])
+        # the storage backend (e.g. lzma or uncompressed) is detected from the file
+        return MetricCache.load(self.metric_cache_paths[token])
 
     def to_pickle(self, path: Path) -> None:
         """
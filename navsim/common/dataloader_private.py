@@ -1,7 +1,6 @@
 # dataloader only for private test
 from __future__ import annotations
 
-import lzma
 import pickle
 from pathlib import Path
 from typing import Any, Dict, List, Tuple
@@ -347,9 +346,7 @@ class MetricCacheLoader:
         :param token: unique identifier of scene
         :return: metric cache dataclass
         """
-        with lzma.open(self.metric_cache_paths[token], "rb") as f:
-            metric_cache: MetricCache = pickle.load(f)
-        return metric_cache
+        return MetricCache.load(self.metric_cache_paths[token])
 
     def to_pickle(self, path: Path) -> None:
         """
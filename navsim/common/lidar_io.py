@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import io
+import os
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import numpy.typing as npt
+from nuplan.database.utils.pointclouds.lidar import LidarPointCloud
+
+from navsim.common.enums import LidarIndex
+
+LIDAR_NPY_SUFFIX = ".npy"
+
+# numpy type characters of the PCD TYPE and SIZE header entries
+_PCD_TYPES: Dict[Tuple[str, int], str] = {
+    ("F", 4): "f4",
+    ("F", 8): "f8",
+    ("U", 1): "u1",
+    ("U", 2): "u2",
+    ("U", 4): "u4",
+    ("U", 8): "u8",
+    ("I", 1): "i1",
+    ("I", 2): "i2",
+    ("I", 4): "i4",
+    ("I", 8): "i8",
+}
+
+
+def get_lidar_npy_path(lidar_path: Path) -> Path:
+    """
+    Path of the memory-mappable sidecar of a point cloud file, e.g. "MergedPointCloud/0.pcd" -> "MergedPointCloud/0.npy".
+    :param lidar_path: path to the pcd file
+    :return: path to the npy sidecar
+    """
+    return lidar_path.with_suffix(LIDAR_NPY_SUFFIX)
+
+
+def _parse_pcd_header(buffer: memoryview) -> Tuple[Dict[str, List[str]], int]:
+    """
+    Helper function to parse the ascii header of a pcd file.
+    :param buffer: file buffer
+    :return: dictionary of header entries and byte offset of the point data
+    """
+    header: Dict[str, List[str]] = {}
+    offset = 0
+    while True:
+        line_end = bytes(buffer[offset : offset + 1024]).find(b"\n")
+        assert line_end >= 0, "Invalid pcd header."
+        line = bytes(buffer[offset : offset + line_end]).decode("ascii").strip()
+        offset += line_end + 1
+        if not line or line.startswith("#"):
+            continue
+        key, *values = line.split()
+        header[key] = values
+        if key == "DATA":
+            return header, offset
+
+
+def load_pcd_points(pcd_path: Path) -> npt.NDArray[np.float32]:
+    """
+    Loads a binary pcd file into the (6,n) float32 layout of navsim.common.dataclasses.Lidar.
+    The file is memory-mapped (copy-on-write) and returned as transposed view if all fields are float32.
+    :param pcd_path: path to the pcd file
+    :return: (6,n) float32 array, see LidarIndex
+    """
+    if os.path.getsize(pcd_path) == 0:
+        return np.zeros((LidarIndex.size(), 0), dtype=np.float32)
+
+    buffer = np.memmap(pcd_path, dtype=np.uint8, mode="c")
+    header, data_offset = _parse_pcd_header(memoryview(buffer))
+    if header["DATA"][0] != "binary":
+        # ascii and compressed files are parsed by nuPlan
+        with open(pcd_path, "rb") as fp:
+            return LidarPointCloud.from_buffer(io.BytesIO(fp.read()), "pcd").points
+
+    field_names = header["FIELDS"]
+    counts = [int(count) for count in header.get("COUNT", ["1"] * len(field_names))]
+    assert all(count == 1 for count in counts), f"Unsupported pcd field counts {counts} in {pcd_path}"
+    point_dtype = np.dtype(
+        [
+            (name, "<" + _PCD_TYPES[(type_, int(size))])
+            for name, type_, size in zip(field_names, header["TYPE"], header["SIZE"])
+        ]
+    )
+    num_points = int(header["POINTS"][0])
+    points = np.frombuffer(buffer, dtype=point_dtype, count=num_points, offset=data_offset)
+
+    if all(point_dtype[name] == np.float32 for name in field_names):
+        # zero-copy view of the mapped file
+        return points.view(np.float32).reshape(num_points, len(field_names)).T
+    return np.stack([points[name].astype(np.float32) for name in field_names])
+
+
+def load_lidar_points(lidar_path: Path, lidar_ids: Optional[List[int]] = None) -> npt.NDArray[np.float32]:
+    """
+    Loads a merged point cloud, preferring the memory-mappable npy sidecar if it exists.
+    :param lidar_path: path to the pcd file
+    :param lidar_ids: optional list of lidar identifiers to keep, defaults to all points
+    :return: (6,n) float32 array, see LidarIndex
+    """
+    npy_path = get_lidar_npy_path(lidar_path)
+    if npy_path.is_file():
+        lidar_pc = np.load(npy_path, mmap_mode="c")
+    else:
+        lidar_pc = load_pcd_points(lidar_path)
+
+    if lidar_ids is not None:
+        lidar_pc = lidar_pc[:, np.isin(lidar_pc[LidarIndex.ID], lidar_ids)]
+    return lidar_pc
+
+
+def save_lidar_npy(lidar_path: Path) -> Path:
+    """
+    Writes the npy sidecar of a point cloud file, which can be memory-mapped without parsing.
+    :param lidar_path: path to the pcd file
+    :return: path to the written npy sidecar
+    """
+    npy_path = get_lidar_npy_path(lidar_path)
+    tmp_path = npy_path.with_name(f"{npy_path.stem}.{os.getpid()}.tmp{LIDAR_NPY_SUFFIX}")
+    np.save(tmp_path, np.ascontiguousarray(load_pcd_points(lidar_path)))
+    os.replace(tmp_path, npy_path)
+    return npy_path
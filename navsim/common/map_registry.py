@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import logging
+import os
+import threading
+from typing import Dict, Iterable, Optional, Tuple
+
+from nuplan.common.actor_state.state_representation import Point2D
+from nuplan.common.maps.abstract_map import AbstractMap
+from nuplan.common.maps.maps_datatypes import SemanticMapLayer
+from nuplan.common.maps.nuplan_map.map_factory import get_maps_api
+from nuplan.database.maps_db.gpkg_mapsdb import MAP_LOCATIONS
+
+logger = logging.getLogger(__name__)
+
+NUPLAN_MAPS_ROOT = os.environ.get("NUPLAN_MAPS_ROOT")
+NUPLAN_MAP_VERSION = "nuplan-maps-v1.0"
+
+# vector layers queried by the PDM planner, scorer and IDM traffic agents
+PDM_MAP_LAYERS = [
+    SemanticMapLayer.LANE,
+    SemanticMapLayer.LANE_CONNECTOR,
+    SemanticMapLayer.ROADBLOCK,
+    SemanticMapLayer.ROADBLOCK_CONNECTOR,
+    SemanticMapLayer.CARPARK_AREA,
+    SemanticMapLayer.INTERSECTION,
+]
+
+MapKey = Tuple[str, str, str]
+
+_map_apis: Dict[MapKey, AbstractMap] = {}
+_map_registry_stats: Dict[str, int] = {"hits": 0, "misses": 0}
+_map_registry_lock = threading.Lock()
+_map_registry_pid: int = os.getpid()
+
+
+def _check_process() -> None:
+    """
+    Helper function to reset the registry in forked processes (e.g. ray or multiprocessing workers),
+    such that database connections of the parent process are never shared.
+    """
+    global _map_registry_pid
+    if _map_registry_pid != os.getpid():
+        _map_apis.clear()
+        _map_registry_stats.update({"hits": 0, "misses": 0})
+        _map_registry_pid = os.getpid()
+
+
+def get_map_api(map_root: str, map_version: str, map_name: str) -> AbstractMap:
+    """
+    Returns the map api of a map location, which is loaded once per process and shared afterwards.
+    :param map_root: root directory of the nuPlan maps
+    :param map_version: version of the nuPlan maps
+    :param map_name: name of the map location, e.g. "us-ma-boston"
+    :return: map api
+    """
+    assert map_name in MAP_LOCATIONS, f"The map name {map_name} is invalid, must be in {MAP_LOCATIONS}"
+    key: MapKey = (map_root, map_version, map_name)
+    with _map_registry_lock:
+        _check_process()
+        map_api = _map_apis.get(key)
+        if map_api is not None:
+            _map_registry_stats["hits"] += 1
+            return map_api
+        _map_registry_stats["misses"] += 1
+        map_api = get_maps_api(map_root, map_version, map_name)
+        _map_apis[key] = map_api
+    return map_api
+
+
+def prewarm_map_apis(
+    map_root: Optional[str] = None,
+    map_version: str = NUPLAN_MAP_VERSION,
+    map_names: Iterable[str] = MAP_LOCATIONS,
+    layers: Iterable[SemanticMapLayer] = PDM_MAP_LAYERS,
+) -> None:
+    """
+    Loads the map apis and their vector layers upfront, such that the first scored scenes do not pay the loading cost.
+    :param map_root: root directory of the nuPlan maps, defaults to $NUPLAN_MAPS_ROOT
+    :param map_version: version of the nuPlan maps
+    :param map_names: map locations to load
+    :param layers: vector layers to load for each map location
+    """
+    map_root = map_root or NUPLAN_MAPS_ROOT
+    layers = list(layers)
+    for map_name in map_names:
+        map_api = get_map_api(map_root, map_version, map_name)
+        # map layers are loaded lazily on the first query
+        map_api.get_proximal_map_objects(Point2D(0.0, 0.0), 1.0, layers)
+        logger.info(f"Pre-warmed map api of {map_name} with {len(layers)} layers.")
+
+
+def get_map_registry_stats() -> Dict[str, int]:
+    """
+    :return: dictionary with number of registry hits, misses and loaded map apis in the current process.
+    """
+    with _map_registry_lock:
+        _check_process()
+        return {**_map_registry_stats, "num_map_apis": len(_map_apis)}
+
+
+def clear_map_registry() -> None:
+    """Removes all map apis and resets the counters of the current process."""
+    with _map_registry_lock:
+        _map_apis.clear()
+        _map_registry_stats.update({"hits": 0, "misses": 0})
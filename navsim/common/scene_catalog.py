@@ -0,0 +1,196 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+import numpy.typing as npt
+
+
+@dataclass(frozen=True)
+class SceneRecord:
+    """Metadata of a loadable scene, used to query scenes without loading their frames."""
+
+    token: str
+    log_name: str
+    map_name: Optional[str]
+    is_synthetic: bool
+    ego_speed: float  # absolute ego speed at the current frame [m/s], NaN if unknown
+    driving_command: int  # index of the driving command at the current frame, -1 if unknown
+    has_route: Optional[bool]  # None if unknown
+
+
+class SceneCatalog:
+    """
+    Catalog of the scenes of a scene loader, built once after filtering.
+    Provides constant-time token lookups, precomputed stage partitions, per-log grouping and metadata queries.
+    """
+
+    def __init__(
+        self,
+        records: Iterable[SceneRecord],
+        reactive_synthetic_tokens: Optional[Iterable[str]] = None,
+        non_reactive_synthetic_tokens: Optional[Iterable[str]] = None,
+    ):
+        """
+        Initializes the catalog.
+        :param records: scene records, original scenes in log order followed by synthetic scenes
+        :param reactive_synthetic_tokens: optional initial tokens of reactive synthetic scenes
+        :param non_reactive_synthetic_tokens: optional initial tokens of non-reactive synthetic scenes
+        """
+        self._records: Dict[str, SceneRecord] = {record.token: record for record in records}
+        self._tokens: List[str] = list(self._records.keys())
+        self._tokens_stage_one: List[str] = [token for token in self._tokens if not self._records[token].is_synthetic]
+        self._tokens_stage_two: List[str] = [token for token in self._tokens if self._records[token].is_synthetic]
+
+        self._reactive_tokens_stage_two = self._get_stage_two_partition(reactive_synthetic_tokens)
+        self._non_reactive_tokens_stage_two = self._get_stage_two_partition(non_reactive_synthetic_tokens)
+
+        self._tokens_per_log: Dict[str, List[str]] = {}
+        for token, record in self._records.items():
+            self._tokens_per_log.setdefault(record.log_name, []).append(token)
+
+        # metadata columns for vectorized queries
+        records_list = list(self._records.values())
+        self._token_array: npt.NDArray[np.object_] = np.array(self._tokens, dtype=object)
+        self._log_names: npt.NDArray[np.object_] = np.array([record.log_name for record in records_list], dtype=object)
+        self._map_names: npt.NDArray[np.object_] = np.array([record.map_name for record in records_list], dtype=object)
+        self._is_synthetic = np.array([record.is_synthetic for record in records_list], dtype=bool)
+        self._ego_speeds = np.array([record.ego_speed for record in records_list], dtype=np.float64)
+        self._driving_commands = np.array([record.driving_command for record in records_list], dtype=np.int64)
+        self._has_route = np.array([record.has_route is True for record in records_list], dtype=bool)
+        self._has_route_known = np.array([record.has_route is not None for record in records_list], dtype=bool)
+
+    def _get_stage_two_partition(self, synthetic_tokens: Optional[Iterable[str]]) -> Optional[List[str]]:
+        """Helper method to intersect the loaded synthetic scenes with a token list, in catalog order."""
+        if synthetic_tokens is None:
+            return None
+        synthetic_tokens = set(synthetic_tokens)
+        return [token for token in self._tokens_stage_two if token in synthetic_tokens]
+
+    @property
+    def tokens(self) -> List[str]:
+        """
+        :return: list of all scene identifiers, original scenes in log order followed by synthetic scenes.
+        """
+        return self._tokens
+
+    @property
+    def tokens_stage_one(self) -> List[str]:
+        """
+        :return: list of original scene identifiers.
+        """
+        return self._tokens_stage_one
+
+    @property
+    def tokens_stage_two(self) -> List[str]:
+        """
+        :return: list of synthetic scene identifiers.
+        """
+        return self._tokens_stage_two
+
+    @property
+    def reactive_tokens_stage_two(self) -> Optional[List[str]]:
+        """
+        :return: list of reactive synthetic scene identifiers, None if not specified.
+        """
+        return self._reactive_tokens_stage_two
+
+    @property
+    def non_reactive_tokens_stage_two(self) -> Optional[List[str]]:
+        """
+        :return: list of non-reactive synthetic scene identifiers, None if not specified.
+        """
+        return self._non_reactive_tokens_stage_two
+
+    @property
+    def reactive_tokens(self) -> List[str]:
+        """
+        :return: list of original and reactive synthetic scene identifiers.
+        """
+        return self._tokens_stage_one + (self._reactive_tokens_stage_two or [])
+
+    @property
+    def non_reactive_tokens(self) -> List[str]:
+        """
+        :return: list of original and non-reactive synthetic scene identifiers.
+        """
+        return self._tokens_stage_one + (self._non_reactive_tokens_stage_two or [])
+
+    @property
+    def log_names(self) -> List[str]:
+        """
+        :return: list of log names with at least one scene.
+        """
+        return list(self._tokens_per_log.keys())
+
+    def get_record(self, token: str) -> SceneRecord:
+        """
+        :param token: scene identifier string
+        :return: metadata record of the scene
+        """
+        return self._records[token]
+
+    def get_tokens_per_log(self) -> Dict[str, List[str]]:
+        """
+        :return: dictionary of log names and scene identifiers in the log.
+        """
+        return {log_name: list(tokens) for log_name, tokens in self._tokens_per_log.items()}
+
+    def filter(
+        self,
+        log_names: Optional[Iterable[str]] = None,
+        map_names: Optional[Iterable[str]] = None,
+        min_ego_speed: Optional[float] = None,
+        max_ego_speed: Optional[float] = None,
+        driving_commands: Optional[Iterable[int]] = None,
+        has_route: Optional[bool] = None,
+        include_original: bool = True,
+        include_synthetic: bool = True,
+    ) -> List[str]:
+        """
+        Queries scenes by their metadata, without re-filtering the logs.
+        Scenes with unknown values (e.g. the ego speed of synthetic scenes) never match a filter on that value.
+        :param log_names: optional log names to keep
+        :param map_names: optional map names to keep, e.g. ["us-ma-boston"]
+        :param min_ego_speed: optional minimum ego speed at the current frame [m/s]
+        :param max_ego_speed: optional maximum ego speed at the current frame [m/s]
+        :param driving_commands: optional indices of driving commands at the current frame to keep
+        :param has_route: optional flag to keep scenes with (True) or without (False) route
+        :param include_original: whether to keep original scenes, defaults to True
+        :param include_synthetic: whether to keep synthetic scenes, defaults to True
+        :return: list of matching scene identifiers in catalog order
+        """
+        mask = np.where(self._is_synthetic, include_synthetic, include_original)
+        if log_names is not None:
+            mask &= np.isin(self._log_names, list(log_names))
+        if map_names is not None:
+            mask &= np.isin(self._map_names, list(map_names))
+        if min_ego_speed is not None:
+            mask &= self._ego_speeds >= min_ego_speed
+        if max_ego_speed is not None:
+            mask &= self._ego_speeds <= max_ego_speed
+        if driving_commands is not None:
+            mask &= np.isin(self._driving_commands, list(driving_commands))
+        if has_route is not None:
+            mask &= self._has_route_known & (self._has_route == has_route)
+        return self._token_array[mask].tolist()
+
+    def __contains__(self, token: object) -> bool:
+        """
+        :param token: scene identifier string
+        :return: whether the scene is in the catalog
+        """
+        return token in self._records
+
+    def __iter__(self) -> Iterator[str]:
+        """
+        :return: iterator over scene identifiers.
+        """
+        return iter(self._tokens)
+
+    def __len__(self) -> int:
+        """
+        :return: number of scenes.
+        """
+        return len(self._tokens)
@@ -0,0 +1,294 @@
+from __future__ import annotations
+
+import logging
+import os
+import pickle
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Mapping, Optional, Sequence
+
+import numpy as np
+
+from navsim.common.columnar_log import get_log_name_from_path, load_scene_dict_list
+from navsim.common.dataclasses import SceneFilter, SceneMetadata
+
+logger = logging.getLogger(__name__)
+
+SCENE_INDEX_VERSION: int = 2
+SYNTHETIC_SCENE_MANIFEST_VERSION: int = 1
+
+
+def get_frame_ego_speed(frame: Mapping[str, Any]) -> float:
+    """
+    :param frame: frame dictionary of a log
+    :return: absolute ego speed of the frame [m/s]
+    """
+    velocity_x, velocity_y = frame["ego_dynamic_state"][:2]
+    return float(np.hypot(velocity_x, velocity_y))
+
+
+def get_frame_driving_command(frame: Mapping[str, Any]) -> int:
+    """
+    :param frame: frame dictionary of a log
+    :return: index of the one-hot driving command of the frame
+    """
+    return int(np.argmax(frame["driving_command"]))
+
+
+@dataclass
+class SceneWindow:
+    """Location and metadata of a single scene within a log file."""
+
+    token: str
+    log_file: Path
+    log_name: str
+    map_name: str
+    start_idx: int
+    end_idx: int
+    has_route: bool
+    final_frame_token: str
+    ego_speed: float
+    driving_command: int
+
+
+@dataclass
+class LogIndexEntry:
+    """Frame-level metadata of a log file, sufficient to extract scenes without loading the log."""
+
+    log_name: str
+    map_name: str
+    file_size: int
+    file_mtime_ns: int
+    frame_tokens: List[str]
+    frame_has_route: List[bool]
+    frame_ego_speed: List[float]
+    frame_driving_command: List[int]
+
+    def __len__(self) -> int:
+        """
+        :return: number of frames in the log.
+        """
+        return len(self.frame_tokens)
+
+    @classmethod
+    def from_scene_dict_list(cls, log_path: Path, scene_dict_list: Sequence[Mapping[str, Any]]) -> LogIndexEntry:
+        """
+        Builds the index entry from the frames of a loaded log.
+        :param log_path: path to the log file
+        :param scene_dict_list: list of frame dictionaries in the log
+        :return: log index entry
+        """
+        stat = log_path.stat()
+        return LogIndexEntry(
+            log_name=scene_dict_list[0]["log_name"] if len(scene_dict_list) > 0 else get_log_name_from_path(log_path),
+            map_name=scene_dict_list[0]["map_location"] if len(scene_dict_list) > 0 else None,
+            file_size=stat.st_size,
+            file_mtime_ns=stat.st_mtime_ns,
+            frame_tokens=[frame["token"] for frame in scene_dict_list],
+            frame_has_route=[len(frame["roadblock_ids"]) > 0 for frame in scene_dict_list],
+            frame_ego_speed=[get_frame_ego_speed(frame) for frame in scene_dict_list],
+            frame_driving_command=[get_frame_driving_command(frame) for frame in scene_dict_list],
+        )
+
+    def get_scene_windows(self, log_path: Path, scene_filter: SceneFilter) -> List[SceneWindow]:
+        """
+        Splits the log into scenes according to the sampling specification of the filter.
+        Scenes which are too short, or have no route (if required), are discarded.
+        :param log_path: path to the log file
+        :param scene_filter: scene filtering configuration class
+        :return: list of scene windows in log order
+        """
+        num_frames = scene_filter.num_frames
+        current_idx = scene_filter.num_history_frames - 1
+
+        scene_windows: List[SceneWindow] = []
+        for start_idx in range(0, len(self), scene_filter.frame_interval):
+            end_idx = start_idx + num_frames
+            if end_idx > len(self):
+                continue
+
+            has_route = self.frame_has_route[start_idx + current_idx]
+            if scene_filter.has_route and not has_route:
+                continue
+
+            scene_windows.append(
+                SceneWindow(
+                    token=self.frame_tokens[start_idx + current_idx],
+                    log_file=log_path,
+                    log_name=self.log_name,
+                    map_name=self.map_name,
+                    start_idx=start_idx,
+                    end_idx=end_idx,
+                    has_route=has_route,
+                    final_frame_token=self.frame_tokens[end_idx - 1],
+                    ego_speed=self.frame_ego_speed[start_idx + current_idx],
+                    driving_command=self.frame_driving_command[start_idx + current_idx],
+                )
+            )
+        return scene_windows
+
+
+class _PersistentFileIndex:
+    """Base class of persistent indexes with one entry per file, validated against file size and modification time."""
+
+    version: int = 1
+
+    def __init__(self, index_path: Path):
+        """
+        Initializes the index and loads existing entries from disk.
+        :param index_path: file path of the index
+        """
+        self._index_path = index_path
+        self._entries: Dict[str, Any] = self._load_entries(index_path)
+        self._modified: bool = False
+
+    def _load_entries(self, index_path: Path) -> Dict[str, Any]:
+        """Helper method to load the entries of an existing index file."""
+        if not index_path.is_file():
+            return {}
+        try:
+            with open(index_path, "rb") as f:
+                index_data = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError) as e:
+            logger.warning(f"Could not read index {index_path}, rebuilding it: {e}")
+            return {}
+        if index_data.get("version") != self.version:
+            logger.info(f"Index {index_path} has outdated version, rebuilding it.")
+            return {}
+        return index_data["entries"]
+
+    def _build_entry(self, file_path: Path) -> Any:
+        """
+        Builds the index entry of a file, must provide file_size and file_mtime_ns attributes.
+        :param file_path: path to the indexed file
+        :return: index entry
+        """
+        raise NotImplementedError
+
+    @property
+    def index_path(self) -> Path:
+        """
+        :return: file path of the index.
+        """
+        return self._index_path
+
+    def get_entry(self, file_path: Path) -> Any:
+        """
+        Returns the index entry of a file and (re-)builds it if missing or outdated.
+        :param file_path: path to the indexed file
+        :return: index entry
+        """
+        entry = self._entries.get(file_path.name)
+        stat = file_path.stat()
+        if entry is None or entry.file_size != stat.st_size or entry.file_mtime_ns != stat.st_mtime_ns:
+            entry = self._build_entry(file_path)
+            self._entries[file_path.name] = entry
+            self._modified = True
+        return entry
+
+    def prune(self, file_paths: List[Path]) -> None:
+        """
+        Removes entries of files which are not in the given list, e.g. after files were deleted from a folder.
+        :param file_paths: list of all indexed files
+        """
+        file_names = set(file_path.name for file_path in file_paths)
+        for file_name in [file_name for file_name in self._entries.keys() if file_name not in file_names]:
+            del self._entries[file_name]
+            self._modified = True
+
+    def save(self) -> None:
+        """Writes the index to disk, if entries changed. Failures (e.g. read-only storage) are not fatal."""
+        if not self._modified:
+            return
+
+        index_data = {"version": self.version, "entries": self._entries}
+        tmp_path = self._index_path.with_name(f"{self._index_path.name}.{os.getpid()}.tmp")
+        try:
+            with open(tmp_path, "wb") as f:
+                pickle.dump(index_data, f, protocol=pickle.HIGHEST_PROTOCOL)
+            # atomic replace, such that concurrent workers never read a partially written index
+            os.replace(tmp_path, self._index_path)
+            self._modified = False
+        except OSError as e:
+            logger.warning(f"Could not write index {self._index_path}: {e}")
+            if tmp_path.exists():
+                tmp_path.unlink()
+
+
+class SceneIndex(_PersistentFileIndex):
+    """Persistent index of the frame tokens in a log folder, used to filter scenes without unpickling every log."""
+
+    version: int = SCENE_INDEX_VERSION
+
+    def __init__(self, data_path: Path, index_path: Optional[Path] = None):
+        """
+        Initializes the scene index and loads existing entries from disk.
+        :param data_path: root directory of log folder
+        :param index_path: file path of the index, defaults to a sidecar file next to the log folder
+        """
+        super().__init__(index_path if index_path is not None else self.get_default_index_path(data_path))
+
+    @staticmethod
+    def get_default_index_path(data_path: Path) -> Path:
+        """
+        Default index location, placed outside the log folder to not interfere with log discovery.
+        :param data_path: root directory of log folder
+        :return: path to the index file
+        """
+        return data_path.parent / f"{data_path.name}_scene_index.pkl"
+
+    def _build_entry(self, file_path: Path) -> LogIndexEntry:
+        """Inherited, see superclass."""
+        return LogIndexEntry.from_scene_dict_list(file_path, load_scene_dict_list(file_path))
+
+    def get_log_entry(self, log_path: Path) -> LogIndexEntry:
+        """
+        Returns the index entry of a log and (re-)builds it if missing or outdated.
+        :param log_path: path to the log file
+        :return: log index entry
+        """
+        return self.get_entry(log_path)
+
+
+@dataclass
+class SyntheticSceneEntry:
+    """Metadata of a synthetic scene file, sufficient to filter synthetic scenes without loading them."""
+
+    file_size: int
+    file_mtime_ns: int
+    scene_metadata: SceneMetadata
+
+
+class SyntheticSceneManifest(_PersistentFileIndex):
+    """Persistent manifest of the metadata of all synthetic scenes in a folder."""
+
+    version: int = SYNTHETIC_SCENE_MANIFEST_VERSION
+
+    def __init__(self, synthetic_scenes_path: Path, manifest_path: Optional[Path] = None):
+        """
+        Initializes the synthetic scene manifest and loads existing entries from disk.
+        :param synthetic_scenes_path: root directory of synthetic scene pickles
+        :param manifest_path: file path of the manifest, defaults to a sidecar file next to the scene folder
+        """
+        if manifest_path is None:
+            manifest_path = synthetic_scenes_path.parent / f"{synthetic_scenes_path.name}_manifest.pkl"
+        super().__init__(manifest_path)
+
+    def _build_entry(self, file_path: Path) -> SyntheticSceneEntry:
+        """Inherited, see superclass."""
+        stat = file_path.stat()
+        with open(file_path, "rb") as f:
+            scene_data = pickle.load(f)
+        return SyntheticSceneEntry(
+            file_size=stat.st_size,
+            file_mtime_ns=stat.st_mtime_ns,
+            scene_metadata=SceneMetadata(**scene_data["scene_metadata"]),
+        )
+
+    def get_scene_metadata(self, scene_path: Path) -> SceneMetadata:
+        """
+        Returns the metadata of a synthetic scene and (re-)builds its entry if missing or outdated.
+        :param scene_path: path to the synthetic scene pickle
+        :return: scene metadata dataclass
+        """
+        return self.get_entry(scene_path).scene_metadata
@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Optional
+
+import numpy.typing as npt
+
+
+class SensorBlobCache:
+    """
+    Least-recently-used cache of decoded sensor blobs (camera images, lidar point clouds) with a byte budget.
+    Overlapping scenes of a log share most frames, such that consecutive scenes can reuse the decoded blobs.
+    The returned arrays are shared by all scenes of the cache and therefore read-only. Callers which modify sensor data
+    in-place (e.g. augmentations) have to copy them first.
+    """
+
+    def __init__(self, max_bytes: int):
+        """
+        Initializes the cache.
+        :param max_bytes: maximum number of bytes of cached arrays
+        """
+        assert max_bytes >= 0, "SensorBlobCache: max_bytes must be non-negative."
+        self._max_bytes = max_bytes
+        self._blobs: OrderedDict[Hashable, npt.NDArray] = OrderedDict()
+        self._num_bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._lock = threading.Lock()
+
+    def get_or_load(self, key: Hashable, load_fn: Callable[[], npt.NDArray]) -> npt.NDArray:
+        """
+        Returns a cached blob or loads and caches it. Cached arrays are read-only, since they are shared by scenes.
+        Blobs larger than the budget are returned writeable without caching.
+        :param key: hashable key of the blob, e.g. the blob path and decoding options
+        :param load_fn: function loading the blob
+        :return: decoded blob array
+        """
+        with self._lock:
+            blob = self._blobs.get(key)
+            if blob is not None:
+                self._blobs.move_to_end(key)
+                self._hits += 1
+                return blob
+            self._misses += 1
+
+        # decode outside of the lock, such that loading threads do not block each other
+        blob = load_fn()
+        if blob.nbytes > self._max_bytes:
+            return blob
+        blob.flags.writeable = False
+
+        with self._lock:
+            if key not in self._blobs:
+                self._blobs[key] = blob
+                self._num_bytes += blob.nbytes
+                while self._num_bytes > self._max_bytes:
+                    _, evicted_blob = self._blobs.popitem(last=False)
+                    self._num_bytes -= evicted_blob.nbytes
+                    self._evictions += 1
+        return blob
+
+    def get_stats(self) -> Dict[str, float]:
+        """
+        :return: dictionary with number of hits, misses, evictions, cached blobs and bytes, and the hit rate.
+        """
+        with self._lock:
+            num_requests = self._hits + self._misses
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / num_requests if num_requests > 0 else 0.0,
+                "evictions": self._evictions,
+                "num_blobs": len(self._blobs),
+                "num_bytes": self._num_bytes,
+            }
+
+    def clear(self) -> None:
+        """Removes all cached blobs and resets the statistics."""
+        with self._lock:
+            self._blobs.clear()
+            self._num_bytes = 0
+            self._hits, self._misses, self._evictions = 0, 0, 0
+
+    def __getstate__(self) -> Dict[str, object]:
+        """Only the budget is pickled, e.g. into dataloader workers or ray tasks."""
+        return {"max_bytes": self._max_bytes}
+
+    def __setstate__(self, state: Dict[str, object]) -> None:
+        """Restores an empty cache after unpickling."""
+        self.__init__(state["max_bytes"])
+
+
+_sensor_blob_cache: Optional[SensorBlobCache] = None
+_sensor_blob_cache_max_bytes: Optional[int] = None
+_sensor_blob_cache_lock = threading.Lock()
+
+
+def configure_sensor_blob_cache(max_bytes: int) -> Optional[SensorBlobCache]:
+    """
+    Sets up the sensor blob cache shared by all scene constructions of the process, see sensor_blob_cache_max_bytes of
+    SceneFilter. An existing cache with the same budget is kept, e.g. across scene loaders of a worker.
+    :param max_bytes: maximum number of bytes of cached arrays per process, zero disables the cache
+    :return: process-wide sensor blob cache, or None if disabled
+    """
+    global _sensor_blob_cache, _sensor_blob_cache_max_bytes
+    with _sensor_blob_cache_lock:
+        if max_bytes == 0:
+            _sensor_blob_cache, _sensor_blob_cache_max_bytes = None, None
+        elif _sensor_blob_cache_max_bytes != max_bytes:
+            _sensor_blob_cache = SensorBlobCache(max_bytes)
+            _sensor_blob_cache_max_bytes = max_bytes
+        return _sensor_blob_cache
+
+
+def get_sensor_blob_cache() -> Optional[SensorBlobCache]:
+    """
+    Returns the sensor blob cache shared by all scene constructions of the process.
+    :return: process-wide sensor blob cache, or None if not set up with configure_sensor_blob_cache
+    """
+    with _sensor_blob_cache_lock:
+        return _sensor_blob_cache
@@ -3,7 +3,7 @@ import logging
 import os
 import uuid
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 from hydra.utils import instantiate
 from nuplan.planning.training.experiments.cache_metadata_entry import (
@@ -12,13 +12,17 @@ from nuplan.planning.training.experiments.cache_metadata_entry import (
     save_cache_metadata,
 )
 from nuplan.planning.utils.multithreading.worker_pool import WorkerPool
-from nuplan.planning.utils.multithreading.worker_utils import worker_map
 from omegaconf import DictConfig
 
 from navsim.common.dataclasses import Scene, SensorConfig
 from navsim.common.dataloader import SceneFilter, SceneLoader
+from navsim.planning.metric_caching.caching_manifest import CachingManifest, ManifestWriter
 from navsim.planning.metric_caching.metric_cache_processor import MetricCacheProcessor
 from navsim.planning.scenario_builder.navsim_scenario import NavSimScenario
+from navsim.planning.simulation.planner.pdm_planner.observation.pdm_drivable_area_cache import (
+    configure_drivable_area_tile_cache,
+)
+from navsim.planning.utils.multithreading.token_scheduler import time_tokens, token_batch_map
 
 logger = logging.getLogger(__name__)
 
@@ -39,8 +43,22 @@ def cache_scenarios(args: List[Dict[str, Union[List[str], DictConfig]]]) -> List
     #
     # This is necessary to save memory when running on large datasets.
     def cache_scenarios_internal(args: List[Dict[str, Union[Path, DictConfig]]]) -> List[CacheResult]:
+        def cache_with_manifest(
+            token: str, scenario: NavSimScenario, processor: MetricCacheProcessor
+        ) -> Optional[CacheMetadataEntry]:
+            if manifest_writer is None:
+                return processor.compute_and_save_metric_cache(scenario)
+            try:
+                file_cache_metadata = processor.compute_and_save_metric_cache(scenario)
+            except Exception as e:
+                logger.warning(f"Failed to cache token {token}: {e}")
+                manifest_writer.add_failure(token, f"{type(e).__name__}: {e}")
+                return None
+            manifest_writer.add_success(token, file_cache_metadata.file_name)
+            return file_cache_metadata
+
         def cache_single_scenario(
-            scene_dict: Dict[str, Any], processor: MetricCacheProcessor
+            token: str, scene_dict: Dict[str, Any], processor: MetricCacheProcessor
         ) -> Optional[CacheMetadataEntry]:
             scene = Scene.from_scene_dict_list(
                 scene_dict,
@@ -55,15 +73,15 @@ def cache_scenarios(args: List[Dict[str, Union[List[str], DictConfig]]]) -> List
                 map_version="nuplan-maps-v1.0",
             )
 
-            return processor.compute_and_save_metric_cache(scenario)
+            return cache_with_manifest(token, scenario, processor)
 
         def cache_single_synthetic_scenario(
-            scene_path: Path, processor: MetricCacheProcessor
+            token: str, scene_path: Path, processor: MetricCacheProcessor
         ) -> Optional[CacheMetadataEntry]:
             scene = Scene.load_from_disk(scene_path, None, SensorConfig.build_no_sensors())
             scenario = NavSimScenario(scene, map_root=os.environ["NUPLAN_MAPS_ROOT"], map_version="nuplan-maps-v1.0")
 
-            return processor.compute_and_save_metric_cache(scenario)
+            return cache_with_manifest(token, scenario, processor)
 
         node_id = int(os.environ.get("NODE_RANK", 0))
         thread_id = str(uuid.uuid4())
@@ -75,6 +93,9 @@ def cache_scenarios(args: List[Dict[str, Union[List[str], DictConfig]]]) -> List
         scene_filter: SceneFilter = instantiate(cfg.train_test_split.scene_filter)
         scene_filter.log_names = log_names
         scene_filter.tokens = tokens
+        # logs may be split across batches, such that only the synthetic scenes of this batch must be loaded
+        scene_filter.synthetic_scene_tokens = tokens
+        scene_filter.num_log_loading_workers = 1  # logs are already distributed across workers
         scene_loader = SceneLoader(
             synthetic_sensor_path=None,
             original_sensor_path=None,
@@ -87,39 +108,65 @@ def cache_scenarios(args: List[Dict[str, Union[List[str], DictConfig]]]) -> List
         # Create feature preprocessor
         assert cfg.metric_cache_path is not None, f"Cache path cannot be None when caching, got {cfg.metric_cache_path}"
 
+        # completed tokens are skipped before distribution (unless caching_manifest.recompute_completed), the remaining
+        # ones are recomputed as their files may be partial
+        manifest_writer: Optional[ManifestWriter] = None
+        if cfg.caching_manifest.enabled:
+            manifest_writer = CachingManifest(Path(cfg.metric_cache_path)).open_writer(f"{node_id}_{thread_id}")
+
+        # shared by the batches of this worker process, such that neighbouring scenes of split logs still share tiles
+        tile_cache_cfg = cfg.drivable_area_tile_cache
+        drivable_area_tile_cache = configure_drivable_area_tile_cache(
+            max_bytes=tile_cache_cfg.max_bytes if tile_cache_cfg.enabled else 0,
+            tile_size=tile_cache_cfg.tile_size,
+            check_equivalence=tile_cache_cfg.check_equivalence,
+        )
+
         processor = MetricCacheProcessor(
             cache_path=cfg.metric_cache_path,
-            force_feature_computation=cfg.force_feature_computation,
+            force_feature_computation=cfg.force_feature_computation or manifest_writer is not None,
             proposal_sampling=instantiate(cfg.proposal_sampling),
+            storage=cfg.metric_cache_storage,
+            drivable_area_raster_resolution=(
+                cfg.drivable_area_raster.resolution if cfg.drivable_area_raster.enabled else None
+            ),
+            drivable_area_raster_radius=cfg.drivable_area_raster.radius,
         )
 
         logger.info(f"Extracted {len(scene_loader)} scenarios for thread_id={thread_id}, node_id={node_id}.")
         num_failures = 0
         num_successes = 0
         all_file_cache_metadata: List[Optional[CacheMetadataEntry]] = []
-        for idx, scene_dict in enumerate(scene_loader.scene_frames_dicts.values()):
+        for idx, (token, scene_dict) in enumerate(scene_loader.scene_frames_dicts.items()):
             logger.info(
                 f"Processing scenario {idx + 1} / {len(scene_loader.scene_frames_dicts)} in thread_id={thread_id}, node_id={node_id}"
             )
-            file_cache_metadata = cache_single_scenario(scene_dict, processor)
-            gc.collect()
+            with time_tokens(scene_loader.scene_catalog.get_record(token).log_name):
+                file_cache_metadata = cache_single_scenario(token, scene_dict, processor)
+                gc.collect()
 
             num_failures += 0 if file_cache_metadata else 1
             num_successes += 1 if file_cache_metadata else 0
             all_file_cache_metadata += [file_cache_metadata]
 
-        for idx, (scene_path, _) in enumerate(scene_loader.synthetic_scenes.values()):
+        for idx, (token, (scene_path, _)) in enumerate(scene_loader.synthetic_scenes.items()):
             logger.info(
                 f"Processing synthetic scenario {idx + 1} / {len(scene_loader.synthetic_scenes)} in thread_id={thread_id}, node_id={node_id}"
             )
-            file_cache_metadata = cache_single_synthetic_scenario(scene_path, processor)
-            gc.collect()
+            with time_tokens(scene_loader.scene_catalog.get_record(token).log_name):
+                file_cache_metadata = cache_single_synthetic_scenario(token, scene_path, processor)
+                gc.collect()
 
             num_failures += 0 if file_cache_metadata else 1
             num_successes += 1 if file_cache_metadata else 0
             all_file_cache_metadata += [file_cache_metadata]
 
         logger.info(f"Finished processing scenarios for thread_id={thread_id}, node_id={node_id}")
+        if drivable_area_tile_cache is not None:
+            logger.info(
+                f"Drivable area tile cache of thread_id={thread_id}, node_id={node_id}: "
+                f"{drivable_area_tile_cache.get_stats()}"
+            )
         return [
             CacheResult(
                 failures=num_failures,
@@ -136,6 +183,43 @@ def cache_scenarios(args: List[Dict[str, Union[List[str], DictConfig]]]) -> List
     return result
 
 
+def _filter_tokens_with_manifest(
+    cfg: DictConfig, tokens_list_per_log: Dict[str, List[str]]
+) -> Tuple[Dict[str, List[str]], List[CacheMetadataEntry]]:
+    """
+    Helper function to remove tokens from the caching job, which were completed or should not be retried.
+    :param cfg: omegaconf dictionary
+    :param tokens_list_per_log: dictionary of log names and tokens to cache
+    :return: tuple of the remaining tokens per log and the metadata of completed tokens
+    """
+    manifest = CachingManifest(Path(cfg.metric_cache_path))
+    manifest_cfg = cfg.caching_manifest
+
+    remaining_tokens_list_per_log: Dict[str, List[str]] = {}
+    completed_metadata: List[CacheMetadataEntry] = []
+    num_skipped_failures = 0
+    for log_name, tokens_list in tokens_list_per_log.items():
+        remaining_tokens: List[str] = []
+        for token in tokens_list:
+            entry = manifest.get_entry(token)
+            if entry is not None and entry.is_valid() and not manifest_cfg.recompute_completed:
+                completed_metadata.append(CacheMetadataEntry(Path(entry.file_path)))
+            elif entry is not None and not entry.success and not manifest_cfg.retry_failed_tokens:
+                num_skipped_failures += 1
+            elif manifest_cfg.only_failed_tokens and (entry is None or entry.success):
+                continue
+            else:
+                remaining_tokens.append(token)
+        if len(remaining_tokens) > 0:
+            remaining_tokens_list_per_log[log_name] = remaining_tokens
+
+    logger.info(
+        f"Caching manifest: skipping {len(completed_metadata)} completed and {num_skipped_failures} failed tokens, "
+        f"{sum(len(tokens) for tokens in remaining_tokens_list_per_log.values())} tokens remaining."
+    )
+    return remaining_tokens_list_per_log, completed_metadata
+
+
 def cache_data(cfg: DictConfig, worker: WorkerPool) -> None:
     """
     Build the lightning datamodule and cache all samples.
@@ -143,6 +227,15 @@ def cache_data(cfg: DictConfig, worker: WorkerPool) -> None:
     :param worker: Worker to submit tasks which can be executed in parallel
     """
     assert cfg.metric_cache_path is not None, f"Cache path cannot be None when caching, got {cfg.metric_cache_path}"
+    if cfg.caching_manifest.only_failed_tokens:
+        # only_failed_tokens is ignored without the manifest, and skips every token without retries (reporting success)
+        assert (
+            cfg.caching_manifest.enabled
+        ), "caching_manifest.only_failed_tokens requires caching_manifest.enabled=true"
+        assert cfg.caching_manifest.retry_failed_tokens, (
+            "caching_manifest.only_failed_tokens=true retries nothing with caching_manifest.retry_failed_tokens=false, "
+            "set retry_failed_tokens=true"
+        )
 
     # Extract scenes based on scene-loader to know which tokens to distribute across workers
     # TODO: infer the tokens per log from metadata, to not have to load metric cache and scenes here
@@ -155,17 +248,16 @@ def cache_data(cfg: DictConfig, worker: WorkerPool) -> None:
         sensor_config=SensorConfig.build_no_sensors(),
     )
 
-    data_points = [
-        {
-            "cfg": cfg,
-            "log_file": log_file,
-            "tokens": tokens_list,
-        }
-        for log_file, tokens_list in scene_loader.get_tokens_list_per_log().items()
-    ]
-    logger.info("Starting metric caching of %s files...", str(len(data_points)))
+    tokens_list_per_log = scene_loader.get_tokens_list_per_log()
+    skipped_metadata: List[CacheMetadataEntry] = []
+    if cfg.caching_manifest.enabled:
+        tokens_list_per_log, skipped_metadata = _filter_tokens_with_manifest(cfg, tokens_list_per_log)
 
-    cache_results = worker_map(worker, cache_scenarios, data_points)
+    logger.info("Starting metric caching of %s files...", str(len(tokens_list_per_log)))
+
+    cache_results = token_batch_map(
+        worker, cache_scenarios, tokens_list_per_log, cfg.scheduler, extra_items={"cfg": cfg}
+    )
 
     num_success = sum(result.successes for result in cache_results)
     num_fail = sum(result.failures for result in cache_results)
@@ -182,7 +274,7 @@ def cache_data(cfg: DictConfig, worker: WorkerPool) -> None:
             str(num_total),
         )
 
-    cached_metadata = [
+    cached_metadata = skipped_metadata + [
         cache_metadata_entry
         for cache_result in cache_results
         for cache_metadata_entry in cache_result.cache_metadata
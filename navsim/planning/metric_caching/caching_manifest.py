@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_DIR_NAME = "manifest"
+MANIFEST_SUFFIX = ".jsonl"
+
+
+@dataclass
+class ManifestEntry:
+    """Completion record of a single token, appended to the manifest after caching the token."""
+
+    token: str
+    success: bool
+    file_path: Optional[str] = None  # cache file, if successful
+    file_size: Optional[int] = None
+    file_mtime_ns: Optional[int] = None
+    reason: Optional[str] = None  # error message, if failed
+
+    def is_valid(self) -> bool:
+        """
+        Checks whether the cache file of a successful entry still exists unchanged.
+        :return: whether the cached token can be skipped
+        """
+        if not self.success or self.file_path is None:
+            return False
+        try:
+            stat = os.stat(self.file_path)
+        except OSError:
+            return False
+        return stat.st_size == self.file_size and stat.st_mtime_ns == self.file_mtime_ns
+
+
+class CachingManifest:
+    """
+    Manifest of completed and failed tokens of a (resumable) caching job.
+    Each worker appends entries to its own jsonl file in the manifest folder, such that no locking is required.
+    The latest entry of a token across all files is valid.
+    """
+
+    def __init__(self, cache_path: Path):
+        """
+        Initializes the manifest and loads the entries of previous runs.
+        :param cache_path: root directory of the cache
+        """
+        self._manifest_path = Path(cache_path) / MANIFEST_DIR_NAME
+        self._entries: Dict[str, ManifestEntry] = self._load_entries()
+
+    def _load_entries(self) -> Dict[str, ManifestEntry]:
+        """Helper method to read the entries of all manifest files."""
+        entries: Dict[str, ManifestEntry] = {}
+        if not self._manifest_path.is_dir():
+            return entries
+
+        # order entries by file modification time, such that later runs overwrite earlier entries
+        manifest_files = sorted(
+            self._manifest_path.glob(f"*{MANIFEST_SUFFIX}"), key=lambda path: path.stat().st_mtime_ns
+        )
+        for manifest_file in manifest_files:
+            with open(manifest_file, "r") as f:
+                for line in f:
+                    try:
+                        entry = ManifestEntry(**json.loads(line))
+                    except (json.JSONDecodeError, TypeError):
+                        # partially written line of a crashed worker
+                        logger.warning(f"Skipping invalid manifest entry in {manifest_file}.")
+                        continue
+                    entries[entry.token] = entry
+        return entries
+
+    def get_entry(self, token: str) -> Optional[ManifestEntry]:
+        """
+        :param token: scene identifier
+        :return: latest manifest entry of the token, if any.
+        """
+        return self._entries.get(token)
+
+    def is_completed(self, token: str) -> bool:
+        """
+        :param token: scene identifier
+        :return: whether the token was cached successfully and its cache file is unchanged.
+        """
+        entry = self._entries.get(token)
+        return entry is not None and entry.is_valid()
+
+    def get_completed_entries(self) -> List[ManifestEntry]:
+        """
+        :return: list of successful entries with valid cache files.
+        """
+        return [entry for entry in self._entries.values() if entry.is_valid()]
+
+    def get_failed_entries(self) -> List[ManifestEntry]:
+        """
+        :return: list of entries of tokens whose latest attempt failed.
+        """
+        return [entry for entry in self._entries.values() if not entry.success]
+
+    def open_writer(self, writer_name: str) -> ManifestWriter:
+        """
+        Creates a writer appending to a manifest file of its own.
+        :param writer_name: unique name of the writer, e.g. node and thread id
+        :return: manifest writer
+        """
+        self._manifest_path.mkdir(parents=True, exist_ok=True)
+        return ManifestWriter(self._manifest_path / f"{writer_name}{MANIFEST_SUFFIX}")
+
+
+class ManifestWriter:
+    """Appends manifest entries of a single worker, each flushed to disk before caching continues."""
+
+    def __init__(self, manifest_file: Path):
+        """
+        Initializes the writer.
+        :param manifest_file: jsonl file of the worker
+        """
+        self._manifest_file = manifest_file
+
+    def _append(self, entry: ManifestEntry) -> None:
+        """Helper method to append an entry with a single write, such that crashes never corrupt previous entries."""
+        line = json.dumps(asdict(entry)) + "\n"
+        fd = os.open(self._manifest_file, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line.encode())
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def add_success(self, token: str, file_path: Path) -> None:
+        """
+        Records a successfully cached token.
+        :param token: scene identifier
+        :param file_path: written cache file
+        """
+        stat = os.stat(file_path)
+        self._append(
+            ManifestEntry(
+                token=token,
+                success=True,
+                file_path=str(file_path),
+                file_size=stat.st_size,
+                file_mtime_ns=stat.st_mtime_ns,
+            )
+        )
+
+    def add_failure(self, token: str, reason: str) -> None:
+        """
+        Records a token which could not be cached.
+        :param token: scene identifier
+        :param reason: error message
+        """
+        self._append(ManifestEntry(token=token, success=False, reason=reason))
@@ -1,10 +1,10 @@
 from __future__ import annotations
 
-import lzma
+import dataclasses
 import pickle
 from dataclasses import dataclass
 from pathlib import Path
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 
 from nuplan.common.actor_state.ego_state import EgoState
 from nuplan.common.actor_state.state_representation import TimePoint
@@ -14,6 +14,16 @@ from nuplan.planning.simulation.trajectory.interpolated_trajectory import Interp
 
 from navsim.common.dataclasses import Trajectory
 from navsim.common.enums import SceneFrameType
+from navsim.planning.metric_caching.metric_cache_schema import (
+    METRIC_CACHE_SCHEMA_VERSION,
+    EncodedField,
+    encode_metric_cache_field,
+)
+from navsim.planning.metric_caching.metric_cache_storage import (
+    DEFAULT_METRIC_CACHE_STORAGE,
+    decode_metric_cache_buffer,
+    get_metric_cache_storage,
+)
 from navsim.planning.simulation.planner.pdm_planner.observation.pdm_observation import PDMObservation
 from navsim.planning.simulation.planner.pdm_planner.observation.pdm_occupancy_map import PDMDrivableMap
 from navsim.planning.simulation.planner.pdm_planner.utils.pdm_path import PDMPath
@@ -50,8 +60,78 @@ class MetricCache:
 
     map_parameters: MapParameters
 
-    def dump(self) -> None:
-        """Dump metric cache to pickle with lzma compression."""
+    def __getstate__(self) -> Dict[str, Any]:
+        """
+        Pickles the metric cache in the versioned array-native schema, see metric_cache_schema.py.
+        Fields which were not decoded after loading are pickled without decoding them.
+        """
+        encoded_fields: Dict[str, EncodedField] = dict(self.__dict__.get("_encoded_fields", {}))
+        fields: Dict[str, Any] = {}
+        for field in dataclasses.fields(self):
+            if field.name not in self.__dict__:
+                continue
+            value = self.__dict__[field.name]
+            try:
+                encoded_field = encode_metric_cache_field(field.name, value)
+            except ValueError:
+                # objects which are not supported by the schema are pickled as is
+                encoded_field = None
+            if encoded_field is not None:
+                encoded_fields[field.name] = encoded_field
+            else:
+                fields[field.name] = value
+        return {"schema_version": METRIC_CACHE_SCHEMA_VERSION, "fields": fields, "encoded_fields": encoded_fields}
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        """
+        Restores the metric cache. Encoded fields are only rebuilt into nuPlan objects when accessed.
+        Metric caches pickled before the array-native schema are restored as is.
+        """
+        if "schema_version" not in state:
+            self.__dict__.update(state)
+            return
+        assert (
+            state["schema_version"] <= METRIC_CACHE_SCHEMA_VERSION
+        ), f"MetricCache: schema version {state['schema_version']} is newer than {METRIC_CACHE_SCHEMA_VERSION}"
+        self.__dict__.update(state["fields"])
+        self.__dict__["_encoded_fields"] = dict(state["encoded_fields"])
+
+    def __getattr__(self, name: str) -> Any:
+        """Lazily decodes encoded fields on first access."""
+        encoded_field = self.__dict__.get("_encoded_fields", {}).get(name)
+        if encoded_field is None:
+            if name in self.__dict__:  # decoded concurrently by another thread
+                return self.__dict__[name]
+            raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+        value = encoded_field.decode()
+        self.__dict__[name] = value
+        self.__dict__["_encoded_fields"].pop(name, None)
+        return value
+
+    def dump(self, storage: str = DEFAULT_METRIC_CACHE_STORAGE) -> None:
+        """
+        Dump metric cache to pickle, encoded by a storage backend (lzma compression by default).
+        :param storage: name of the storage backend, see METRIC_CACHE_STORAGES
+        """
         # TODO: check if file_path must really be pickled
         pickle_object = pickle.dumps(self, protocol=pickle.HIGHEST_PROTOCOL)
-        save_buffer(self.file_path, lzma.compress(pickle_object, preset=0))
+        save_buffer(self.file_path, get_metric_cache_storage(storage).encode(pickle_object))
+
+    @staticmethod
+    def from_buffer(buffer: bytes) -> MetricCache:
+        """
+        Load metric cache from stored bytes of any storage backend.
+        :param buffer: stored bytes
+        :return: metric cache dataclass
+        """
+        return pickle.loads(decode_metric_cache_buffer(buffer))
+
+    @staticmethod
+    def load(file_path: Path) -> MetricCache:
+        """
+        Load metric cache from file of any storage backend.
+        :param file_path: path to the metric cache file
+        :return: metric cache dataclass
+        """
+        with open(file_path, "rb") as f:
+            return MetricCache.from_buffer(f.read())
@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+import fcntl
+import hashlib
+import logging
+import mmap
+import os
+import pickle
+import shutil
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from navsim.planning.metric_caching.metric_cache import MetricCache
+from navsim.planning.metric_caching.metric_cache_storage import decode_metric_cache_buffer
+
+logger = logging.getLogger(__name__)
+
+METRIC_CACHE_POOL_SUFFIX = ".pkl"
+
+
+class MetricCachePool:
+    """
+    Node-local pool of decoded metric caches, shared by all workers and runs on a machine.
+    Entries are uncompressed pickles in a memory-backed directory (e.g. /dev/shm), which are memory-mapped for loading,
+    such that a metric cache is only read from the cache folder and decompressed once per node.
+    The pool is bounded by a byte budget with least-recently-used eviction, where file modification times track recency.
+    """
+
+    def __init__(self, pool_path: Path, max_bytes: int):
+        """
+        Initializes the pool.
+        :param pool_path: node-local directory of the pool, preferably on a memory-backed file system
+        :param max_bytes: maximum number of bytes of pooled metric caches
+        """
+        assert max_bytes >= 0, "MetricCachePool: max_bytes must be non-negative."
+        self._pool_path = Path(pool_path)
+        self._pool_path.mkdir(parents=True, exist_ok=True)
+        self._max_bytes = max_bytes
+        self._hits = 0
+        self._misses = 0
+        self._stats_lock = threading.Lock()
+        self._insert_failed = False  # whether a failed insertion was logged already
+
+    def __getstate__(self) -> Dict[str, object]:
+        """Only the location and budget are pickled, e.g. into ray tasks."""
+        return {"pool_path": self._pool_path, "max_bytes": self._max_bytes}
+
+    def __setstate__(self, state: Dict[str, object]) -> None:
+        """Restores the pool with empty statistics after unpickling."""
+        self.__init__(state["pool_path"], state["max_bytes"])
+
+    @contextmanager
+    def _lock_pool(self) -> Iterator[None]:
+        """Helper context manager for an exclusive lock of the pool across processes."""
+        with open(self._pool_path / ".lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _get_entry_path(self, file_path: Path) -> Path:
+        """Helper method to get the pool entry of a cache file, which changes if the cache file is rewritten."""
+        stat = file_path.stat()
+        key = f"{file_path.resolve()}:{stat.st_size}:{stat.st_mtime_ns}"
+        return self._pool_path / f"{hashlib.sha1(key.encode()).hexdigest()}{METRIC_CACHE_POOL_SUFFIX}"
+
+    def _get_entries(self) -> List[Tuple[float, int, Path]]:
+        """Helper method to list the pool entries with modification time and size."""
+        entries = []
+        for entry in os.scandir(self._pool_path):
+            if not entry.name.endswith(METRIC_CACHE_POOL_SUFFIX):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue  # evicted by another process
+            entries.append((stat.st_mtime, stat.st_size, Path(entry.path)))
+        return entries
+
+    def _insert(self, entry_path: Path, buffer: bytes) -> None:
+        """
+        Helper method to add a decoded metric cache to the pool, evicting least-recently-used entries.
+        Insertion is best-effort, e.g. if the pool file system is smaller than the budget, the entry is not pooled.
+        """
+        if len(buffer) > self._max_bytes:
+            return
+        tmp_path = entry_path.with_name(f"{entry_path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            with self._lock_pool():
+                entries = sorted(self._get_entries())
+                num_bytes = sum(size for _, size, _ in entries) + len(buffer)
+                for _, size, path in entries:
+                    if num_bytes <= self._max_bytes:
+                        break
+                    path.unlink(missing_ok=True)
+                    num_bytes -= size
+
+                free_bytes = shutil.disk_usage(self._pool_path).free
+                if free_bytes < len(buffer):
+                    raise OSError(f"only {free_bytes} bytes free for an entry of {len(buffer)} bytes")
+
+                with open(tmp_path, "wb") as f:
+                    f.write(buffer)
+                os.replace(tmp_path, entry_path)
+        except OSError as e:
+            tmp_path.unlink(missing_ok=True)
+            if not self._insert_failed:
+                self._insert_failed = True
+                logger.warning(
+                    f"MetricCachePool: could not write to {self._pool_path} ({e}), metric caches are loaded without "
+                    "pooling. Consider reducing the pool budget or using a larger file system."
+                )
+
+    def _load_entry(self, entry_path: Path) -> Optional[MetricCache]:
+        """Helper method to load a pooled metric cache, returns None if not pooled."""
+        try:
+            with open(entry_path, "rb") as f:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                    metric_cache: MetricCache = pickle.loads(buffer)
+            # mark as recently used
+            os.utime(entry_path)
+        except FileNotFoundError:
+            return None
+        return metric_cache
+
+    def get(self, file_path: Path) -> MetricCache:
+        """
+        Loads a metric cache through the pool.
+        :param file_path: path to the metric cache file in the cache folder
+        :return: metric cache dataclass
+        """
+        file_path = Path(file_path)
+        entry_path = self._get_entry_path(file_path)
+        metric_cache = self._load_entry(entry_path)
+        with self._stats_lock:
+            if metric_cache is not None:
+                self._hits += 1
+            else:
+                self._misses += 1
+        if metric_cache is not None:
+            return metric_cache
+
+        buffer = decode_metric_cache_buffer(file_path.read_bytes())
+        self._insert(entry_path, buffer)
+        return pickle.loads(buffer)
+
+    def get_stats(self) -> Dict[str, float]:
+        """
+        :return: dictionary with number of hits and misses of the current process, and pooled entries and bytes of the node.
+        """
+        entries = self._get_entries()
+        with self._stats_lock:
+            num_requests = self._hits + self._misses
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / num_requests if num_requests > 0 else 0.0,
+                "num_entries": len(entries),
+                "num_bytes": sum(size for _, size, _ in entries),
+            }
+
+    def clear(self) -> None:
+        """Removes all pooled metric caches of the node."""
+        with self._lock_pool():
+            for _, _, path in self._get_entries():
+                path.unlink(missing_ok=True)
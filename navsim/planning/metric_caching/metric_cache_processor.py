@@ -2,6 +2,7 @@ import pathlib
 from typing import Any, Dict, List, Optional, Tuple
 
 import numpy as np
+import numpy.typing as npt
 from nuplan.common.actor_state.agent import Agent
 from nuplan.common.actor_state.oriented_box import OrientedBox
 from nuplan.common.actor_state.state_representation import StateSE2, StateVector2D
@@ -23,7 +24,8 @@ from nuplan.planning.training.experiments.cache_metadata_entry import CacheMetad
 from navsim.common.dataclasses import Trajectory
 from navsim.common.enums import SceneFrameType
 from navsim.planning.metric_caching.metric_cache import MapParameters, MetricCache
-from navsim.planning.metric_caching.metric_caching_utils import StateInterpolator
+from navsim.planning.metric_caching.metric_cache_storage import DEFAULT_METRIC_CACHE_STORAGE
+from navsim.planning.metric_caching.metric_caching_utils import BatchStateInterpolator
 from navsim.planning.scenario_builder.navsim_scenario import NavSimScenario
 from navsim.planning.simulation.planner.pdm_planner.observation.pdm_observation import PDMObservation
 from navsim.planning.simulation.planner.pdm_planner.pdm_closed_planner import PDMClosedPlanner
@@ -38,14 +40,23 @@ class MetricCacheProcessor:
         cache_path: Optional[str],
         force_feature_computation: bool,
         proposal_sampling: TrajectorySampling,
+        storage: str = DEFAULT_METRIC_CACHE_STORAGE,
+        drivable_area_raster_resolution: Optional[float] = None,
+        drivable_area_raster_radius: float = 64.0,
     ):
         """
         Initialize class.
         :param cache_path: Whether to cache features.
         :param force_feature_computation: If true, even if cache exists, it will be overwritten.
+        :param storage: name of the storage backend of the metric cache files, defaults to lzma
+        :param drivable_area_raster_resolution: cell size of the drivable area raster [m], not rasterized if None
+        :param drivable_area_raster_radius: half side length of the drivable area raster around ego [m]
         """
         self._cache_path = pathlib.Path(cache_path) if cache_path else None
         self._force_feature_computation = force_feature_computation
+        self._storage = storage
+        self._drivable_area_raster_resolution = drivable_area_raster_resolution
+        self._drivable_area_raster_radius = drivable_area_raster_radius
 
         # 1s additional observation for ttc metric
         future_poses = proposal_sampling.num_poses + int(1.0 / proposal_sampling.interval_length)
@@ -124,88 +135,100 @@ class MetricCacheProcessor:
             scenario.get_tracked_objects_at_iteration(iteration=iteration) for iteration in gt_indices
         ]
 
-        detection_tracks_states: Dict[str, Any] = {}
+        # pack the states of all objects into a padded (objects x time x state) array with validity mask
         unique_detection_tracks: Dict[str, Any] = {}
-
-        for time_s, detection_track in zip(relative_time_s, gt_detection_tracks):
-
+        token_indices: Dict[str, int] = {}
+        object_indices: List[int] = []
+        time_indices: List[int] = []
+        tracked_states: List[Tuple[float, ...]] = []
+        for time_idx, detection_track in enumerate(gt_detection_tracks[: len(relative_time_s)]):
             for tracked_object in detection_track.tracked_objects:
                 # log detection track
                 token = tracked_object.track_token
-
-                # extract states for dynamic and static objects
-                tracked_state = np.zeros(state_size, dtype=np.float64)
-                tracked_state[:4] = (
-                    time_s,
-                    tracked_object.center.x,
-                    tracked_object.center.y,
-                    tracked_object.center.heading,
-                )
-
-                if tracked_object.tracked_object_type in AGENT_TYPES:
-                    # extract additional states for dynamic objects
-                    tracked_state[4:] = (
-                        tracked_object.velocity.x,
-                        tracked_object.velocity.y,
-                    )
-
-                # found new object
-                if token not in detection_tracks_states.keys():
-                    detection_tracks_states[token] = [tracked_state]
+                if token not in unique_detection_tracks:
                     unique_detection_tracks[token] = tracked_object
+                    token_indices[token] = len(token_indices)
 
-                # object already existed
+                # extract additional states for dynamic objects
+                if tracked_object.tracked_object_type in AGENT_TYPES:
+                    velocity = (tracked_object.velocity.x, tracked_object.velocity.y)
                 else:
-                    detection_tracks_states[token].append(tracked_state)
+                    velocity = (0.0, 0.0)
+
+                object_indices.append(token_indices[token])
+                time_indices.append(time_idx)
+                tracked_states.append(
+                    (tracked_object.center.x, tracked_object.center.y, tracked_object.center.heading, *velocity)
+                )
 
-        # create time interpolators
-        detection_interpolators: Dict[str, StateInterpolator] = {}
-        for token, states_list in detection_tracks_states.items():
-            states = np.array(states_list, dtype=np.float64)
-            detection_interpolators[token] = StateInterpolator(states)
+        states = np.zeros((len(unique_detection_tracks), len(relative_time_s), state_size - 1), dtype=np.float64)
+        valid = np.zeros((len(unique_detection_tracks), len(relative_time_s)), dtype=bool)
+        if len(tracked_states) > 0:
+            states[object_indices, time_indices] = tracked_states
+            valid[object_indices, time_indices] = True
 
-        # interpolate at 10Hz
+        # interpolate all objects at 10Hz
         interpolated_time_s = np.arange(0, int(time_horizon / interpolate_step) + 1, 1, dtype=float) * interpolate_step
+        interpolator = BatchStateInterpolator(relative_time_s, states, valid)
+        interpolated_states, interpolated_valid = interpolator.interpolate(interpolated_time_s)
+
+        return self._build_interpolated_detection_tracks(
+            list(unique_detection_tracks.values()),
+            interpolated_states,
+            interpolated_valid,
+            interpolator.num_valid_samples == 1,
+        )
 
+    @staticmethod
+    def _build_interpolated_detection_tracks(
+        initial_detection_tracks: List[Any],
+        interpolated_states: npt.NDArray[np.float64],
+        interpolated_valid: npt.NDArray[np.bool_],
+        is_stationary: npt.NDArray[np.bool_],
+    ) -> List[DetectionsTracks]:
+        """
+        Helper function to materialize interpolated object states as detection tracks.
+        :param initial_detection_tracks: first observation of each object, providing type, box size and metadata
+        :param interpolated_states: states (x, y, heading, velo_x, velo_y), shape (objects, time, 5)
+        :param interpolated_valid: validity of the interpolated states, shape (objects, time)
+        :param is_stationary: whether the object was observed only once, and is kept at all times, shape (objects,)
+        :return: detection tracks of each interpolated time step
+        """
         interpolated_detection_tracks = []
-        for time_s in interpolated_time_s:
+        for time_idx in range(interpolated_valid.shape[1]):
             interpolated_tracks = []
-            for token, interpolator in detection_interpolators.items():
-                initial_detection_track = unique_detection_tracks[token]
-                interpolated_state = interpolator.interpolate(time_s)
-
-                if interpolator.start_time == interpolator.end_time:
+            for object_idx in np.flatnonzero(interpolated_valid[:, time_idx] | is_stationary):
+                initial_detection_track = initial_detection_tracks[object_idx]
+                if is_stationary[object_idx]:
                     interpolated_tracks.append(initial_detection_track)
+                    continue
 
-                elif interpolated_state is not None:
+                interpolated_state = interpolated_states[object_idx, time_idx]
+                tracked_type = initial_detection_track.tracked_object_type
+                metadata = initial_detection_track.metadata  # copied since time stamp is ignored
 
-                    tracked_type = initial_detection_track.tracked_object_type
-                    metadata = initial_detection_track.metadata  # copied since time stamp is ignored
+                oriented_box = OrientedBox(
+                    StateSE2(*interpolated_state[:3]),
+                    initial_detection_track.box.length,
+                    initial_detection_track.box.width,
+                    initial_detection_track.box.height,
+                )
 
-                    oriented_box = OrientedBox(
-                        StateSE2(*interpolated_state[:3]),
-                        initial_detection_track.box.length,
-                        initial_detection_track.box.width,
-                        initial_detection_track.box.height,
+                if tracked_type in AGENT_TYPES:
+                    detection_track = Agent(
+                        tracked_object_type=tracked_type,
+                        oriented_box=oriented_box,
+                        velocity=StateVector2D(*interpolated_state[3:]),
+                        metadata=metadata,  # simply copy
+                    )
+                else:
+                    detection_track = StaticObject(
+                        tracked_object_type=tracked_type,
+                        oriented_box=oriented_box,
+                        metadata=metadata,
                     )
 
-                    if tracked_type in AGENT_TYPES:
-                        velocity = StateVector2D(*interpolated_state[3:])
-
-                        detection_track = Agent(
-                            tracked_object_type=tracked_type,
-                            oriented_box=oriented_box,
-                            velocity=velocity,
-                            metadata=initial_detection_track.metadata,  # simply copy
-                        )
-                    else:
-                        detection_track = StaticObject(
-                            tracked_object_type=tracked_type,
-                            oriented_box=oriented_box,
-                            metadata=metadata,
-                        )
-
-                    interpolated_tracks.append(detection_track)
+                interpolated_tracks.append(detection_track)
             interpolated_detection_tracks.append(DetectionsTracks(TrackedObjects(interpolated_tracks)))
         return interpolated_detection_tracks
 
@@ -282,7 +305,7 @@ class MetricCacheProcessor:
         if file_name.exists() and not self._force_feature_computation:
             return CacheMetadataEntry(file_name)
         metric_cache = self.compute_metric_cache(scenario)
-        metric_cache.dump()
+        metric_cache.dump(self._storage)
         return CacheMetadataEntry(metric_cache.file_path)
 
     def _extract_ego_future_trajectory(self, scenario: NavSimScenario) -> Trajectory:
@@ -344,6 +367,14 @@ class MetricCacheProcessor:
         else:
             human_trajectory = None
 
+        drivable_area_map = self._pdm_closed._drivable_area_map
+        if self._drivable_area_raster_resolution is not None:
+            drivable_area_map.build_raster(
+                scenario.initial_ego_state.center.point,
+                self._drivable_area_raster_radius,
+                self._drivable_area_raster_resolution,
+            )
+
         # save and dump features
         return MetricCache(
             file_path=file_name,
@@ -357,7 +388,7 @@ class MetricCacheProcessor:
             observation=observation,
             centerline=self._pdm_closed._centerline,
             route_lane_ids=list(self._pdm_closed._route_lane_dict.keys()),
-            drivable_area_map=self._pdm_closed._drivable_area_map,
+            drivable_area_map=drivable_area_map,
             past_detections_tracks=[
                 dt for dt in scenario.get_past_tracked_objects(iteration=0, time_horizon=1.5, num_samples=3)
             ][:-1],
@@ -0,0 +1,416 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import numpy.typing as npt
+import shapely
+from nuplan.common.actor_state.agent import Agent
+from nuplan.common.actor_state.ego_state import EgoState
+from nuplan.common.actor_state.oriented_box import OrientedBox
+from nuplan.common.actor_state.scene_object import SceneObjectMetadata
+from nuplan.common.actor_state.state_representation import StateSE2, StateVector2D, TimePoint
+from nuplan.common.actor_state.static_object import StaticObject
+from nuplan.common.actor_state.tracked_objects import TrackedObjects
+from nuplan.common.actor_state.tracked_objects_types import TrackedObjectType
+from nuplan.common.actor_state.vehicle_parameters import VehicleParameters
+from nuplan.common.maps.maps_datatypes import SemanticMapLayer
+from nuplan.planning.simulation.observation.observation_type import DetectionsTracks
+from nuplan.planning.simulation.trajectory.interpolated_trajectory import InterpolatedTrajectory
+
+from navsim.planning.simulation.planner.pdm_planner.observation.pdm_drivable_area_raster import DrivableAreaRaster
+from navsim.planning.simulation.planner.pdm_planner.observation.pdm_observation import PDMObservation
+from navsim.planning.simulation.planner.pdm_planner.observation.pdm_occupancy_map import (
+    PDMDrivableMap,
+    PDMOccupancyMap,
+)
+from navsim.planning.simulation.planner.pdm_planner.utils.pdm_array_representation import (
+    array_to_states_se2,
+    ego_states_to_state_array,
+    states_se2_to_array,
+)
+from navsim.planning.simulation.planner.pdm_planner.utils.pdm_enums import StateIndex
+from navsim.planning.simulation.planner.pdm_planner.utils.pdm_path import PDMPath
+
+# version of the array-native metric cache schema, increased on incompatible changes
+METRIC_CACHE_SCHEMA_VERSION: int = 1
+
+
+class EncodedField:
+    """Interface of array-native encodings of metric cache fields, which rebuild the nuPlan objects on demand."""
+
+    def decode(self) -> Any:
+        """
+        Rebuilds the encoded object.
+        :return: decoded object
+        """
+        raise NotImplementedError
+
+
+@dataclass
+class TrackedObjectsArrays(EncodedField):
+    """Struct-of-arrays encoding of a sequence of detections tracks, with the objects of step i in offsets[i:i+2]."""
+
+    offsets: npt.NDArray[np.int64]  # (num_steps + 1,)
+    is_agent: npt.NDArray[np.bool_]  # (num_objects,), agents or static objects
+    type_codes: npt.NDArray[np.int8]  # (num_objects,), values of TrackedObjectType
+    boxes: npt.NDArray[np.float64]  # (num_objects, 6), x, y, heading, length, width, height
+    velocities: npt.NDArray[np.float64]  # (num_objects, 2), zero for static objects
+    angular_velocities: npt.NDArray[np.float64]  # (num_objects,), NaN if not available
+    metadata_idcs: npt.NDArray[np.int32]  # (num_objects,), index of the object metadata
+
+    # unique object metadata, usually shared by the interpolated steps of a track
+    timestamps_us: npt.NDArray[np.int64]
+    metadata_tokens: List[str]
+    track_ids: List[Optional[int]]
+    track_tokens: List[str]
+    category_names: List[Optional[str]]
+
+    @classmethod
+    def from_detections_tracks(cls, detections_tracks: List[DetectionsTracks]) -> TrackedObjectsArrays:
+        """
+        Encodes a sequence of detections tracks.
+        :param detections_tracks: list of detections tracks
+        :return: struct-of-arrays encoding
+        """
+        tracked_objects = [list(detection_track.tracked_objects) for detection_track in detections_tracks]
+        objects = [tracked_object for step_objects in tracked_objects for tracked_object in step_objects]
+        for tracked_object in objects:
+            if isinstance(tracked_object, Agent) and (
+                tracked_object.predictions is not None or tracked_object.past_trajectory is not None
+            ):
+                raise ValueError(
+                    "TrackedObjectsArrays: agents with predictions or past trajectories are not supported."
+                )
+
+        metadata_to_idx: Dict[Tuple[Any, ...], int] = {}
+        metadata_list: List[SceneObjectMetadata] = []
+        metadata_idcs = np.zeros(len(objects), dtype=np.int32)
+        for object_idx, tracked_object in enumerate(objects):
+            metadata = tracked_object.metadata
+            key = (
+                metadata.timestamp_us,
+                metadata.token,
+                metadata.track_id,
+                metadata.track_token,
+                metadata.category_name,
+            )
+            if key not in metadata_to_idx:
+                metadata_to_idx[key] = len(metadata_list)
+                metadata_list.append(metadata)
+            metadata_idcs[object_idx] = metadata_to_idx[key]
+
+        is_agent = np.array([isinstance(tracked_object, Agent) for tracked_object in objects], dtype=bool)
+        boxes = np.array(
+            [
+                (
+                    tracked_object.box.center.x,
+                    tracked_object.box.center.y,
+                    tracked_object.box.center.heading,
+                    tracked_object.box.length,
+                    tracked_object.box.width,
+                    tracked_object.box.height,
+                )
+                for tracked_object in objects
+            ],
+            dtype=np.float64,
+        ).reshape(len(objects), 6)
+        velocities = np.zeros((len(objects), 2), dtype=np.float64)
+        angular_velocities = np.full(len(objects), np.nan, dtype=np.float64)
+        for object_idx in np.where(is_agent)[0]:
+            agent: Agent = objects[object_idx]
+            velocities[object_idx] = agent.velocity.x, agent.velocity.y
+            if agent.angular_velocity is not None:
+                angular_velocities[object_idx] = agent.angular_velocity
+
+        return TrackedObjectsArrays(
+            offsets=np.cumsum([0] + [len(step_objects) for step_objects in tracked_objects], dtype=np.int64),
+            is_agent=is_agent,
+            type_codes=np.array(
+                [tracked_object.tracked_object_type.value for tracked_object in objects], dtype=np.int8
+            ),
+            boxes=boxes,
+            velocities=velocities,
+            angular_velocities=angular_velocities,
+            metadata_idcs=metadata_idcs,
+            timestamps_us=np.array([metadata.timestamp_us for metadata in metadata_list], dtype=np.int64),
+            metadata_tokens=[metadata.token for metadata in metadata_list],
+            track_ids=[metadata.track_id for metadata in metadata_list],
+            track_tokens=[metadata.track_token for metadata in metadata_list],
+            category_names=[metadata.category_name for metadata in metadata_list],
+        )
+
+    def _build_metadata(self) -> List[SceneObjectMetadata]:
+        """Helper method to rebuild the unique object metadata."""
+        return [
+            SceneObjectMetadata(
+                timestamp_us=int(timestamp_us),
+                token=token,
+                track_id=track_id,
+                track_token=track_token,
+                category_name=category_name,
+            )
+            for timestamp_us, token, track_id, track_token, category_name in zip(
+                self.timestamps_us, self.metadata_tokens, self.track_ids, self.track_tokens, self.category_names
+            )
+        ]
+
+    def decode(self) -> List[DetectionsTracks]:
+        """
+        Rebuilds the nuPlan detections tracks.
+        :return: list of detections tracks
+        """
+        metadata_list = self._build_metadata()
+        objects = []
+        for object_idx in range(len(self.is_agent)):
+            x, y, heading, length, width, height = self.boxes[object_idx].tolist()
+            oriented_box = OrientedBox(StateSE2(x, y, heading), length, width, height)
+            tracked_object_type = TrackedObjectType(int(self.type_codes[object_idx]))
+            metadata = metadata_list[self.metadata_idcs[object_idx]]
+            if self.is_agent[object_idx]:
+                angular_velocity = self.angular_velocities[object_idx]
+                objects.append(
+                    Agent(
+                        tracked_object_type=tracked_object_type,
+                        oriented_box=oriented_box,
+                        velocity=StateVector2D(*self.velocities[object_idx].tolist()),
+                        metadata=metadata,
+                        angular_velocity=None if np.isnan(angular_velocity) else float(angular_velocity),
+                    )
+                )
+            else:
+                objects.append(
+                    StaticObject(tracked_object_type=tracked_object_type, oriented_box=oriented_box, metadata=metadata)
+                )
+
+        return [
+            DetectionsTracks(TrackedObjects(objects[start:end]))
+            for start, end in zip(self.offsets[:-1], self.offsets[1:])
+        ]
+
+
+@dataclass
+class EgoStatesArrays(EncodedField):
+    """Encoding of a sequence of ego states as rear-axle state arrays, see StateIndex."""
+
+    states: npt.NDArray[np.float64]  # (num_states, StateIndex.size())
+    time_us: npt.NDArray[np.int64]  # (num_states,)
+    is_in_auto_mode: npt.NDArray[np.bool_]  # (num_states,)
+    vehicle_parameters: VehicleParameters
+    is_trajectory: bool  # whether to decode an interpolated trajectory or a single ego state
+
+    @classmethod
+    def from_ego_states(cls, ego_states: List[EgoState], is_trajectory: bool) -> EgoStatesArrays:
+        """
+        Encodes a sequence of ego states.
+        :param ego_states: list of ego states, which share the vehicle parameters of the first state
+        :param is_trajectory: whether the states are decoded as interpolated trajectory
+        :return: array encoding
+        """
+        return EgoStatesArrays(
+            states=ego_states_to_state_array(ego_states),
+            time_us=np.array([ego_state.time_point.time_us for ego_state in ego_states], dtype=np.int64),
+            is_in_auto_mode=np.array([ego_state.is_in_auto_mode for ego_state in ego_states], dtype=bool),
+            vehicle_parameters=ego_states[0].car_footprint.vehicle_parameters,
+            is_trajectory=is_trajectory,
+        )
+
+    def decode(self) -> Any:
+        """
+        Rebuilds the nuPlan ego states.
+        :return: interpolated trajectory or ego state
+        """
+        ego_states = [
+            EgoState.build_from_rear_axle(
+                rear_axle_pose=StateSE2(*state[StateIndex.STATE_SE2]),
+                rear_axle_velocity_2d=StateVector2D(*state[StateIndex.VELOCITY_2D]),
+                rear_axle_acceleration_2d=StateVector2D(*state[StateIndex.ACCELERATION_2D]),
+                tire_steering_angle=state[StateIndex.STEERING_ANGLE],
+                time_point=TimePoint(int(time_us)),
+                vehicle_parameters=self.vehicle_parameters,
+                is_in_auto_mode=bool(is_in_auto_mode),
+                angular_vel=state[StateIndex.ANGULAR_VELOCITY],
+                angular_accel=state[StateIndex.ANGULAR_ACCELERATION],
+                tire_steering_rate=state[StateIndex.STEERING_RATE],
+            )
+            for state, time_us, is_in_auto_mode in zip(self.states, self.time_us, self.is_in_auto_mode)
+        ]
+        return InterpolatedTrajectory(ego_states) if self.is_trajectory else ego_states[0]
+
+
+@dataclass
+class PolygonArrays(EncodedField):
+    """Encoding of polygons as flat coordinate and offset arrays, or as well-known binary for other geometries."""
+
+    coords: Optional[npt.NDArray[np.float64]]  # (num_coords, 2)
+    offsets: Optional[Tuple[npt.NDArray[np.int64], ...]]  # ring and polygon offsets into coords
+    wkb: Optional[npt.NDArray[np.object_]]  # fallback for non-polygon geometries
+    num_geometries: int
+
+    @classmethod
+    def from_geometries(cls, geometries: npt.NDArray[np.object_]) -> PolygonArrays:
+        """
+        Encodes an array of shapely geometries.
+        :param geometries: array of geometries
+        :return: array encoding
+        """
+        geometries = np.asarray(geometries, dtype=np.object_)
+        if len(geometries) > 0 and np.all(shapely.get_type_id(geometries) == shapely.GeometryType.POLYGON):
+            _, coords, offsets = shapely.to_ragged_array(geometries)
+            return PolygonArrays(coords=coords, offsets=offsets, wkb=None, num_geometries=len(geometries))
+        return PolygonArrays(coords=None, offsets=None, wkb=shapely.to_wkb(geometries), num_geometries=len(geometries))
+
+    def decode(self) -> npt.NDArray[np.object_]:
+        """
+        Rebuilds the shapely geometries.
+        :return: array of geometries
+        """
+        if self.coords is not None:
+            return shapely.from_ragged_array(shapely.GeometryType.POLYGON, self.coords, self.offsets)
+        return shapely.from_wkb(self.wkb).astype(np.object_).reshape(self.num_geometries)
+
+
+@dataclass
+class OccupancyMapArrays(EncodedField):
+    """Encoding of an occupancy or drivable area map, whose str-tree is rebuilt when decoding."""
+
+    tokens: List[str]
+    geometries: PolygonArrays
+    node_capacity: int
+    map_types: Optional[npt.NDArray[np.int64]]  # values of SemanticMapLayer for drivable area maps
+    raster: Optional[DrivableAreaRaster] = None  # optional precomputed raster of drivable area maps
+
+    @classmethod
+    def from_occupancy_map(cls, occupancy_map: PDMOccupancyMap) -> OccupancyMapArrays:
+        """
+        Encodes an occupancy map.
+        :param occupancy_map: occupancy map or drivable area map of PDM
+        :return: array encoding
+        """
+        map_types, raster = None, None
+        if isinstance(occupancy_map, PDMDrivableMap):
+            map_types = np.array([map_type.value for map_type in occupancy_map._map_types], dtype=np.int64)
+            raster = occupancy_map.raster
+        return OccupancyMapArrays(
+            tokens=list(occupancy_map.tokens),
+            geometries=PolygonArrays.from_geometries(occupancy_map._geometries),
+            node_capacity=occupancy_map._node_capacity,
+            map_types=map_types,
+            raster=raster,
+        )
+
+    def decode(self) -> PDMOccupancyMap:
+        """
+        Rebuilds the occupancy map.
+        :return: occupancy map or drivable area map of PDM
+        """
+        if self.map_types is not None:
+            map_types = [SemanticMapLayer(int(map_type)) for map_type in self.map_types]
+            return PDMDrivableMap(self.tokens, map_types, self.geometries.decode(), self.node_capacity, self.raster)
+        return PDMOccupancyMap(self.tokens, self.geometries.decode(), self.node_capacity)
+
+
+@dataclass
+class PDMPathArrays(EncodedField):
+    """Encoding of a PDM path as (x,y,heading) array."""
+
+    states_se2: npt.NDArray[np.float64]
+
+    def decode(self) -> PDMPath:
+        """
+        Rebuilds the PDM path.
+        :return: PDM path
+        """
+        return PDMPath(list(array_to_states_se2(self.states_se2)))
+
+
+@dataclass
+class PDMObservationArrays(EncodedField):
+    """Encoding of an updated PDM observation, whose occupancy maps are rebuilt when decoding."""
+
+    attributes: Dict[str, Any]  # remaining (primitive) attributes of the observation
+    detections_tracks: TrackedObjectsArrays
+    unique_object_tokens: List[str]
+    unique_objects: TrackedObjectsArrays
+    occupancy_maps: List[OccupancyMapArrays]
+    occupancy_maps_tl: Optional[List[Tuple[List[str], PolygonArrays]]]
+
+    _encoded_attributes = ["_detections_tracks", "_unique_objects", "_occupancy_maps", "_occupancy_maps_tl"]
+
+    @classmethod
+    def from_observation(cls, observation: PDMObservation) -> PDMObservationArrays:
+        """
+        Encodes a PDM observation.
+        :param observation: PDM observation, updated with detections tracks
+        :return: array encoding
+        """
+        assert observation._initialized, "PDMObservationArrays: observation has not been updated yet!"
+        occupancy_maps_tl = None
+        if observation._occupancy_maps_tl is not None:
+            occupancy_maps_tl = [
+                (list(tokens), PolygonArrays.from_geometries(polygons))
+                for tokens, polygons in observation._occupancy_maps_tl
+            ]
+        unique_objects = observation._unique_objects
+        return PDMObservationArrays(
+            attributes={
+                name: value for name, value in observation.__dict__.items() if name not in cls._encoded_attributes
+            },
+            detections_tracks=TrackedObjectsArrays.from_detections_tracks(observation._detections_tracks),
+            unique_object_tokens=list(unique_objects.keys()),
+            unique_objects=TrackedObjectsArrays.from_detections_tracks(
+                [DetectionsTracks(TrackedObjects(list(unique_objects.values())))]
+            ),
+            occupancy_maps=[
+                OccupancyMapArrays.from_occupancy_map(occupancy_map) for occupancy_map in observation._occupancy_maps
+            ],
+            occupancy_maps_tl=occupancy_maps_tl,
+        )
+
+    def decode(self) -> PDMObservation:
+        """
+        Rebuilds the PDM observation.
+        :return: PDM observation
+        """
+        observation = PDMObservation.__new__(PDMObservation)
+        observation.__dict__.update(self.attributes)
+        observation._detections_tracks = self.detections_tracks.decode()
+
+        # tracked objects are sorted by type, the dictionary keeps the original order of the tokens
+        unique_objects = {
+            tracked_object.track_token: tracked_object
+            for tracked_object in self.unique_objects.decode()[0].tracked_objects
+        }
+        observation._unique_objects = {token: unique_objects[token] for token in self.unique_object_tokens}
+        observation._occupancy_maps = [occupancy_map.decode() for occupancy_map in self.occupancy_maps]
+        observation._occupancy_maps_tl = None
+        if self.occupancy_maps_tl is not None:
+            observation._occupancy_maps_tl = [
+                (tokens, polygons.decode()) for tokens, polygons in self.occupancy_maps_tl
+            ]
+        return observation
+
+
+def encode_metric_cache_field(name: str, value: Any) -> Optional[EncodedField]:
+    """
+    Encodes a field of the metric cache into its array-native representation.
+    :param name: name of the metric cache field
+    :param value: value of the field
+    :return: encoded field, or None if the field is stored as is
+    """
+    if value is None:
+        return None
+    if name in ["trajectory", "past_human_trajectory"]:
+        return EgoStatesArrays.from_ego_states(value.get_sampled_trajectory(), is_trajectory=True)
+    if name == "ego_state":
+        return EgoStatesArrays.from_ego_states([value], is_trajectory=False)
+    if name == "observation":
+        return PDMObservationArrays.from_observation(value)
+    if name == "centerline":
+        return PDMPathArrays(states_se2_to_array(value.discrete_path))
+    if name == "drivable_area_map":
+        return OccupancyMapArrays.from_occupancy_map(value)
+    if name in ["past_detections_tracks", "current_tracked_objects", "future_tracked_objects"]:
+        return TrackedObjectsArrays.from_detections_tracks(value)
+    return None
@@ -0,0 +1,187 @@
+from __future__ import annotations
+
+import lzma
+import zlib
+from typing import Dict, List
+
+# magic numbers of the compressed streams, such that any cache file can be decoded without knowing its backend
+_LZMA_MAGIC = b"\xfd7zXZ\x00"
+_ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+_LZ4_MAGIC = b"\x04\x22\x4d\x18"
+_PICKLE_MAGIC = b"\x80"  # pickle protocol >= 2
+
+
+class MetricCacheStorage:
+    """Interface of metric cache storage backends, which encode the pickled metric cache for storage on disk."""
+
+    name: str
+    magic: bytes
+
+    def encode(self, buffer: bytes) -> bytes:
+        """
+        Encodes the serialized metric cache for storage.
+        :param buffer: serialized metric cache
+        :return: stored bytes
+        """
+        raise NotImplementedError
+
+    def decode(self, buffer: bytes) -> bytes:
+        """
+        Decodes stored bytes into the serialized metric cache.
+        :param buffer: stored bytes
+        :return: serialized metric cache
+        """
+        raise NotImplementedError
+
+
+class LZMAStorage(MetricCacheStorage):
+    """LZMA compressed storage, the original metric cache format with the smallest files."""
+
+    name = "lzma"
+    magic = _LZMA_MAGIC
+
+    def encode(self, buffer: bytes) -> bytes:
+        """Inherited, see superclass."""
+        return lzma.compress(buffer, preset=0)
+
+    def decode(self, buffer: bytes) -> bytes:
+        """Inherited, see superclass."""
+        return lzma.decompress(buffer)
+
+
+class UncompressedStorage(MetricCacheStorage):
+    """Uncompressed storage, trading disk space for the fastest loading."""
+
+    name = "none"
+    magic = _PICKLE_MAGIC
+
+    def encode(self, buffer: bytes) -> bytes:
+        """Inherited, see superclass."""
+        return buffer
+
+    def decode(self, buffer: bytes) -> bytes:
+        """Inherited, see superclass."""
+        return buffer
+
+
+class ZlibStorage(MetricCacheStorage):
+    """Zlib compressed storage at the fastest level, available without additional dependencies."""
+
+    name = "zlib"
+    magic = b"\x78"
+
+    def encode(self, buffer: bytes) -> bytes:
+        """Inherited, see superclass."""
+        return zlib.compress(buffer, level=1)
+
+    def decode(self, buffer: bytes) -> bytes:
+        """Inherited, see superclass."""
+        return zlib.decompress(buffer)
+
+
+class ZstdStorage(MetricCacheStorage):
+    """Zstandard compressed storage, requires the optional zstandard package."""
+
+    name = "zstd"
+    magic = _ZSTD_MAGIC
+
+    def __init__(self, level: int = 3):
+        """
+        Initializes the zstandard backend.
+        :param level: compression level, defaults to 3
+        """
+        try:
+            import zstandard
+        except ImportError as e:
+            raise ImportError("The zstd metric cache storage requires the zstandard package.") from e
+        self._zstandard = zstandard
+        self._level = level
+
+    def encode(self, buffer: bytes) -> bytes:
+        """Inherited, see superclass."""
+        return self._zstandard.ZstdCompressor(level=self._level).compress(buffer)
+
+    def decode(self, buffer: bytes) -> bytes:
+        """Inherited, see superclass."""
+        return self._zstandard.ZstdDecompressor().decompress(buffer)
+
+
+class LZ4Storage(MetricCacheStorage):
+    """LZ4 compressed storage with the fastest decompression, requires the optional lz4 package."""
+
+    name = "lz4"
+    magic = _LZ4_MAGIC
+
+    def __init__(self):
+        """Initializes the lz4 backend."""
+        try:
+            import lz4.frame
+        except ImportError as e:
+            raise ImportError("The lz4 metric cache storage requires the lz4 package.") from e
+        self._lz4_frame = lz4.frame
+
+    def encode(self, buffer: bytes) -> bytes:
+        """Inherited, see superclass."""
+        return self._lz4_frame.compress(buffer)
+
+    def decode(self, buffer: bytes) -> bytes:
+        """Inherited, see superclass."""
+        return self._lz4_frame.decompress(buffer)
+
+
+METRIC_CACHE_STORAGES = {
+    storage_type.name: storage_type
+    for storage_type in [LZMAStorage, UncompressedStorage, ZlibStorage, ZstdStorage, LZ4Storage]
+}
+DEFAULT_METRIC_CACHE_STORAGE = LZMAStorage.name
+
+_storages: Dict[str, MetricCacheStorage] = {}
+
+
+def get_metric_cache_storage(name: str = DEFAULT_METRIC_CACHE_STORAGE) -> MetricCacheStorage:
+    """
+    Returns the storage backend of a given name.
+    :param name: name of the storage backend, see METRIC_CACHE_STORAGES
+    :return: storage backend
+    """
+    assert (
+        name in METRIC_CACHE_STORAGES
+    ), f"Unknown metric cache storage {name}, must be in {list(METRIC_CACHE_STORAGES)}"
+    if name not in _storages:
+        _storages[name] = METRIC_CACHE_STORAGES[name]()
+    return _storages[name]
+
+
+def get_available_metric_cache_storages() -> List[str]:
+    """
+    :return: names of the storage backends whose dependencies are installed.
+    """
+    available_storages = []
+    for name in METRIC_CACHE_STORAGES.keys():
+        try:
+            get_metric_cache_storage(name)
+        except ImportError:
+            continue
+        available_storages.append(name)
+    return available_storages
+
+
+def detect_metric_cache_storage(buffer: bytes) -> MetricCacheStorage:
+    """
+    Detects the storage backend of a stored metric cache from its leading bytes.
+    :param buffer: stored bytes
+    :return: storage backend
+    """
+    for name, storage_type in METRIC_CACHE_STORAGES.items():
+        if buffer.startswith(storage_type.magic):
+            return get_metric_cache_storage(name)
+    raise ValueError("Unknown metric cache storage format.")
+
+
+def decode_metric_cache_buffer(buffer: bytes) -> bytes:
+    """
+    Decodes a stored metric cache of any storage backend.
+    :param buffer: stored bytes
+    :return: serialized metric cache
+    """
+    return detect_metric_cache_storage(buffer).decode(buffer)
@@ -60,3 +60,94 @@ class StateInterpolator:
             return interpolated_state
 
         return None
+
+
+class BatchStateInterpolator:
+    """
+    Helper class to interpolate the states of many objects at many times in a single vectorized pass.
+    Equivalent to one StateInterpolator per object on the valid samples of the object.
+    """
+
+    def __init__(
+        self,
+        time: npt.NDArray[np.float64],
+        states: npt.NDArray[np.float64],
+        valid: npt.NDArray[np.bool_],
+        heading_index: int = 2,
+    ):
+        """
+        Initializes the batch state interpolator.
+        :param time: sorted sample times, shape (num_samples,)
+        :param states: padded object states, shape (num_objects, num_samples, state_size)
+        :param valid: mask of observed states, shape (num_objects, num_samples)
+        :param heading_index: index of the heading angle in the state, which is unwrapped over the valid samples
+        """
+        num_objects, num_samples = valid.shape
+        sample_indices = np.broadcast_to(np.arange(num_samples), (num_objects, num_samples))
+
+        self._time = time
+        self._valid = valid
+        self._heading_index = heading_index
+
+        # index of the last valid sample at or before, and of the first valid sample at or after each sample
+        self._previous_valid = np.maximum.accumulate(np.where(valid, sample_indices, -1), axis=1)
+        self._next_valid = np.minimum.accumulate(np.where(valid, sample_indices, num_samples)[:, ::-1], axis=1)[:, ::-1]
+
+        # unwrap heading angle as np.unwrap on the valid samples of each object
+        states = states.copy()
+        heading = states[..., heading_index]
+        previous_strict = np.concatenate([np.full((num_objects, 1), -1), self._previous_valid[:, :-1]], axis=1)
+        has_previous = valid & (previous_strict >= 0)
+        heading_diff = np.zeros_like(heading)
+        object_indices, sample_idcs = np.nonzero(has_previous)
+        heading_diff[object_indices, sample_idcs] = (
+            heading[object_indices, sample_idcs] - heading[object_indices, previous_strict[object_indices, sample_idcs]]
+        )
+        heading_diff_mod = np.mod(heading_diff + np.pi, 2 * np.pi) - np.pi
+        np.copyto(heading_diff_mod, np.pi, where=(heading_diff_mod == -np.pi) & (heading_diff > 0))
+        heading_correction = heading_diff_mod - heading_diff
+        np.copyto(heading_correction, 0, where=(np.abs(heading_diff) < np.pi) | ~has_previous)
+        states[..., heading_index] = heading + np.cumsum(heading_correction, axis=1)
+        self._states = states
+
+    @property
+    def num_valid_samples(self) -> npt.NDArray[np.int64]:
+        """
+        :return: number of valid samples of each object, shape (num_objects,)
+        """
+        return self._valid.sum(axis=1)
+
+    def interpolate(self, time: npt.NDArray[np.float64]) -> Tuple[npt.NDArray[np.float64], npt.NDArray[np.bool_]]:
+        """
+        Temporally interpolate the states of all objects, within the first and last valid sample of each object.
+        :param time: target times, shape (num_times,)
+        :return: tuple of interpolated states (num_objects, num_times, state_size) and validity (num_objects, num_times)
+        """
+        num_objects, num_samples = self._valid.shape
+        object_indices = np.arange(num_objects)[:, None]
+        first_valid = self._next_valid[:, 0][:, None]
+        last_valid = self._previous_valid[:, -1][:, None]
+
+        # first valid sample at or after the target time, as searchsorted in interp1d
+        insert_indices = np.searchsorted(self._time, time, side="left")
+        padded_next_valid = np.concatenate([self._next_valid, np.full((num_objects, 1), num_samples)], axis=1)
+        high = padded_next_valid[:, insert_indices]
+
+        interpolated_valid = (high < num_samples) & (last_valid >= 0)
+        interpolated_valid &= self._time[np.clip(first_valid, 0, num_samples - 1)] <= time[None, :]
+
+        # clip to the second valid sample, as interp1d does at the start time
+        second_valid = padded_next_valid[object_indices, np.clip(first_valid + 1, 0, num_samples)]
+        high = np.where(high == first_valid, second_valid, high)
+        high = np.clip(high, 0, num_samples - 1)
+        low = np.clip(self._previous_valid[object_indices, np.clip(high - 1, 0, num_samples - 1)], 0, num_samples - 1)
+
+        time_low, time_high = self._time[low], self._time[high]
+        states_low, states_high = self._states[object_indices, low], self._states[object_indices, high]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            slope = (states_high - states_low) / (time_high - time_low)[..., None]
+            interpolated_states = slope * (time[None, :] - time_low)[..., None] + states_low
+
+        interpolated_states[..., self._heading_index] = normalize_angle(interpolated_states[..., self._heading_index])
+        interpolated_states[~interpolated_valid] = np.nan
+        return interpolated_states, interpolated_valid
@@ -13,13 +13,13 @@ from nuplan.common.maps.maps_datatypes import (
     TrafficLightStatusType,
     Transform,
 )
-from nuplan.common.maps.nuplan_map.map_factory import get_maps_api
 from nuplan.database.maps_db.gpkg_mapsdb import MAP_LOCATIONS
 from nuplan.planning.scenario_builder.abstract_scenario import AbstractScenario
 from nuplan.planning.simulation.observation.observation_type import DetectionsTracks, SensorChannel, Sensors
 from nuplan.planning.simulation.trajectory.trajectory_sampling import TrajectorySampling
 
 from navsim.common.dataclasses import Scene
+from navsim.common.map_registry import get_map_api
 from navsim.planning.scenario_builder.navsim_scenario_utils import (
     annotations_to_detection_tracks,
     ego_status_to_ego_state,
@@ -115,7 +115,7 @@ class NavSimScenario(AbstractScenario):
     def map_api(self) -> AbstractMap:
         """Inherited, see superclass."""
         assert self._map_name in MAP_LOCATIONS, f"Map location {self._map_name} not available!"
-        map_api = get_maps_api(self._map_root, self._map_version, self._map_name)
+        map_api = get_map_api(self._map_root, self._map_version, self._map_name)
         return map_api
 
     @property
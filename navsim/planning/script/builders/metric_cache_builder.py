@@ -0,0 +1,22 @@
+import logging
+from pathlib import Path
+
+from omegaconf import DictConfig
+
+from navsim.common.dataloader import MetricCacheLoader
+from navsim.planning.metric_caching.metric_cache_pool import MetricCachePool
+
+logger = logging.getLogger(__name__)
+
+
+def build_metric_cache_loader(cfg: DictConfig) -> MetricCacheLoader:
+    """
+    Builds the metric cache loader, reading through the node-local metric cache pool if enabled.
+    :param cfg: DictConfig. Configuration that is used to run the experiment.
+    :return: Instance of MetricCacheLoader.
+    """
+    metric_cache_pool = None
+    if cfg.metric_cache_pool.enabled:
+        metric_cache_pool = MetricCachePool(Path(cfg.metric_cache_pool.pool_path), cfg.metric_cache_pool.max_bytes)
+        logger.info(f"Loading metric caches through the pool in {cfg.metric_cache_pool.pool_path}.")
+    return MetricCacheLoader(Path(cfg.metric_cache_path), metric_cache_pool=metric_cache_pool)
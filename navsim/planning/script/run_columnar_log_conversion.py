@@ -0,0 +1,67 @@
+import logging
+from pathlib import Path
+from typing import Dict, List, Union
+
+import hydra
+from hydra.utils import instantiate
+from nuplan.planning.utils.multithreading.worker_utils import worker_map
+from omegaconf import DictConfig
+
+from navsim.common.columnar_log import (
+    COLUMNAR_LOG_SUFFIX,
+    get_log_name_from_path,
+    load_scene_dict_list,
+    save_columnar_log,
+)
+from navsim.common.dataclasses import SceneFilter
+from navsim.planning.script.builders.worker_pool_builder import build_worker
+
+logger = logging.getLogger(__name__)
+
+CONFIG_PATH = "config/columnar_log_conversion"
+CONFIG_NAME = "default_columnar_log_conversion"
+
+
+def convert_logs(args: List[Dict[str, Union[Path, DictConfig]]]) -> List[Path]:
+    """
+    Helper function to convert log pickles into the columnar format.
+    :param args: list of dicts containing the config and log file to convert
+    :return: list of written columnar log files
+    """
+    converted_log_paths: List[Path] = []
+    for arg in args:
+        cfg: DictConfig = arg["cfg"]
+        log_file: Path = arg["log_file"]
+        output_path = Path(cfg.columnar_log_path) / f"{get_log_name_from_path(log_file)}{COLUMNAR_LOG_SUFFIX}"
+        if output_path.exists() and not cfg.force_conversion:
+            continue
+        save_columnar_log(load_scene_dict_list(log_file), output_path)
+        converted_log_paths.append(output_path)
+    return converted_log_paths
+
+
+@hydra.main(config_path=CONFIG_PATH, config_name=CONFIG_NAME, version_base=None)
+def main(cfg: DictConfig) -> None:
+    """
+    Main entrypoint for converting log pickles into the memory-mappable columnar format.
+    :param cfg: omegaconf dictionary
+    """
+    worker = build_worker(cfg)
+
+    scene_filter: SceneFilter = instantiate(cfg.train_test_split.scene_filter)
+    log_files = list(Path(cfg.navsim_log_path).iterdir())
+    if scene_filter.log_names is not None:
+        log_files = [log_file for log_file in log_files if get_log_name_from_path(log_file) in scene_filter.log_names]
+
+    Path(cfg.columnar_log_path).mkdir(parents=True, exist_ok=True)
+    logger.info(f"Starting conversion of {len(log_files)} logs to {cfg.columnar_log_path}...")
+    data_points = [{"cfg": cfg, "log_file": log_file} for log_file in log_files]
+    converted_log_paths = worker_map(worker, convert_logs, data_points)
+    logger.info(
+        f"Finished conversion: {len(converted_log_paths)} logs written, "
+        f"{len(log_files) - len(converted_log_paths)} logs already converted."
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -57,28 +57,32 @@ def run_test_evaluation(
 
     # first stage output
     first_stage_output: Dict[str, Trajectory] = {}
+    agent_inputs = input_loader.prefetch_agent_inputs(input_loader.tokens_stage_one, **cfg.agent_input_prefetch)
     for token in tqdm(input_loader.tokens_stage_one, desc="Running first stage evaluation"):
         try:
-            agent_input = input_loader.get_agent_input_from_token(token)
+            agent_input = agent_inputs.get_agent_input_from_token(token)
             trajectory = agent.compute_trajectory(agent_input)
             first_stage_output.update({token: trajectory})
         except Exception:
             logger.warning(f"----------- Agent failed for token {token}:")
             traceback.print_exc()
+    agent_inputs.close()
 
     # second stage output
 
     scene_loader_tokens_stage_two = input_loader.reactive_tokens_stage_two
 
     second_stage_output: Dict[str, Trajectory] = {}
+    agent_inputs = input_loader.prefetch_agent_inputs(scene_loader_tokens_stage_two, **cfg.agent_input_prefetch)
     for token in tqdm(scene_loader_tokens_stage_two, desc="Running second stage evaluation"):
         try:
-            agent_input = input_loader.get_agent_input_from_token(token)
+            agent_input = agent_inputs.get_agent_input_from_token(token)
             trajectory = agent.compute_trajectory(agent_input)
             second_stage_output.update({token: trajectory})
         except Exception:
             logger.warning(f"----------- Agent failed for token {token}:")
             traceback.print_exc()
+    agent_inputs.close()
 
     return first_stage_output, second_stage_output
 
@@ -8,13 +8,14 @@ import hydra
 import pytorch_lightning as pl
 from hydra.utils import instantiate
 from nuplan.planning.utils.multithreading.worker_pool import WorkerPool
-from nuplan.planning.utils.multithreading.worker_utils import worker_map
 from omegaconf import DictConfig
 
 from navsim.agents.abstract_agent import AbstractAgent
 from navsim.common.dataclasses import SceneFilter, SensorConfig
 from navsim.common.dataloader import SceneLoader
+from navsim.common.sensor_cache import get_sensor_blob_cache
 from navsim.planning.training.dataset import Dataset
+from navsim.planning.utils.multithreading.token_scheduler import token_batch_map
 
 logger = logging.getLogger(__name__)
 
@@ -39,6 +40,9 @@ def cache_features(args: List[Dict[str, Union[List[str], DictConfig]]]) -> List[
     scene_filter: SceneFilter = instantiate(cfg.train_test_split.scene_filter)
     scene_filter.log_names = log_names
     scene_filter.tokens = tokens
+    # logs may be split across batches, such that only the synthetic scenes of this batch must be loaded
+    scene_filter.synthetic_scene_tokens = tokens
+    scene_filter.num_log_loading_workers = 1  # logs are already distributed across workers
     scene_loader = SceneLoader(
         synthetic_sensor_path=Path(cfg.synthetic_sensor_path),
         original_sensor_path=Path(cfg.original_sensor_path),
@@ -56,6 +60,9 @@ def cache_features(args: List[Dict[str, Union[List[str], DictConfig]]]) -> List[
         cache_path=cfg.cache_path,
         force_cache_computation=cfg.force_cache_computation,
     )
+    sensor_blob_cache = get_sensor_blob_cache()
+    if sensor_blob_cache is not None:
+        logger.info(f"Sensor blob cache of thread_id={thread_id}, node_id={node_id}: {sensor_blob_cache.get_stats()}")
     return []
 
 
@@ -86,16 +93,8 @@ def main(cfg: DictConfig) -> None:
     )
     logger.info(f"Extracted {len(scene_loader)} scenarios for training/validation dataset")
 
-    data_points = [
-        {
-            "cfg": cfg,
-            "log_file": log_file,
-            "tokens": tokens_list,
-        }
-        for log_file, tokens_list in scene_loader.get_tokens_list_per_log().items()
-    ]
-
-    _ = worker_map(worker, cache_features, data_points)
+    tokens_list_per_log = scene_loader.get_tokens_list_per_log()
+    _ = token_batch_map(worker, cache_features, tokens_list_per_log, cfg.scheduler, extra_items={"cfg": cfg})
     logger.info(f"Finished caching {len(scene_loader)} scenarios for training/validation dataset")
 
 
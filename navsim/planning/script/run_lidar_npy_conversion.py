@@ -0,0 +1,53 @@
+import logging
+from pathlib import Path
+from typing import Dict, List, Union
+
+import hydra
+from nuplan.planning.utils.multithreading.worker_utils import worker_map
+from omegaconf import DictConfig
+
+from navsim.common.lidar_io import get_lidar_npy_path, save_lidar_npy
+from navsim.planning.script.builders.worker_pool_builder import build_worker
+
+logger = logging.getLogger(__name__)
+
+CONFIG_PATH = "config/lidar_npy_conversion"
+CONFIG_NAME = "default_lidar_npy_conversion"
+
+
+def convert_point_clouds(args: List[Dict[str, Union[Path, DictConfig]]]) -> List[Path]:
+    """
+    Helper function to write memory-mappable npy sidecars of pcd files.
+    :param args: list of dicts containing the config and pcd file to convert
+    :return: list of written npy sidecars
+    """
+    npy_paths: List[Path] = []
+    for arg in args:
+        cfg: DictConfig = arg["cfg"]
+        pcd_path: Path = arg["pcd_path"]
+        if get_lidar_npy_path(pcd_path).exists() and not cfg.force_conversion:
+            continue
+        npy_paths.append(save_lidar_npy(pcd_path))
+    return npy_paths
+
+
+@hydra.main(config_path=CONFIG_PATH, config_name=CONFIG_NAME, version_base=None)
+def main(cfg: DictConfig) -> None:
+    """
+    Main entrypoint for writing npy sidecars of merged lidar point clouds.
+    :param cfg: omegaconf dictionary
+    """
+    worker = build_worker(cfg)
+
+    pcd_paths = sorted(Path(cfg.lidar_sensor_path).rglob("*.pcd"))
+    logger.info(f"Starting conversion of {len(pcd_paths)} point clouds in {cfg.lidar_sensor_path}...")
+    data_points = [{"cfg": cfg, "pcd_path": pcd_path} for pcd_path in pcd_paths]
+    npy_paths = worker_map(worker, convert_point_clouds, data_points)
+    logger.info(
+        f"Finished conversion: {len(npy_paths)} sidecars written, "
+        f"{len(pcd_paths) - len(npy_paths)} point clouds already converted."
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+import logging
+import multiprocessing
+import resource
+import time
+from pathlib import Path
+from typing import Any, Dict
+
+import hydra
+import pandas as pd
+from hydra.utils import instantiate
+from omegaconf import DictConfig
+
+from navsim.common.dataclasses import SensorConfig
+from navsim.common.dataloader import SceneLoader
+
+logger = logging.getLogger(__name__)
+
+CONFIG_PATH = "config/benchmarks"
+CONFIG_NAME = "default_log_loading_benchmark"
+
+
+def benchmark_log_loading(cfg: DictConfig, data_path: Path) -> Dict[str, Any]:
+    """
+    Measures scene loader construction and agent input loading for a log folder.
+    Intended to run in a fresh process, such that the peak RSS is attributed to a single backend.
+    :param cfg: omegaconf dictionary
+    :param data_path: root directory of log folder (pickle or columnar)
+    :return: dictionary of measurements
+    """
+    start_time = time.perf_counter()
+    scene_loader = SceneLoader(
+        synthetic_sensor_path=None,
+        original_sensor_path=None,
+        data_path=data_path,
+        scene_filter=instantiate(cfg.train_test_split.scene_filter),
+        sensor_config=SensorConfig.build_no_sensors(),
+    )
+    build_time = time.perf_counter() - start_time
+
+    tokens = scene_loader.tokens_stage_one[: cfg.num_scenes]
+    start_time = time.perf_counter()
+    for token in tokens:
+        scene_loader.get_agent_input_from_token(token)
+    load_time = time.perf_counter() - start_time
+
+    return {
+        "data_path": str(data_path),
+        "num_scenes": len(scene_loader),
+        "build_time_s": build_time,
+        "num_loaded_scenes": len(tokens),
+        "load_time_per_scene_ms": 1000 * load_time / max(len(tokens), 1),
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,  # kilobytes on linux
+    }
+
+
+@hydra.main(config_path=CONFIG_PATH, config_name=CONFIG_NAME, version_base=None)
+def main(cfg: DictConfig) -> None:
+    """
+    Main entrypoint for comparing the pickle and columnar log formats.
+    :param cfg: omegaconf dictionary
+    """
+    results = []
+    for backend, data_path in [("pickle", cfg.navsim_log_path), ("columnar", cfg.columnar_log_path)]:
+        logger.info(f"Benchmarking {backend} logs in {data_path}...")
+        # use a fresh process per backend, to measure the peak memory independently
+        with multiprocessing.get_context("spawn").Pool(processes=1) as pool:
+            result = pool.apply(benchmark_log_loading, (cfg, Path(data_path)))
+        results.append({"backend": backend, **result})
+
+    results_df = pd.DataFrame(results)
+    save_path = Path(cfg.output_dir) / "log_loading_benchmark.csv"
+    results_df.to_csv(save_path)
+    logger.info(f"Log loading benchmark results (stored in {save_path}):\n{results_df.to_string()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+import logging
+import random
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+import hydra
+import numpy as np
+import pandas as pd
+from omegaconf import DictConfig
+
+from navsim.common.dataloader import MetricCacheLoader
+from navsim.planning.metric_caching.metric_cache import MetricCache
+from navsim.planning.metric_caching.metric_cache_storage import (
+    decode_metric_cache_buffer,
+    get_available_metric_cache_storages,
+    get_metric_cache_storage,
+)
+
+logger = logging.getLogger(__name__)
+
+CONFIG_PATH = "config/benchmarks"
+CONFIG_NAME = "default_metric_cache_benchmark"
+
+
+def benchmark_metric_cache_storage(storage_name: str, payloads: List[bytes], sample_path: Path) -> Dict[str, Any]:
+    """
+    Writes a sample of serialized metric caches with a storage backend and measures loading them.
+    Note that files are read through the page cache, i.e. the latencies exclude cold disk reads.
+    :param storage_name: name of the storage backend
+    :param payloads: list of serialized (pickled) metric caches
+    :param sample_path: directory to write the encoded sample files to
+    :return: dictionary of measurements
+    """
+    storage = get_metric_cache_storage(storage_name)
+    sample_path.mkdir(parents=True, exist_ok=True)
+
+    file_paths: List[Path] = []
+    encode_time = 0.0
+    for idx, payload in enumerate(payloads):
+        start_time = time.perf_counter()
+        buffer = storage.encode(payload)
+        encode_time += time.perf_counter() - start_time
+        file_path = sample_path / f"{idx}.pkl"
+        file_path.write_bytes(buffer)
+        file_paths.append(file_path)
+    num_bytes = sum(file_path.stat().st_size for file_path in file_paths)
+
+    decode_times = []
+    for file_path in file_paths:
+        start_time = time.perf_counter()
+        decode_metric_cache_buffer(file_path.read_bytes())
+        decode_times.append(time.perf_counter() - start_time)
+
+    # end-to-end loading, i.e. reading, decoding and unpickling
+    load_times, cpu_times = [], []
+    for file_path in file_paths:
+        start_time, start_cpu_time = time.perf_counter(), time.process_time()
+        MetricCache.load(file_path)
+        load_times.append(time.perf_counter() - start_time)
+        cpu_times.append(time.process_time() - start_cpu_time)
+
+    num_tokens = max(len(payloads), 1)
+    return {
+        "storage": storage_name,
+        "num_tokens": len(payloads),
+        "bytes_per_token": num_bytes / num_tokens,
+        "compression_ratio": sum(len(payload) for payload in payloads) / max(num_bytes, 1),
+        "encode_time_per_token_ms": 1000 * encode_time / num_tokens,
+        "decode_p50_ms": 1000 * np.percentile(decode_times, 50),
+        "load_p50_ms": 1000 * np.percentile(load_times, 50),
+        "load_p99_ms": 1000 * np.percentile(load_times, 99),
+        "cpu_time_per_token_ms": 1000 * sum(cpu_times) / num_tokens,
+    }
+
+
+@hydra.main(config_path=CONFIG_PATH, config_name=CONFIG_NAME, version_base=None)
+def main(cfg: DictConfig) -> None:
+    """
+    Main entrypoint for comparing the storage backends of the metric cache.
+    :param cfg: omegaconf dictionary
+    """
+    metric_cache_loader = MetricCacheLoader(Path(cfg.metric_cache_path))
+    file_paths = list(metric_cache_loader.metric_cache_paths.values())
+    file_paths = random.Random(0).sample(file_paths, min(cfg.num_tokens, len(file_paths)))
+    payloads = [decode_metric_cache_buffer(Path(file_path).read_bytes()) for file_path in file_paths]
+
+    storage_names = cfg.metric_cache_storages or get_available_metric_cache_storages()
+    results = []
+    for storage_name in storage_names:
+        logger.info(f"Benchmarking metric cache storage {storage_name} with {len(payloads)} tokens...")
+        results.append(benchmark_metric_cache_storage(storage_name, payloads, Path(cfg.output_dir) / storage_name))
+
+    results_df = pd.DataFrame(results)
+    save_path = Path(cfg.output_dir) / "metric_cache_benchmark.csv"
+    results_df.to_csv(save_path)
+    logger.info(f"Metric cache benchmark results (stored in {save_path}):\n{results_df.to_string()}")
+
+
+if __name__ == "__main__":
+    main()
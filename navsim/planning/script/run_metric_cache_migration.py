@@ -0,0 +1,80 @@
+import logging
+import os
+import pickle
+from pathlib import Path
+from typing import Dict, List, Union
+
+import hydra
+from nuplan.planning.utils.multithreading.worker_utils import worker_map
+from omegaconf import DictConfig
+
+from navsim.common.dataloader import MetricCacheLoader
+from navsim.planning.metric_caching.metric_cache_storage import detect_metric_cache_storage, get_metric_cache_storage
+from navsim.planning.script.builders.worker_pool_builder import build_worker
+
+logger = logging.getLogger(__name__)
+
+CONFIG_PATH = "config/metric_cache_migration"
+CONFIG_NAME = "default_metric_cache_migration"
+
+
+def migrate_metric_caches(args: List[Dict[str, Union[Path, DictConfig]]]) -> List[Path]:
+    """
+    Helper function to re-encode metric cache files with another storage backend in place.
+    The serialized metric cache is transcoded without unpickling, unless the schema is upgraded.
+    Files are replaced atomically.
+    :param args: list of dicts containing the config and metric cache file to migrate
+    :return: list of migrated metric cache files
+    """
+    migrated_paths: List[Path] = []
+    for arg in args:
+        cfg: DictConfig = arg["cfg"]
+        file_path: Path = arg["file_path"]
+        target_storage = get_metric_cache_storage(cfg.metric_cache_storage)
+
+        with open(file_path, "rb") as f:
+            buffer = f.read()
+        source_storage = detect_metric_cache_storage(buffer)
+        if source_storage.name == target_storage.name and not (cfg.force_migration or cfg.upgrade_schema):
+            continue
+
+        pickle_object = source_storage.decode(buffer)
+        if cfg.upgrade_schema:
+            # re-pickles metric caches of older versions in the current (array-native) schema
+            pickle_object = pickle.dumps(pickle.loads(pickle_object), protocol=pickle.HIGHEST_PROTOCOL)
+
+        tmp_path = file_path.with_name(f"{file_path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(target_storage.encode(pickle_object))
+        os.replace(tmp_path, file_path)
+        migrated_paths.append(file_path)
+    return migrated_paths
+
+
+@hydra.main(config_path=CONFIG_PATH, config_name=CONFIG_NAME, version_base=None)
+def main(cfg: DictConfig) -> None:
+    """
+    Main entrypoint for converting an existing metric cache to another storage backend.
+    :param cfg: omegaconf dictionary
+    """
+    # fail early, e.g. if the dependencies of the target backend are not installed
+    get_metric_cache_storage(cfg.metric_cache_storage)
+    worker = build_worker(cfg)
+
+    metric_cache_loader = MetricCacheLoader(Path(cfg.metric_cache_path))
+    logger.info(
+        f"Starting migration of {len(metric_cache_loader)} metric caches in {cfg.metric_cache_path} "
+        f"to storage backend {cfg.metric_cache_storage}..."
+    )
+    data_points = [
+        {"cfg": cfg, "file_path": Path(file_path)} for file_path in metric_cache_loader.metric_cache_paths.values()
+    ]
+    migrated_paths = worker_map(worker, migrate_metric_caches, data_points)
+    logger.info(
+        f"Finished migration: {len(migrated_paths)} metric caches converted, "
+        f"{len(data_points) - len(migrated_paths)} already stored with {cfg.metric_cache_storage}."
+    )
+
+
+if __name__ == "__main__":
+    main()
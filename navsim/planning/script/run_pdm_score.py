@@ -15,19 +15,21 @@ from nuplan.common.actor_state.state_representation import StateSE2
 from nuplan.common.geometry.convert import relative_to_absolute_poses
 from nuplan.planning.script.builders.logging_builder import build_logger
 from nuplan.planning.simulation.trajectory.trajectory_sampling import TrajectorySampling
-from nuplan.planning.utils.multithreading.worker_utils import worker_map
 from omegaconf import DictConfig
 
 from navsim.agents.abstract_agent import AbstractAgent
 from navsim.common.dataclasses import PDMResults, SensorConfig
 from navsim.common.dataloader import MetricCacheLoader, SceneFilter, SceneLoader
 from navsim.common.enums import SceneFrameType
+from navsim.common.map_registry import get_map_registry_stats, prewarm_map_apis
 from navsim.evaluate.pdm_score import pdm_score
+from navsim.planning.script.builders.metric_cache_builder import build_metric_cache_loader
 from navsim.planning.script.builders.worker_pool_builder import build_worker
 from navsim.planning.simulation.planner.pdm_planner.scoring.pdm_scorer import PDMScorer
 from navsim.planning.simulation.planner.pdm_planner.scoring.scene_aggregator import SceneAggregator
 from navsim.planning.simulation.planner.pdm_planner.simulation.pdm_simulator import PDMSimulator
 from navsim.planning.simulation.planner.pdm_planner.utils.pdm_enums import WeightedMetricIndex
+from navsim.planning.utils.multithreading.token_scheduler import time_tokens, token_batch_map
 from navsim.traffic_agents_policies.abstract_traffic_agents_policy import AbstractTrafficAgentsPolicy
 
 logger = logging.getLogger(__name__)
@@ -57,10 +59,15 @@ def run_pdm_score(args: List[Dict[str, Union[List[str], DictConfig]]]) -> List[p
     agent: AbstractAgent = instantiate(cfg.agent)
     agent.initialize()
 
-    metric_cache_loader = MetricCacheLoader(Path(cfg.metric_cache_path))
+    if cfg.prewarm_map_apis:
+        prewarm_map_apis()
+    metric_cache_loader = build_metric_cache_loader(cfg)
     scene_filter: SceneFilter = instantiate(cfg.train_test_split.scene_filter)
     scene_filter.log_names = log_names
     scene_filter.tokens = tokens
+    # logs may be split across batches, such that only the synthetic scenes of this batch must be loaded
+    scene_filter.synthetic_scene_tokens = tokens
+    scene_filter.num_log_loading_workers = 1  # logs are already distributed across workers
     scene_loader = SceneLoader(
         synthetic_sensor_path=Path(cfg.synthetic_sensor_path),
         original_sensor_path=Path(cfg.original_sensor_path),
@@ -80,52 +87,58 @@ def run_pdm_score(args: List[Dict[str, Union[List[str], DictConfig]]]) -> List[p
 
     scene_loader_tokens_stage_one = scene_loader.tokens_stage_one
 
-    tokens_to_evaluate_stage_one = list(set(scene_loader_tokens_stage_one) & set(metric_cache_loader.tokens))
+    # keep the log order of the scene loader, such that overlapping scenes can share decoded sensor blobs
+    metric_cache_tokens = set(metric_cache_loader.tokens)
+    tokens_to_evaluate_stage_one = [token for token in scene_loader_tokens_stage_one if token in metric_cache_tokens]
+    agent_inputs = scene_loader.prefetch_agent_inputs(tokens_to_evaluate_stage_one, **cfg.agent_input_prefetch)
     for idx, (token) in enumerate(tokens_to_evaluate_stage_one):
         logger.info(
             f"Processing stage one reactive scenario {idx + 1} / {len(tokens_to_evaluate_stage_one)} in thread_id={thread_id}, node_id={node_id}"
         )
-        try:
-            metric_cache = metric_cache_loader.get_from_token(token)
-            agent_input = scene_loader.get_agent_input_from_token(token)
-            if agent.requires_scene:
-                scene = scene_loader.get_scene_from_token(token)
-                trajectory = agent.compute_trajectory(agent_input, scene)
-            else:
-                trajectory = agent.compute_trajectory(agent_input)
-
-            score_row_stage_one, ego_simulated_states = pdm_score(
-                metric_cache=metric_cache,
-                model_trajectory=trajectory,
-                future_sampling=simulator.proposal_sampling,
-                simulator=simulator,
-                scorer=scorer,
-                traffic_agents_policy=traffic_agents_policy_stage_one,
-            )
-            score_row_stage_one["valid"] = True
-            score_row_stage_one["log_name"] = metric_cache.log_name
-            score_row_stage_one["frame_type"] = metric_cache.scene_type
-            score_row_stage_one["start_time"] = metric_cache.timepoint.time_s
-            end_pose = StateSE2(
-                x=trajectory.poses[-1, 0],
-                y=trajectory.poses[-1, 1],
-                heading=trajectory.poses[-1, 2],
-            )
-            absolute_endpoint = relative_to_absolute_poses(metric_cache.ego_state.rear_axle, [end_pose])[0]
-            score_row_stage_one["endpoint_x"] = absolute_endpoint.x
-            score_row_stage_one["endpoint_y"] = absolute_endpoint.y
-            score_row_stage_one["start_point_x"] = metric_cache.ego_state.rear_axle.x
-            score_row_stage_one["start_point_y"] = metric_cache.ego_state.rear_axle.y
-            score_row_stage_one["ego_simulated_states"] = [ego_simulated_states]  # used for two-frames extended comfort
-
-        except Exception:
-            logger.warning(f"----------- Agent failed for token {token}:")
-            traceback.print_exc()
-            score_row_stage_one = pd.DataFrame([PDMResults.get_empty_results()])
-            score_row_stage_one["valid"] = False
+        with time_tokens(scene_loader.scene_catalog.get_record(token).log_name):
+            try:
+                metric_cache = metric_cache_loader.get_from_token(token)
+                agent_input = agent_inputs.get_agent_input_from_token(token)
+                if agent.requires_scene:
+                    scene = scene_loader.get_scene_from_token(token)
+                    trajectory = agent.compute_trajectory(agent_input, scene)
+                else:
+                    trajectory = agent.compute_trajectory(agent_input)
+
+                score_row_stage_one, ego_simulated_states = pdm_score(
+                    metric_cache=metric_cache,
+                    model_trajectory=trajectory,
+                    future_sampling=simulator.proposal_sampling,
+                    simulator=simulator,
+                    scorer=scorer,
+                    traffic_agents_policy=traffic_agents_policy_stage_one,
+                )
+                score_row_stage_one["valid"] = True
+                score_row_stage_one["log_name"] = metric_cache.log_name
+                score_row_stage_one["frame_type"] = metric_cache.scene_type
+                score_row_stage_one["start_time"] = metric_cache.timepoint.time_s
+                end_pose = StateSE2(
+                    x=trajectory.poses[-1, 0],
+                    y=trajectory.poses[-1, 1],
+                    heading=trajectory.poses[-1, 2],
+                )
+                absolute_endpoint = relative_to_absolute_poses(metric_cache.ego_state.rear_axle, [end_pose])[0]
+                score_row_stage_one["endpoint_x"] = absolute_endpoint.x
+                score_row_stage_one["endpoint_y"] = absolute_endpoint.y
+                score_row_stage_one["start_point_x"] = metric_cache.ego_state.rear_axle.x
+                score_row_stage_one["start_point_y"] = metric_cache.ego_state.rear_axle.y
+                # used for two-frames extended comfort
+                score_row_stage_one["ego_simulated_states"] = [ego_simulated_states]
+
+            except Exception:
+                logger.warning(f"----------- Agent failed for token {token}:")
+                traceback.print_exc()
+                score_row_stage_one = pd.DataFrame([PDMResults.get_empty_results()])
+                score_row_stage_one["valid"] = False
         score_row_stage_one["token"] = token
 
         pdm_results.append(score_row_stage_one)
+    agent_inputs.close()
 
     # second stage
 
@@ -135,52 +148,62 @@ def run_pdm_score(args: List[Dict[str, Union[List[str], DictConfig]]]) -> List[p
     scene_loader_tokens_stage_two = scene_loader.reactive_tokens_stage_two
 
     tokens_to_evaluate_stage_two = list(set(scene_loader_tokens_stage_two) & set(metric_cache_loader.tokens))
+    agent_inputs = scene_loader.prefetch_agent_inputs(tokens_to_evaluate_stage_two, **cfg.agent_input_prefetch)
     for idx, (token) in enumerate(tokens_to_evaluate_stage_two):
         logger.info(
             f"Processing stage two reactive scenario {idx + 1} / {len(tokens_to_evaluate_stage_two)} in thread_id={thread_id}, node_id={node_id}"
         )
-        try:
-            metric_cache = metric_cache_loader.get_from_token(token)
-            agent_input = scene_loader.get_agent_input_from_token(token)
-            if agent.requires_scene:
-                scene = scene_loader.get_scene_from_token(token)
-                trajectory = agent.compute_trajectory(agent_input, scene)
-            else:
-                trajectory = agent.compute_trajectory(agent_input)
-
-            score_row_stage_two, ego_simulated_states = pdm_score(
-                metric_cache=metric_cache,
-                model_trajectory=trajectory,
-                future_sampling=simulator.proposal_sampling,
-                simulator=simulator,
-                scorer=scorer,
-                traffic_agents_policy=traffic_agents_policy_stage_two,
-            )
-            score_row_stage_two["valid"] = True
-            score_row_stage_two["log_name"] = metric_cache.log_name
-            score_row_stage_two["frame_type"] = metric_cache.scene_type
-            score_row_stage_two["start_time"] = metric_cache.timepoint.time_s
-            end_pose = StateSE2(
-                x=trajectory.poses[-1, 0],
-                y=trajectory.poses[-1, 1],
-                heading=trajectory.poses[-1, 2],
-            )
-            absolute_endpoint = relative_to_absolute_poses(metric_cache.ego_state.rear_axle, [end_pose])[0]
-            score_row_stage_two["endpoint_x"] = absolute_endpoint.x
-            score_row_stage_two["endpoint_y"] = absolute_endpoint.y
-            score_row_stage_two["start_point_x"] = metric_cache.ego_state.rear_axle.x
-            score_row_stage_two["start_point_y"] = metric_cache.ego_state.rear_axle.y
-            score_row_stage_two["ego_simulated_states"] = [ego_simulated_states]  # used for two-frames extended comfort
-
-        except Exception:
-            logger.warning(f"----------- Agent failed for token {token}:")
-            traceback.print_exc()
-            score_row_stage_two = pd.DataFrame([PDMResults.get_empty_results()])
-            score_row_stage_two["valid"] = False
+        with time_tokens(scene_loader.scene_catalog.get_record(token).log_name):
+            try:
+                metric_cache = metric_cache_loader.get_from_token(token)
+                agent_input = agent_inputs.get_agent_input_from_token(token)
+                if agent.requires_scene:
+                    scene = scene_loader.get_scene_from_token(token)
+                    trajectory = agent.compute_trajectory(agent_input, scene)
+                else:
+                    trajectory = agent.compute_trajectory(agent_input)
+
+                score_row_stage_two, ego_simulated_states = pdm_score(
+                    metric_cache=metric_cache,
+                    model_trajectory=trajectory,
+                    future_sampling=simulator.proposal_sampling,
+                    simulator=simulator,
+                    scorer=scorer,
+                    traffic_agents_policy=traffic_agents_policy_stage_two,
+                )
+                score_row_stage_two["valid"] = True
+                score_row_stage_two["log_name"] = metric_cache.log_name
+                score_row_stage_two["frame_type"] = metric_cache.scene_type
+                score_row_stage_two["start_time"] = metric_cache.timepoint.time_s
+                end_pose = StateSE2(
+                    x=trajectory.poses[-1, 0],
+                    y=trajectory.poses[-1, 1],
+                    heading=trajectory.poses[-1, 2],
+                )
+                absolute_endpoint = relative_to_absolute_poses(metric_cache.ego_state.rear_axle, [end_pose])[0]
+                score_row_stage_two["endpoint_x"] = absolute_endpoint.x
+                score_row_stage_two["endpoint_y"] = absolute_endpoint.y
+                score_row_stage_two["start_point_x"] = metric_cache.ego_state.rear_axle.x
+                score_row_stage_two["start_point_y"] = metric_cache.ego_state.rear_axle.y
+                # used for two-frames extended comfort
+                score_row_stage_two["ego_simulated_states"] = [ego_simulated_states]
+
+            except Exception:
+                logger.warning(f"----------- Agent failed for token {token}:")
+                traceback.print_exc()
+                score_row_stage_two = pd.DataFrame([PDMResults.get_empty_results()])
+                score_row_stage_two["valid"] = False
         score_row_stage_two["token"] = token
 
         pdm_results.append(score_row_stage_two)
+    agent_inputs.close()
 
+    logger.info(f"Map api registry of thread_id={thread_id}, node_id={node_id}: {get_map_registry_stats()}")
+    if metric_cache_loader.metric_cache_pool is not None:
+        logger.info(
+            f"Metric cache pool of thread_id={thread_id}, node_id={node_id}: "
+            f"{metric_cache_loader.metric_cache_pool.get_stats()}"
+        )
     return pdm_results
 
 
@@ -352,24 +375,34 @@ def main(cfg: DictConfig) -> None:
     if num_unused_metric_cache_tokens > 0:
         logger.warning(f"Unused metric cache for {num_unused_metric_cache_tokens} tokens. Skipping these tokens.")
     logger.info(f"Starting pdm scoring of {len(tokens_to_evaluate)} scenarios...")
-    data_points = [
-        {
-            "cfg": cfg,
-            "log_file": log_file,
-            "tokens": tokens_list,
-        }
-        for log_file, tokens_list in scene_loader.get_tokens_list_per_log().items()
-    ]
-    score_rows: List[pd.DataFrame] = worker_map(worker, run_pdm_score, data_points)
+    tokens_list_per_log = scene_loader.get_tokens_list_per_log()
+    score_rows: List[pd.DataFrame] = token_batch_map(
+        worker, run_pdm_score, tokens_list_per_log, cfg.scheduler, extra_items={"cfg": cfg}
+    )
 
     pdm_score_df = pd.concat(score_rows)
 
+    # batches cover every token once (see build_token_batches), mismatches are reported without dropping the results
+    metric_cache_tokens = set(metric_cache_loader.tokens)
+    expected_tokens = {
+        token
+        for token in scene_loader.tokens_stage_one + (scene_loader.reactive_tokens_stage_two or [])
+        if token in metric_cache_tokens
+    }
+    token_counts = pdm_score_df["token"].value_counts()
+    duplicate_tokens = token_counts[token_counts > 1].index.to_list()
+    missing_tokens = expected_tokens - set(token_counts.index)
+    if len(duplicate_tokens) > 0:
+        logger.warning(f"Scenarios scored more than once: {duplicate_tokens}")
+    if len(missing_tokens) > 0:
+        logger.warning(f"Scenarios not scored: {sorted(missing_tokens)}")
+
     try:
         raw_mapping = cfg.train_test_split.reactive_all_mapping
         all_mappings: Dict[Tuple[str, str], List[Tuple[str, str]]] = {}
 
         for orig_token, prev_token, two_stage_pairs in raw_mapping:
-            if prev_token in set(scene_loader.tokens) or orig_token in set(scene_loader.tokens):
+            if prev_token in scene_loader.scene_catalog or orig_token in scene_loader.scene_catalog:
                 all_mappings[(orig_token, prev_token)] = [tuple(pair) for pair in two_stage_pairs]
 
         pdm_score_df = create_scene_aggregators(
@@ -15,19 +15,21 @@ from nuplan.common.actor_state.state_representation import StateSE2
 from nuplan.common.geometry.convert import relative_to_absolute_poses
 from nuplan.planning.script.builders.logging_builder import build_logger
 from nuplan.planning.simulation.trajectory.trajectory_sampling import TrajectorySampling
-from nuplan.planning.utils.multithreading.worker_utils import worker_map
 from omegaconf import DictConfig
 
 from navsim.agents.abstract_agent import AbstractAgent
 from navsim.common.dataclasses import PDMResults, SensorConfig
 from navsim.common.dataloader import MetricCacheLoader, SceneFilter, SceneLoader
 from navsim.common.enums import SceneFrameType
+from navsim.common.map_registry import get_map_registry_stats, prewarm_map_apis
 from navsim.evaluate.pdm_score import pdm_score
+from navsim.planning.script.builders.metric_cache_builder import build_metric_cache_loader
 from navsim.planning.script.builders.worker_pool_builder import build_worker
 from navsim.planning.simulation.planner.pdm_planner.scoring.pdm_scorer import PDMScorer
 from navsim.planning.simulation.planner.pdm_planner.scoring.scene_aggregator import SceneAggregator
 from navsim.planning.simulation.planner.pdm_planner.simulation.pdm_simulator import PDMSimulator
 from navsim.planning.simulation.planner.pdm_planner.utils.pdm_enums import WeightedMetricIndex
+from navsim.planning.utils.multithreading.token_scheduler import time_tokens, token_batch_map
 from navsim.traffic_agents_policies.abstract_traffic_agents_policy import AbstractTrafficAgentsPolicy
 
 logger = logging.getLogger(__name__)
@@ -65,10 +67,13 @@ def run_pdm_score(args: List[Dict[str, Union[List[str], DictConfig]]]) -> List[p
         traffic_agents_policy: AbstractTrafficAgentsPolicy = instantiate(
             cfg.traffic_agents_policy.reactive, simulator.proposal_sampling
         )
-    metric_cache_loader = MetricCacheLoader(Path(cfg.metric_cache_path))
+    if cfg.prewarm_map_apis:
+        prewarm_map_apis()
+    metric_cache_loader = build_metric_cache_loader(cfg)
     scene_filter: SceneFilter = instantiate(cfg.train_test_split.scene_filter)
     scene_filter.log_names = log_names
     scene_filter.tokens = tokens
+    scene_filter.num_log_loading_workers = 1  # logs are already distributed across workers
     scene_loader = SceneLoader(
         original_sensor_path=Path(cfg.original_sensor_path),
         data_path=Path(cfg.navsim_log_path),
@@ -76,53 +81,64 @@ def run_pdm_score(args: List[Dict[str, Union[List[str], DictConfig]]]) -> List[p
         sensor_config=agent.get_sensor_config(),
     )
 
-    tokens_to_evaluate = list(set(scene_loader.tokens) & set(metric_cache_loader.tokens))
+    # keep the log order of the scene loader, such that overlapping scenes can share decoded sensor blobs
+    metric_cache_tokens = set(metric_cache_loader.tokens)
+    tokens_to_evaluate = [token for token in scene_loader.tokens if token in metric_cache_tokens]
     pdm_results: List[pd.DataFrame] = []
+    agent_inputs = scene_loader.prefetch_agent_inputs(tokens_to_evaluate, **cfg.agent_input_prefetch)
     for idx, (token) in enumerate(tokens_to_evaluate):
         logger.info(
             f"Processing scenario {idx + 1} / {len(tokens_to_evaluate)} in thread_id={thread_id}, node_id={node_id}"
         )
-        try:
-            metric_cache = metric_cache_loader.get_from_token(token)
-            agent_input = scene_loader.get_agent_input_from_token(token)
-            if agent.requires_scene:
-                scene = scene_loader.get_scene_from_token(token)
-                trajectory = agent.compute_trajectory(agent_input, scene)
-            else:
-                trajectory = agent.compute_trajectory(agent_input)
-
-            score_row, ego_simulated_states = pdm_score(
-                metric_cache=metric_cache,
-                model_trajectory=trajectory,
-                future_sampling=simulator.proposal_sampling,
-                simulator=simulator,
-                scorer=scorer,
-                traffic_agents_policy=traffic_agents_policy,
-            )
-            score_row["valid"] = True
-            score_row["log_name"] = metric_cache.log_name
-            score_row["frame_type"] = metric_cache.scene_type
-            score_row["start_time"] = metric_cache.timepoint.time_s
-            end_pose = StateSE2(
-                x=trajectory.poses[-1, 0],
-                y=trajectory.poses[-1, 1],
-                heading=trajectory.poses[-1, 2],
-            )
-            absolute_endpoint = relative_to_absolute_poses(metric_cache.ego_state.rear_axle, [end_pose])[0]
-            score_row["endpoint_x"] = absolute_endpoint.x
-            score_row["endpoint_y"] = absolute_endpoint.y
-            score_row["start_point_x"] = metric_cache.ego_state.rear_axle.x
-            score_row["start_point_y"] = metric_cache.ego_state.rear_axle.y
-            score_row["ego_simulated_states"] = [ego_simulated_states]  # used for two-frames extended comfort
-
-        except Exception:
-            logger.warning(f"----------- Agent failed for token {token}:")
-            traceback.print_exc()
-            score_row = pd.DataFrame([PDMResults.get_empty_results()])
-            score_row["valid"] = False
+        with time_tokens(scene_loader.scene_catalog.get_record(token).log_name):
+            try:
+                metric_cache = metric_cache_loader.get_from_token(token)
+                agent_input = agent_inputs.get_agent_input_from_token(token)
+                if agent.requires_scene:
+                    scene = scene_loader.get_scene_from_token(token)
+                    trajectory = agent.compute_trajectory(agent_input, scene)
+                else:
+                    trajectory = agent.compute_trajectory(agent_input)
+
+                score_row, ego_simulated_states = pdm_score(
+                    metric_cache=metric_cache,
+                    model_trajectory=trajectory,
+                    future_sampling=simulator.proposal_sampling,
+                    simulator=simulator,
+                    scorer=scorer,
+                    traffic_agents_policy=traffic_agents_policy,
+                )
+                score_row["valid"] = True
+                score_row["log_name"] = metric_cache.log_name
+                score_row["frame_type"] = metric_cache.scene_type
+                score_row["start_time"] = metric_cache.timepoint.time_s
+                end_pose = StateSE2(
+                    x=trajectory.poses[-1, 0],
+                    y=trajectory.poses[-1, 1],
+                    heading=trajectory.poses[-1, 2],
+                )
+                absolute_endpoint = relative_to_absolute_poses(metric_cache.ego_state.rear_axle, [end_pose])[0]
+                score_row["endpoint_x"] = absolute_endpoint.x
+                score_row["endpoint_y"] = absolute_endpoint.y
+                score_row["start_point_x"] = metric_cache.ego_state.rear_axle.x
+                score_row["start_point_y"] = metric_cache.ego_state.rear_axle.y
+                score_row["ego_simulated_states"] = [ego_simulated_states]  # used for two-frames extended comfort
+
+            except Exception:
+                logger.warning(f"----------- Agent failed for token {token}:")
+                traceback.print_exc()
+                score_row = pd.DataFrame([PDMResults.get_empty_results()])
+                score_row["valid"] = False
         score_row["token"] = token
 
         pdm_results.append(score_row)
+    agent_inputs.close()
+    logger.info(f"Map api registry of thread_id={thread_id}, node_id={node_id}: {get_map_registry_stats()}")
+    if metric_cache_loader.metric_cache_pool is not None:
+        logger.info(
+            f"Metric cache pool of thread_id={thread_id}, node_id={node_id}: "
+            f"{metric_cache_loader.metric_cache_pool.get_stats()}"
+        )
     return pdm_results
 
 
@@ -255,15 +271,10 @@ def main(cfg: DictConfig) -> None:
     if num_unused_metric_cache_tokens > 0:
         logger.warning(f"Unused metric cache for {num_unused_metric_cache_tokens} tokens. Skipping these tokens.")
     logger.info(f"Starting pdm scoring of {len(tokens_to_evaluate)} scenarios...")
-    data_points = [
-        {
-            "cfg": cfg,
-            "log_file": log_file,
-            "tokens": tokens_list,
-        }
-        for log_file, tokens_list in scene_loader.get_tokens_list_per_log().items()
-    ]
-    score_rows: List[pd.DataFrame] = worker_map(worker, run_pdm_score, data_points)
+    tokens_list_per_log = scene_loader.get_tokens_list_per_log()
+    score_rows: List[pd.DataFrame] = token_batch_map(
+        worker, run_pdm_score, tokens_list_per_log, cfg.scheduler, extra_items={"cfg": cfg}
+    )
 
     pdm_score_df = pd.concat(score_rows)
 
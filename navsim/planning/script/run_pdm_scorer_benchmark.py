@@ -0,0 +1,168 @@
+import logging
+import random
+import time
+from dataclasses import replace
+from pathlib import Path
+from typing import Any, Dict, List
+
+import hydra
+import numpy as np
+import numpy.typing as npt
+import pandas as pd
+from hydra.utils import instantiate
+from omegaconf import DictConfig, OmegaConf
+
+from navsim.common.dataloader import MetricCacheLoader
+from navsim.evaluate.pdm_score import get_trajectory_as_array, transform_trajectory
+from navsim.planning.metric_caching.metric_cache import MetricCache
+from navsim.planning.simulation.planner.pdm_planner.scoring.pdm_scorer import PDMScorer
+from navsim.planning.simulation.planner.pdm_planner.simulation.pdm_simulator import PDMSimulator
+from navsim.planning.simulation.planner.pdm_planner.utils.pdm_enums import StateIndex
+
+logger = logging.getLogger(__name__)
+
+CONFIG_PATH = "config/benchmarks"
+CONFIG_NAME = "default_pdm_scorer_benchmark"
+
+
+def build_proposals(
+    metric_cache: MetricCache, simulator: PDMSimulator, num_proposals: int, seed: int
+) -> npt.NDArray[np.float64]:
+    """
+    Simulates the PDM-Closed and human trajectory of a metric cache, and randomly shifted copies of both.
+    :param metric_cache: metric cache of the scene
+    :param simulator: simulator applied on the proposals
+    :param num_proposals: total number of proposals
+    :param seed: seed of the random shifts
+    :return: simulated states of the proposals
+    """
+    initial_ego_state = metric_cache.ego_state
+    future_sampling = simulator.proposal_sampling
+    trajectories = [
+        metric_cache.trajectory,
+        transform_trajectory(metric_cache.human_trajectory, initial_ego_state),
+    ]
+    base_states = np.stack(
+        [
+            get_trajectory_as_array(trajectory, future_sampling, initial_ego_state.time_point)
+            for trajectory in trajectories
+        ],
+        axis=0,
+    )
+
+    # shift proposals linearly over the horizon, such that all start at the ego state
+    rng = np.random.default_rng(seed)
+    proposal_states = base_states[np.arange(num_proposals) % len(base_states)].copy()
+    offsets = rng.normal(scale=[2.0, 1.0], size=(num_proposals, 2))
+    offsets[: len(base_states)] = 0.0
+    ramp = np.linspace(0.0, 1.0, proposal_states.shape[1])
+    proposal_states[..., StateIndex.X] += offsets[:, None, 0] * ramp
+    proposal_states[..., StateIndex.Y] += offsets[:, None, 1] * ramp
+
+    return simulator.simulate_proposals(proposal_states, initial_ego_state)
+
+
+def score_with_variant(
+    scorer: PDMScorer, metric_cache: MetricCache, simulated_states: npt.NDArray[np.float64]
+) -> Dict[str, Any]:
+    """
+    Scores proposals and measures the scoring time.
+    :param scorer: scorer with the configuration of the variant
+    :param metric_cache: metric cache of the scene
+    :param simulated_states: simulated states of the proposals
+    :return: dictionary of the scoring time and the concatenated results
+    """
+    start_time = time.perf_counter()
+    results = scorer.score_proposals(
+        simulated_states,
+        metric_cache.observation,
+        metric_cache.centerline,
+        metric_cache.route_lane_ids,
+        metric_cache.drivable_area_map,
+        metric_cache.map_parameters,
+        None,
+        metric_cache.past_human_trajectory,
+    )
+    return {"time": time.perf_counter() - start_time, "results": pd.concat(results, ignore_index=True)}
+
+
+def results_are_identical(reference_df: pd.DataFrame, results_df: pd.DataFrame) -> bool:
+    """
+    Compares the scores of two variants exactly.
+    :param reference_df: results of the reference variant
+    :param results_df: results of the compared variant
+    :return: whether all columns are identical
+    """
+    for column in reference_df.columns:
+        reference_values = np.stack(reference_df[column].to_numpy()).astype(np.float64)
+        values = np.stack(results_df[column].to_numpy()).astype(np.float64)
+        if not np.array_equal(reference_values, values, equal_nan=True):
+            return False
+    return True
+
+
+@hydra.main(config_path=CONFIG_PATH, config_name=CONFIG_NAME, version_base=None)
+def main(cfg: DictConfig) -> None:
+    """
+    Main entrypoint for comparing the runtime of PDM scorer configurations, which must yield identical results.
+    :param cfg: omegaconf dictionary
+    """
+    simulator: PDMSimulator = instantiate(cfg.simulator)
+    base_scorer: PDMScorer = instantiate(cfg.scorer)
+    scorers: Dict[str, PDMScorer] = {
+        variant_name: PDMScorer(
+            base_scorer.proposal_sampling,
+            replace(base_scorer._config, **OmegaConf.to_container(overrides, resolve=True)),
+        )
+        for variant_name, overrides in cfg.scorer_variants.items()
+    }
+    reference_name = next(iter(scorers.keys()))
+
+    metric_cache_loader = MetricCacheLoader(Path(cfg.metric_cache_path))
+    file_paths = list(metric_cache_loader.metric_cache_paths.values())
+    file_paths = random.Random(0).sample(file_paths, min(cfg.num_tokens, len(file_paths)))
+
+    measurements: Dict[str, List[float]] = {variant_name: [] for variant_name in scorers.keys()}
+    mismatches: Dict[str, int] = {variant_name: 0 for variant_name in scorers.keys()}
+    for idx, file_path in enumerate(file_paths):
+        metric_cache = MetricCache.load(file_path)
+        simulated_states = build_proposals(metric_cache, simulator, cfg.num_proposals, seed=idx)
+
+        reference_df = None
+        for variant_name, scorer in scorers.items():
+            variant_times, variant_results = [], None
+            for _ in range(cfg.num_repetitions):
+                variant_output = score_with_variant(scorer, metric_cache, simulated_states)
+                variant_times.append(variant_output["time"])
+                variant_results = variant_output["results"]
+            measurements[variant_name].append(min(variant_times))
+
+            if variant_name == reference_name:
+                reference_df = variant_results
+            elif not results_are_identical(reference_df, variant_results):
+                mismatches[variant_name] += 1
+                logger.warning(f"Scorer variant {variant_name} differs from {reference_name} for {file_path}.")
+
+    reference_time = max(sum(measurements[reference_name]), 1e-9)
+    results = [
+        {
+            "variant": variant_name,
+            "num_tokens": len(times),
+            "num_proposals": cfg.num_proposals,
+            "time_per_token_ms": 1000 * np.mean(times) if len(times) > 0 else np.nan,
+            "time_p90_ms": 1000 * np.percentile(times, 90) if len(times) > 0 else np.nan,
+            "speedup": reference_time / max(sum(times), 1e-9),
+            "num_mismatches": mismatches[variant_name],
+        }
+        for variant_name, times in measurements.items()
+    ]
+
+    results_df = pd.DataFrame(results)
+    Path(cfg.output_dir).mkdir(parents=True, exist_ok=True)
+    save_path = Path(cfg.output_dir) / "pdm_scorer_benchmark.csv"
+    results_df.to_csv(save_path)
+    logger.info(f"PDM scorer benchmark results (stored in {save_path}):\n{results_df.to_string()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import numpy.typing as npt
+import shapely
+from nuplan.common.actor_state.state_representation import Point2D
+from nuplan.common.maps.abstract_map import AbstractMap
+from nuplan.common.maps.maps_datatypes import SemanticMapLayer
+from nuplan.planning.simulation.occupancy_map.abstract_occupancy_map import Geometry
+from shapely.strtree import STRtree
+
+# approximate memory of a polygon coordinate, including shapely overhead
+_BYTES_PER_COORDINATE = 32
+
+# tiles are queried with a margin, such that rounding never drops objects on tile borders
+_TILE_MARGIN = 1.0  # [m]
+
+TileKey = Tuple[str, int, int]
+
+
+@dataclass
+class DrivableAreaObject:
+    """Lightweight copy of the id and polygon of a drivable map object, with the interior edges of roadblocks."""
+
+    id: str
+    polygon: Geometry
+    interior_edges: List[DrivableAreaObject] = field(default_factory=list)
+
+
+@dataclass
+class DrivableAreaTile:
+    """Drivable map objects intersecting a square tile of a map, with a str-tree over their polygons."""
+
+    layers: npt.NDArray[np.int64]  # SemanticMapLayer value of each object
+    objects: List[DrivableAreaObject]
+    str_tree: STRtree
+    num_bytes: int
+
+
+def _get_object_order(map_object: DrivableAreaObject) -> int:
+    """Helper function to sort map objects by their numeric feature id, which is the order of the map layers on disk."""
+    return int(map_object.id)
+
+
+class DrivableAreaTileCache:
+    """
+    Least-recently-used cache of drivable map objects in square tiles of each map, with a byte budget.
+    Neighbouring scenes query almost the same drivable area, which is assembled from the cached tiles instead of the
+    map api. The assembled objects are identical to AbstractMap.get_proximal_map_objects, in the same order as long as
+    the map api returns objects in the order of their numeric feature ids (as the GPKG maps of nuPlan). Queries with
+    other ids are forwarded to the map api.
+    """
+
+    def __init__(self, max_bytes: int, tile_size: float = 64.0, check_equivalence: bool = False):
+        """
+        Initializes the cache.
+        :param max_bytes: maximum number of bytes of cached tiles, estimated from their polygon coordinates
+        :param tile_size: side length of the square tiles [m]
+        :param check_equivalence: whether to compare every query with the map api, e.g. for a new map version
+        """
+        assert max_bytes >= 0, "DrivableAreaTileCache: max_bytes must be non-negative."
+        assert tile_size > 0, "DrivableAreaTileCache: tile_size must be positive."
+        self._max_bytes = max_bytes
+        self._tile_size = tile_size
+        self._check_equivalence = check_equivalence
+        self._tiles: OrderedDict[TileKey, DrivableAreaTile] = OrderedDict()
+        self._num_bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._num_forwarded = 0
+        self._lock = threading.Lock()
+
+    def _load_tile(
+        self, map_api: AbstractMap, tile_x: int, tile_y: int, layers: List[SemanticMapLayer]
+    ) -> DrivableAreaTile:
+        """Helper method to extract the drivable map objects of a tile from the map api."""
+        half_size = self._tile_size / 2 + _TILE_MARGIN
+        center = Point2D((tile_x + 0.5) * self._tile_size, (tile_y + 0.5) * self._tile_size)
+        map_objects = map_api.get_proximal_map_objects(center, half_size, layers)
+
+        tile_layers: List[int] = []
+        tile_objects: List[DrivableAreaObject] = []
+        for layer in layers:
+            for map_object in map_objects[layer]:
+                interior_edges = []
+                if layer in [SemanticMapLayer.ROADBLOCK, SemanticMapLayer.ROADBLOCK_CONNECTOR]:
+                    interior_edges = [DrivableAreaObject(edge.id, edge.polygon) for edge in map_object.interior_edges]
+                tile_layers.append(layer.value)
+                tile_objects.append(DrivableAreaObject(map_object.id, map_object.polygon, interior_edges))
+
+        polygons = [map_object.polygon for map_object in tile_objects]
+        polygons += [edge.polygon for map_object in tile_objects for edge in map_object.interior_edges]
+        num_bytes = int(shapely.get_num_coordinates(np.array(polygons, dtype=np.object_)).sum()) * _BYTES_PER_COORDINATE
+        return DrivableAreaTile(
+            layers=np.array(tile_layers, dtype=np.int64),
+            objects=tile_objects,
+            str_tree=STRtree([map_object.polygon for map_object in tile_objects]),
+            num_bytes=num_bytes,
+        )
+
+    def _get_tile(
+        self, map_api: AbstractMap, tile_x: int, tile_y: int, layers: List[SemanticMapLayer]
+    ) -> DrivableAreaTile:
+        """Helper method to return a cached tile or to load and cache it."""
+        key: TileKey = (f"{map_api.map_name}:{','.join(str(layer.value) for layer in layers)}", tile_x, tile_y)
+        with self._lock:
+            tile = self._tiles.get(key)
+            if tile is not None:
+                self._tiles.move_to_end(key)
+                self._hits += 1
+                return tile
+            self._misses += 1
+
+        # load outside of the lock, such that threads querying other tiles do not block each other
+        tile = self._load_tile(map_api, tile_x, tile_y, layers)
+        if tile.num_bytes > self._max_bytes:
+            return tile
+
+        with self._lock:
+            if key not in self._tiles:
+                self._tiles[key] = tile
+                self._num_bytes += tile.num_bytes
+                while self._num_bytes > self._max_bytes:
+                    _, evicted_tile = self._tiles.popitem(last=False)
+                    self._num_bytes -= evicted_tile.num_bytes
+                    self._evictions += 1
+        return tile
+
+    def get_proximal_map_objects(
+        self, map_api: AbstractMap, point: Point2D, radius: float, layers: List[SemanticMapLayer]
+    ) -> Dict[SemanticMapLayer, List[DrivableAreaObject]]:
+        """
+        Extracts the map objects intersecting a square patch around a point, as get_proximal_map_objects of the map api.
+        :param map_api: map api of the map location
+        :param point: center of the patch
+        :param radius: half side length of the patch [m]
+        :param layers: drivable map layers to query
+        :return: dictionary of map layers and lists of map objects with id, polygon and interior edges
+        """
+        patch = shapely.box(point.x - radius, point.y - radius, point.x + radius, point.y + radius)
+        tile_x_min, tile_x_max = np.floor(np.array([point.x - radius, point.x + radius]) / self._tile_size).astype(int)
+        tile_y_min, tile_y_max = np.floor(np.array([point.y - radius, point.y + radius]) / self._tile_size).astype(int)
+
+        map_objects: Dict[SemanticMapLayer, Dict[str, DrivableAreaObject]] = {layer: {} for layer in layers}
+        for tile_x in range(tile_x_min, tile_x_max + 1):
+            for tile_y in range(tile_y_min, tile_y_max + 1):
+                tile = self._get_tile(map_api, tile_x, tile_y, layers)
+                for object_idx in tile.str_tree.query(patch, predicate="intersects"):
+                    map_object = tile.objects[object_idx]
+                    map_objects[SemanticMapLayer(tile.layers[object_idx])].setdefault(map_object.id, map_object)
+
+        if not all(object_id.isdigit() for layer_objects in map_objects.values() for object_id in layer_objects):
+            # the order of the map api is only known for numeric feature ids
+            with self._lock:
+                self._num_forwarded += 1
+            return map_api.get_proximal_map_objects(point, radius, layers)
+
+        proximal_map_objects = {
+            layer: sorted(layer_objects.values(), key=_get_object_order) for layer, layer_objects in map_objects.items()
+        }
+        if self._check_equivalence:
+            self._assert_equivalence(map_api, point, radius, layers, proximal_map_objects)
+        return proximal_map_objects
+
+    @staticmethod
+    def _assert_equivalence(
+        map_api: AbstractMap,
+        point: Point2D,
+        radius: float,
+        layers: List[SemanticMapLayer],
+        proximal_map_objects: Dict[SemanticMapLayer, List[DrivableAreaObject]],
+    ) -> None:
+        """Helper method to check the assembled map objects against the map api, incl. ids, order and polygons."""
+        expected_map_objects = map_api.get_proximal_map_objects(point, radius, layers)
+        for layer in layers:
+            expected_ids = [map_object.id for map_object in expected_map_objects[layer]]
+            assembled_ids = [map_object.id for map_object in proximal_map_objects[layer]]
+            assert assembled_ids == expected_ids, (
+                f"DrivableAreaTileCache: {layer.name} objects at ({point.x:.1f}, {point.y:.1f}) of {map_api.map_name} "
+                f"differ from the map api, {assembled_ids} instead of {expected_ids}!"
+            )
+            for map_object, expected_map_object in zip(proximal_map_objects[layer], expected_map_objects[layer]):
+                assert map_object.polygon.equals(
+                    expected_map_object.polygon
+                ), f"DrivableAreaTileCache: polygon of {layer.name} object {map_object.id} differs from the map api!"
+
+    def get_stats(self) -> Dict[str, float]:
+        """
+        :return: dictionary with number of hits, misses, evictions, cached tiles and bytes, the hit rate, and the
+            number of queries forwarded to the map api.
+        """
+        with self._lock:
+            num_requests = self._hits + self._misses
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / num_requests if num_requests > 0 else 0.0,
+                "evictions": self._evictions,
+                "num_tiles": len(self._tiles),
+                "num_bytes": self._num_bytes,
+                "num_forwarded": self._num_forwarded,
+            }
+
+    def clear(self) -> None:
+        """Removes all cached tiles and resets the statistics."""
+        with self._lock:
+            self._tiles.clear()
+            self._num_bytes = 0
+            self._hits, self._misses, self._evictions, self._num_forwarded = 0, 0, 0, 0
+
+    def __getstate__(self) -> Dict[str, object]:
+        """Only the configuration is pickled, e.g. into ray tasks."""
+        return {
+            "max_bytes": self._max_bytes,
+            "tile_size": self._tile_size,
+            "check_equivalence": self._check_equivalence,
+        }
+
+    def __setstate__(self, state: Dict[str, object]) -> None:
+        """Restores an empty cache after unpickling."""
+        self.__init__(state["max_bytes"], state["tile_size"], state.get("check_equivalence", False))
+
+
+_drivable_area_tile_cache: Optional[DrivableAreaTileCache] = None
+_drivable_area_tile_cache_config: Optional[Tuple[int, float, bool]] = None
+_drivable_area_tile_cache_lock = threading.Lock()
+
+
+def configure_drivable_area_tile_cache(
+    max_bytes: int, tile_size: float = 64.0, check_equivalence: bool = False
+) -> Optional[DrivableAreaTileCache]:
+    """
+    Sets up the drivable area tile cache shared by all drivable maps of the process, see drivable_area_tile_cache in
+    default_metric_caching.yaml. An existing cache with the same configuration is kept, e.g. across worker batches.
+    :param max_bytes: maximum number of bytes of cached tiles per process, zero disables the cache
+    :param tile_size: side length of the square tiles [m]
+    :param check_equivalence: whether to compare every query with the map api
+    :return: process-wide drivable area tile cache, or None if disabled
+    """
+    global _drivable_area_tile_cache, _drivable_area_tile_cache_config
+    config = (max_bytes, tile_size, check_equivalence)
+    with _drivable_area_tile_cache_lock:
+        if max_bytes == 0:
+            _drivable_area_tile_cache, _drivable_area_tile_cache_config = None, None
+        elif _drivable_area_tile_cache_config != config:
+            _drivable_area_tile_cache = DrivableAreaTileCache(max_bytes, tile_size, check_equivalence)
+            _drivable_area_tile_cache_config = config
+        return _drivable_area_tile_cache
+
+
+def get_drivable_area_tile_cache() -> Optional[DrivableAreaTileCache]:
+    """
+    Returns the drivable area tile cache shared by all drivable maps of the process.
+    :return: process-wide drivable area tile cache, or None if not set up with configure_drivable_area_tile_cache
+    """
+    with _drivable_area_tile_cache_lock:
+        return _drivable_area_tile_cache
@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import List, Tuple
+
+import numpy as np
+import numpy.typing as npt
+import shapely
+from nuplan.common.actor_state.state_representation import Point2D
+from nuplan.common.maps.maps_datatypes import SemanticMapLayer
+
+# cells are tested with a margin, such that rounding of the cell lookup never assigns a point to a wrong cell
+_CELL_MARGIN = 1e-6  # [m]
+
+
+@dataclass
+class DrivableAreaRaster:
+    """
+    Multi-channel grid of the drivable area polygons around the ego vehicle.
+    Each cell stores the polygons containing the whole cell and the map layers of these polygons. Cells crossed by a
+    polygon boundary, or contained in more polygons than channels, are marked as inexact and have to be refined.
+    """
+
+    origin: npt.NDArray[np.float64]  # (2,), x, y of the lower left corner of the grid
+    resolution: float  # [m], side length of the square cells
+    layer_masks: npt.NDArray[np.int32]  # (height, width), bitmask of SemanticMapLayer values containing the cell
+    polygon_idcs: npt.NDArray[np.signedinteger]  # (height, width, channels), indices of containing polygons, or -1
+    is_exact: npt.NDArray[np.bool_]  # (height, width), whether the cell is free of polygon boundaries
+
+    @classmethod
+    def from_polygons(
+        cls,
+        geometries: npt.NDArray[np.object_],
+        map_types: List[SemanticMapLayer],
+        center: Point2D,
+        radius: float,
+        resolution: float,
+        max_polygons_per_cell: int = 8,
+    ) -> DrivableAreaRaster:
+        """
+        Rasterizes drivable area polygons in a square around a center point.
+        :param geometries: array of polygons
+        :param map_types: SemanticMapLayer of each polygon
+        :param center: center of the rasterized square, e.g. the ego position
+        :param radius: half side length of the rasterized square [m]
+        :param resolution: side length of the cells [m]
+        :param max_polygons_per_cell: number of polygon index channels, cells in more polygons are inexact
+        :return: drivable area raster
+        """
+        assert resolution > 0, "DrivableAreaRaster: resolution must be positive!"
+        assert all(map_type.value < 31 for map_type in map_types), "DrivableAreaRaster: layer exceeds bitmask!"
+        geometries = np.asarray(geometries, dtype=np.object_)
+
+        size = int(np.ceil(2 * radius / resolution))
+        origin = np.array([center.x - radius, center.y - radius], dtype=np.float64)
+        layer_masks = np.zeros((size, size), dtype=np.int32)
+        index_dtype = np.int16 if len(geometries) < np.iinfo(np.int16).max else np.int32
+        polygon_idcs = np.full((size, size, max_polygons_per_cell), -1, dtype=index_dtype)
+        num_polygons = np.zeros((size, size), dtype=np.int64)
+        is_exact = np.ones((size, size), dtype=np.bool_)
+
+        # cells as boxes with margin, and their centers
+        cell_edges_x = origin[0] + resolution * np.arange(size + 1)
+        cell_edges_y = origin[1] + resolution * np.arange(size + 1)
+        cell_boxes = shapely.box(
+            cell_edges_x[None, :-1] - _CELL_MARGIN,
+            cell_edges_y[:-1, None] - _CELL_MARGIN,
+            cell_edges_x[None, 1:] + _CELL_MARGIN,
+            cell_edges_y[1:, None] + _CELL_MARGIN,
+        )
+        cell_centers_x = (cell_edges_x[:-1] + cell_edges_x[1:]) / 2
+        cell_centers_y = (cell_edges_y[:-1] + cell_edges_y[1:]) / 2
+
+        for polygon_idx, (polygon, map_type) in enumerate(zip(geometries, map_types)):
+            if shapely.is_empty(polygon):
+                continue
+            (col_start, row_start), (col_end, row_end) = cls._get_window(
+                origin, resolution, size, shapely.bounds(polygon)
+            )
+            if col_start >= col_end or row_start >= row_end:
+                continue
+
+            # cells touching the boundary are inexact, all other cells are either inside or outside
+            boundary = shapely.boundary(polygon)
+            shapely.prepare(boundary)
+            window_boxes = cell_boxes[row_start:row_end, col_start:col_end]
+            is_near_boundary = shapely.intersects(boundary, window_boxes)
+            is_inside = shapely.contains_xy(
+                polygon,
+                cell_centers_x[None, col_start:col_end],
+                cell_centers_y[row_start:row_end, None],
+            )
+            is_exact[row_start:row_end, col_start:col_end] &= ~is_near_boundary
+
+            rows, cols = np.nonzero(is_inside & ~is_near_boundary)
+            rows, cols = rows + row_start, cols + col_start
+            channels = num_polygons[rows, cols]
+            has_channel = channels < max_polygons_per_cell
+            polygon_idcs[rows[has_channel], cols[has_channel], channels[has_channel]] = polygon_idx
+            is_exact[rows[~has_channel], cols[~has_channel]] = False
+            layer_masks[rows, cols] |= np.int32(1 << map_type.value)
+            num_polygons[rows, cols] += 1
+
+        return DrivableAreaRaster(
+            origin=origin,
+            resolution=resolution,
+            layer_masks=layer_masks,
+            polygon_idcs=polygon_idcs,
+            is_exact=is_exact,
+        )
+
+    @staticmethod
+    def _get_window(
+        origin: npt.NDArray[np.float64], resolution: float, size: int, bounds: npt.NDArray[np.float64]
+    ) -> Tuple[Tuple[int, int], Tuple[int, int]]:
+        """Helper method to find the cells overlapping the bounds of a polygon (with one cell margin)."""
+        start = np.floor((bounds[:2] - origin) / resolution).astype(np.int64) - 1
+        end = np.floor((bounds[2:] - origin) / resolution).astype(np.int64) + 2
+        start, end = np.clip(start, 0, size), np.clip(end, 0, size)
+        return (int(start[0]), int(start[1])), (int(end[0]), int(end[1]))
+
+    @property
+    def num_channels(self) -> int:
+        """
+        :return: maximum number of polygons per cell
+        """
+        return self.polygon_idcs.shape[-1]
+
+    def lookup(
+        self, points: npt.NDArray[np.float64]
+    ) -> Tuple[npt.NDArray[np.bool_], npt.NDArray[np.signedinteger], npt.NDArray[np.int32]]:
+        """
+        Looks up the cells of points.
+        :param points: array of x, y coordinates, shape (N, 2)
+        :return: tuple of whether the lookup is exact (false outside the grid), the indices of containing polygons
+            padded with -1, shape (N, channels), and the bitmask of containing map layers, shape (N,)
+        """
+        size = self.is_exact.shape[0]
+        cell_idcs = np.floor((points - self.origin) / self.resolution)
+        in_grid = np.all((0 <= cell_idcs) & (cell_idcs < size), axis=-1)  # false for NaN
+
+        cols, rows = cell_idcs[in_grid].astype(np.int64).T
+        is_exact = np.zeros(len(points), dtype=np.bool_)
+        is_exact[in_grid] = self.is_exact[rows, cols]
+        polygon_idcs = np.full((len(points), self.num_channels), -1, dtype=self.polygon_idcs.dtype)
+        polygon_idcs[in_grid] = self.polygon_idcs[rows, cols]
+        layer_masks = np.zeros(len(points), dtype=np.int32)
+        layer_masks[in_grid] = self.layer_masks[rows, cols]
+        return is_exact, polygon_idcs, layer_masks
@@ -2,6 +2,7 @@ import warnings
 from typing import Dict, List, Optional, Tuple
 
 import numpy as np
+import numpy.typing as npt
 import shapely.creation
 from nuplan.common.actor_state.ego_state import EgoState
 from nuplan.common.actor_state.tracked_objects import TrackedObject
@@ -82,6 +83,38 @@ class PDMObservation:
         local_idx = self._global_to_local_idcs[time_idx]
         return self._occupancy_maps[local_idx]
 
+    def query_over_time(
+        self,
+        geometries: npt.NDArray[np.object_],
+        time_idcs: npt.NDArray[np.int64],
+        predicate: str = "intersects",
+    ) -> Tuple[npt.NDArray[np.int64], npt.NDArray[np.int64]]:
+        """
+        Queries geometries of different time steps in bulk, equivalent to self[time_idx].query(geometry, predicate)
+        for each geometry. Time steps sharing an occupancy map (see observation_sample_res) are queried together.
+        :param geometries: array of geometries to query
+        :param time_idcs: index for future simulation iterations [10Hz] of each geometry
+        :param predicate: see shapely, defaults to "intersects"
+        :return: tuple of indices of queried geometries and of intersecting geometries in their occupancy map
+        """
+        assert self._initialized, "PDMObservation: Has not been updated yet!"
+        geometries, time_idcs = np.asarray(geometries, dtype=np.object_), np.asarray(time_idcs, dtype=np.int64)
+        assert np.all(
+            (0 <= time_idcs) & (time_idcs < len(self._global_to_local_idcs))
+        ), "PDMObservation: index out of range!"
+
+        local_idcs = np.asarray(self._global_to_local_idcs, dtype=np.int64)[time_idcs]
+        order = np.argsort(local_idcs, kind="stable")
+        unique_local_idcs, split_idcs = np.unique(local_idcs[order], return_index=True)
+
+        query_idcs, geometry_idcs = [np.array([], dtype=np.int64)], [np.array([], dtype=np.int64)]
+        for local_idx, group_idcs in zip(unique_local_idcs, np.split(order, split_idcs[1:])):
+            intersecting = self._occupancy_maps[local_idx].query(geometries[group_idcs], predicate=predicate)
+            query_idcs.append(group_idcs[intersecting[0]])
+            geometry_idcs.append(intersecting[1])
+
+        return np.concatenate(query_idcs), np.concatenate(geometry_idcs)
+
     @property
     def collided_track_ids(self) -> List[str]:
         """
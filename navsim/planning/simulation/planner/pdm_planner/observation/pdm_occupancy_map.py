@@ -1,11 +1,11 @@
 # TODO: Move & rename this file for common usage (not specific for PDM)
 from __future__ import annotations
 
-from typing import Any, Dict, List, Tuple, Type
+from typing import Any, Dict, List, Optional, Tuple, Type
 
 import numpy as np
 import numpy.typing as npt
-import shapely.vectorized
+import shapely
 from nuplan.common.actor_state.ego_state import EgoState
 from nuplan.common.actor_state.state_representation import Point2D
 from nuplan.common.maps.abstract_map import AbstractMap, MapObject
@@ -14,6 +14,11 @@ from nuplan.planning.simulation.occupancy_map.abstract_occupancy_map import Geom
 from shapely.geometry import Point
 from shapely.strtree import STRtree
 
+from navsim.planning.simulation.planner.pdm_planner.observation.pdm_drivable_area_cache import (
+    get_drivable_area_tile_cache,
+)
+from navsim.planning.simulation.planner.pdm_planner.observation.pdm_drivable_area_raster import DrivableAreaRaster
+
 
 class PDMOccupancyMap:
     """Occupancy map class of PDM, based on shapely's str-tree."""
@@ -96,6 +101,14 @@ class PDMOccupancyMap:
         """
         return self._str_tree.query(geometry, predicate=predicate)
 
+    @property
+    def geometries(self) -> npt.NDArray[np.object_]:
+        """
+        Getter for geometries in occupancy map
+        :return: array of geometries
+        """
+        return np.asarray(self._geometries, dtype=np.object_)
+
 
 class PDMDrivableMap(PDMOccupancyMap):
     def __init__(
@@ -104,6 +117,7 @@ class PDMDrivableMap(PDMOccupancyMap):
         map_types: List[SemanticMapLayer],
         geometries: npt.NDArray[np.object_],
         node_capacity: int = 10,
+        raster: Optional[DrivableAreaRaster] = None,
     ):
         assert (
             len(tokens) == len(geometries) == len(map_types)
@@ -113,10 +127,11 @@ class PDMDrivableMap(PDMOccupancyMap):
 
         # attribute
         self._map_types = map_types
+        self._raster = raster
 
     def __reduce__(self) -> Tuple[Type[PDMDrivableMap], Tuple[Any, ...]]:
         """Helper for pickling."""
-        return self.__class__, (self._tokens, self._map_types, self._geometries, self._node_capacity)
+        return self.__class__, (self._tokens, self._map_types, self._geometries, self._node_capacity, self._raster)
 
     @property
     def map_types(self) -> List[SemanticMapLayer]:
@@ -126,6 +141,27 @@ class PDMDrivableMap(PDMOccupancyMap):
         """
         return self._map_types
 
+    @property
+    def raster(self) -> Optional[DrivableAreaRaster]:
+        """
+        Getter for the optional precomputed raster of the drivable area
+        :return: drivable area raster or None
+        """
+        return self._raster
+
+    def build_raster(self, center: Point2D, radius: float, resolution: float, max_polygons_per_cell: int = 8) -> None:
+        """
+        Precomputes a raster of the polygons, which answers point queries by array indexing.
+        Points in cells crossed by polygon boundaries are still tested exactly, i.e. results do not change.
+        :param center: center of the rasterized square, e.g. the ego position
+        :param radius: half side length of the rasterized square [m]
+        :param resolution: side length of the cells [m]
+        :param max_polygons_per_cell: number of polygon index channels of the raster
+        """
+        self._raster = DrivableAreaRaster.from_polygons(
+            self._geometries, self._map_types, center, radius, resolution, max_polygons_per_cell
+        )
+
     @classmethod
     def from_simulation(cls, map_api: AbstractMap, ego_state: EgoState, map_radius: float = 50) -> PDMDrivableMap:
         """ """
@@ -140,7 +176,16 @@ class PDMDrivableMap(PDMOccupancyMap):
 
         # query all drivable map elements around ego position
         position: Point2D = ego_state.center.point
-        drivable_area = map_api.get_proximal_map_objects(position, map_radius, roadblock_layers + drivable_map_layers)
+        drivable_area_tile_cache = get_drivable_area_tile_cache()
+        if drivable_area_tile_cache is not None:
+            # assemble from cached map tiles, which are shared by neighbouring scenes
+            drivable_area = drivable_area_tile_cache.get_proximal_map_objects(
+                map_api, position, map_radius, roadblock_layers + drivable_map_layers
+            )
+        else:
+            drivable_area = map_api.get_proximal_map_objects(
+                position, map_radius, roadblock_layers + drivable_map_layers
+            )
 
         # collect lane polygons in list, save on-route indices
         polygons: List[Geometry] = []
@@ -202,15 +247,53 @@ class PDMDrivableMap(PDMOccupancyMap):
         assert points.shape[-1] == 2, "Points array must have shape (...,2) for x, y coordinates!"
 
         input_shape = points.shape[:-1]
-        flattened_points = points.reshape(-1, 2)
+        polygon_idcs, point_idcs = self.points_in_polygons_sparse(points)
 
-        output = np.zeros((len(self._geometries), len(flattened_points)), dtype=bool)
-        for i, polygon in enumerate(self._geometries):
-            output[i] = shapely.vectorized.contains(polygon, flattened_points[:, 0], flattened_points[:, 1])
+        output = np.zeros((len(self._geometries), int(np.prod(input_shape))), dtype=bool)
+        output[polygon_idcs, point_idcs] = True
 
         output_shape = (len(self._geometries),) + input_shape
         return output.reshape(output_shape)
 
+    def points_in_polygons_sparse(
+        self, points: npt.NDArray[np.float64]
+    ) -> Tuple[npt.NDArray[np.int64], npt.NDArray[np.int64]]:
+        """
+        Determines which input-points are in which polygons of the occupancy map, as sparse pairs
+        :param points: input-points
+        :return: tuple of polygon indices and indices of the flattened input-points, sorted by polygon and point
+        """
+        assert points.shape[-1] == 2, "Points array must have shape (...,2) for x, y coordinates!"
+        flattened_points = points.reshape(-1, 2)
+
+        if self._raster is not None:
+            is_exact, raster_polygon_idcs, _ = self._raster.lookup(flattened_points)
+            point_idcs, channel_idcs = np.nonzero((raster_polygon_idcs >= 0) & is_exact[:, None])
+            polygon_idcs = raster_polygon_idcs[point_idcs, channel_idcs].astype(np.int64)
+
+            # points near polygon boundaries or outside of the raster are tested exactly
+            refined_idcs = np.where(~is_exact)[0]
+            refined_polygon_idcs, refined_point_idcs = self._query_points(flattened_points[refined_idcs])
+            polygon_idcs = np.concatenate([polygon_idcs, refined_polygon_idcs])
+            point_idcs = np.concatenate([point_idcs, refined_idcs[refined_point_idcs]])
+        else:
+            polygon_idcs, point_idcs = self._query_points(flattened_points)
+
+        order = np.lexsort((point_idcs, polygon_idcs))
+        return polygon_idcs[order], point_idcs[order]
+
+    def _query_points(self, points: npt.NDArray[np.float64]) -> Tuple[npt.NDArray[np.int64], npt.NDArray[np.int64]]:
+        """
+        Helper method to find the polygons containing points, with the str-tree as bounding box filter
+        :param points: input-points of shape (N, 2)
+        :return: tuple of polygon indices and point indices
+        """
+        point_idcs, polygon_idcs = self._str_tree.query(shapely.points(points))
+        geometries = self.geometries
+        shapely.prepare(geometries)  # no-op for already prepared polygons
+        is_inside = shapely.contains_xy(geometries[polygon_idcs], points[point_idcs, 0], points[point_idcs, 1])
+        return polygon_idcs[is_inside], point_idcs[is_inside]
+
     def is_in_layer(self, point: Point2D, layer: SemanticMapLayer) -> bool:
         """
         Checks if point is in map layer
@@ -218,6 +301,25 @@ class PDMDrivableMap(PDMOccupancyMap):
         :param layer: semantic map layer
         :return: boolean
         """
+        if self._raster is not None:
+            is_exact, _, layer_masks = self._raster.lookup(np.array([[point.x, point.y]], dtype=np.float64))
+            if is_exact[0]:
+                return bool(layer_masks[0] & (1 << layer.value))
+
         polygons_indices = self._str_tree.query(Point(point.x, point.y), predicate="within")
         polygons_types = [self._map_types[polygon_idx] for polygon_idx in polygons_indices]
         return layer in polygons_types
+
+    def points_in_layer(self, points: npt.NDArray[np.float64], layer: SemanticMapLayer) -> npt.NDArray[np.bool_]:
+        """
+        Checks if points are in map layer, equivalent to is_in_layer for each point
+        :param points: input-points of shape (..., 2)
+        :param layer: semantic map layer
+        :return: boolean array of shape (...)
+        """
+        polygon_idcs, point_idcs = self.points_in_polygons_sparse(points)
+        is_in_layer = np.isin(polygon_idcs, self.get_indices_of_map_type([layer]))
+
+        output = np.zeros(int(np.prod(points.shape[:-1])), dtype=bool)
+        output[point_idcs[is_in_layer]] = True
+        return output.reshape(points.shape[:-1])
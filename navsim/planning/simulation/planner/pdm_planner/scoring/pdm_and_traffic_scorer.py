@@ -12,13 +12,13 @@ from nuplan.common.actor_state.tracked_objects import TrackedObjects
 from nuplan.common.actor_state.tracked_objects_types import TrackedObjectType
 from nuplan.common.actor_state.vehicle_parameters import VehicleParameters, get_pacifica_parameters
 from nuplan.common.maps.maps_datatypes import SemanticMapLayer
-from nuplan.common.maps.nuplan_map.map_factory import get_maps_api
 from nuplan.common.maps.nuplan_map.nuplan_map import NuPlanMap
 from nuplan.planning.simulation.observation.observation_type import DetectionsTracks
 from nuplan.planning.simulation.trajectory.trajectory_sampling import TrajectorySampling
 from shapely import Point
 
 from navsim.common.dataclasses import PDMResults
+from navsim.common.map_registry import get_map_api
 from navsim.planning.metric_caching.metric_cache import MapParameters
 from navsim.planning.simulation.planner.pdm_planner.observation.pdm_observation import PDMObservation
 from navsim.planning.simulation.planner.pdm_planner.observation.pdm_occupancy_map import PDMDrivableMap
@@ -165,7 +165,7 @@ class PDMTrafficScorer(PDMScorer):
         simulated_agent_detections_tracks: List[DetectionsTracks],
     ) -> List[pd.DataFrame]:
 
-        map_api = get_maps_api(map_parameters.map_root, map_parameters.map_version, map_parameters.map_name)
+        map_api = get_map_api(map_parameters.map_root, map_parameters.map_version, map_parameters.map_name)
 
         # Observations need to be one second longer than the ego-trajectory to calculate ego ttc metrics
         # Thus, we slice the traffic agents trajectories to only evaluate the first four seconds
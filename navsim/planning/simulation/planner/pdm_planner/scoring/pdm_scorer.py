@@ -1,6 +1,6 @@
 import copy
 from dataclasses import dataclass
-from typing import List, Optional
+from typing import Iterator, List, Optional, Tuple
 
 import numpy as np
 import numpy.typing as npt
@@ -14,7 +14,7 @@ from nuplan.planning.simulation.observation.idm.utils import is_agent_ahead, is_
 from nuplan.planning.simulation.observation.observation_type import DetectionsTracks
 from nuplan.planning.simulation.trajectory.interpolated_trajectory import InterpolatedTrajectory
 from nuplan.planning.simulation.trajectory.trajectory_sampling import TrajectorySampling
-from shapely import Point, creation
+from shapely import creation, measurement
 
 from navsim.common.dataclasses import PDMResults
 from navsim.planning.metric_caching.metric_cache import MapParameters
@@ -62,6 +62,9 @@ class PDMScorerConfig:
     # human flag
     human_penalty_filter: Optional[bool] = None
 
+    # performance
+    bulk_observation_queries: bool = True  # query all time steps at once, per occupancy map (identical results)
+
     @property
     def weighted_metrics_array(self) -> npt.NDArray[np.float64]:
         weighted_metrics = np.zeros(len(WeightedMetricIndex), dtype=np.float64)
@@ -111,6 +114,12 @@ class PDMScorer:
         self._collision_time_idcs: Optional[npt.NDArray[np.float64]] = None
         self._ttc_time_idcs: Optional[npt.NDArray[np.float64]] = None
 
+        # intersections of ego polygons and observation (shared by collision and traffic light metric)
+        self._ego_intersections: Optional[Tuple[npt.NDArray[np.int64], ...]] = None
+
+        # ego centers in intersections (shared by driving direction and lane keeping metric)
+        self._ego_centers_in_intersection: Optional[npt.NDArray[np.bool_]] = None
+
     def time_to_at_fault_collision(self, proposal_idx: int) -> float:
         """
         Returns time to at-fault collision for given proposal
@@ -307,6 +316,9 @@ class PDMScorer:
         self._collision_time_idcs.fill(np.inf)
         self._ttc_time_idcs.fill(np.inf)
 
+        self._ego_intersections = None
+        self._ego_centers_in_intersection = None
+
     def _calculate_ego_area(self) -> None:
         """
         Determines the area of proposals over time.
@@ -360,6 +372,94 @@ class PDMScorer:
         batch_oncoming_traffic_mask = center_in_polygon[..., drivable_on_route_idcs].sum(axis=-1) == 0
         self._ego_areas[batch_oncoming_traffic_mask, EgoAreaIndex.ONCOMING_TRAFFIC] = True
 
+    def _get_ego_intersections(self) -> Tuple[npt.NDArray[np.int64], npt.NDArray[np.int64], npt.NDArray[np.int64]]:
+        """
+        Finds the observation geometries intersecting the ego polygons of all proposals and time steps.
+        Pairs are ordered by time step, as when querying the observation step-by-step.
+        :return: tuple of proposal, time, and geometry indices of intersecting pairs
+        """
+        if self._ego_intersections is not None:
+            return self._ego_intersections
+
+        num_time_steps = self.proposal_sampling.num_poses + 1
+        if self._config.bulk_observation_queries:
+            ego_polygons = self._ego_polygons[:, :num_time_steps]
+            proposal_idcs, time_idcs = np.indices(ego_polygons.shape).reshape(2, -1)
+            query_idcs, geometry_idcs = self._observation.query_over_time(
+                ego_polygons.ravel(), time_idcs, predicate="intersects"
+            )
+            proposal_idcs, time_idcs = proposal_idcs[query_idcs], time_idcs[query_idcs]
+        else:
+            proposal_idcs, time_idcs, geometry_idcs = [], [], []
+            for time_idx in range(num_time_steps):
+                intersecting = self._observation[time_idx].query(
+                    self._ego_polygons[:, time_idx], predicate="intersects"
+                )
+                proposal_idcs.append(intersecting[0])
+                time_idcs.append(np.full(len(intersecting[0]), time_idx))
+                geometry_idcs.append(intersecting[1])
+            proposal_idcs, time_idcs, geometry_idcs = (
+                np.concatenate(proposal_idcs),
+                np.concatenate(time_idcs),
+                np.concatenate(geometry_idcs),
+            )
+
+        order = np.lexsort((geometry_idcs, proposal_idcs, time_idcs))
+        self._ego_intersections = (
+            proposal_idcs[order].astype(np.int64),
+            time_idcs[order].astype(np.int64),
+            geometry_idcs[order].astype(np.int64),
+        )
+        return self._ego_intersections
+
+    def _get_ego_centers_in_intersection(self) -> npt.NDArray[np.bool_]:
+        """
+        Checks which ego centers of all proposals and time steps are in an intersection.
+        :return: boolean array of shape (n_proposals, n_horizon)
+        """
+        if self._ego_centers_in_intersection is None:
+            self._ego_centers_in_intersection = self._drivable_area_map.points_in_layer(
+                self._ego_coords[:, :, BBCoordsIndex.CENTER], SemanticMapLayer.INTERSECTION
+            )
+        return self._ego_centers_in_intersection
+
+    def _get_ttc_intersections(
+        self, polygons: npt.NDArray[np.object_], future_time_idcs: npt.NDArray[np.int64]
+    ) -> Iterator[Tuple[int, int, int, int]]:
+        """
+        Finds the observation geometries intersecting the projected ego polygons of the time-to-collision metric.
+        Pairs are ordered by time step and projection step, as when querying the observation step-by-step.
+        :param polygons: projected ego polygons, shape: n_proposals, n_time_steps, n_future_steps
+        :param future_time_idcs: time step offsets of the projections
+        :return: iterator of proposal, time, projection step, and geometry indices of intersecting pairs
+        """
+        if self._config.bulk_observation_queries:
+            proposal_idcs, time_idcs, step_idcs = np.indices(polygons.shape).reshape(3, -1)
+            query_idcs, geometry_idcs = self._observation.query_over_time(
+                polygons.ravel(), time_idcs + future_time_idcs[step_idcs], predicate="intersects"
+            )
+            proposal_idcs, time_idcs, step_idcs = (
+                proposal_idcs[query_idcs],
+                time_idcs[query_idcs],
+                step_idcs[query_idcs],
+            )
+            order = np.lexsort((geometry_idcs, proposal_idcs, step_idcs, time_idcs))
+            yield from zip(
+                proposal_idcs[order].tolist(),
+                time_idcs[order].tolist(),
+                step_idcs[order].tolist(),
+                geometry_idcs[order].tolist(),
+            )
+            return
+
+        for time_idx in range(polygons.shape[1]):
+            for step_idx, future_time_idx in enumerate(future_time_idcs):
+                current_time_idx = time_idx + future_time_idx
+                polygons_at_time_step = polygons[:, time_idx, step_idx]
+                intersecting = self._observation[current_time_idx].query(polygons_at_time_step, predicate="intersects")
+                for proposal_idx, geometry_idx in zip(intersecting[0], intersecting[1]):
+                    yield proposal_idx, time_idx, step_idx, geometry_idx
+
     def _calculate_no_at_fault_collision(self) -> None:
         """
         Re-implementation of nuPlan's at-fault collision metric.
@@ -371,51 +471,44 @@ class PDMScorer:
             for proposal_idx in range(self._num_proposals)
         }
 
-        for time_idx in range(self.proposal_sampling.num_poses + 1):
-            ego_polygons = self._ego_polygons[:, time_idx]
-            intersecting = self._observation[time_idx].query(ego_polygons, predicate="intersects")
-
-            if len(intersecting) == 0:
+        for proposal_idx, time_idx, geometry_idx in zip(*self._get_ego_intersections()):
+            token = self._observation[time_idx].tokens[geometry_idx]
+            if (self._observation.red_light_token in token) or (token in proposal_collided_track_ids[proposal_idx]):
                 continue
 
-            for proposal_idx, geometry_idx in zip(intersecting[0], intersecting[1]):
-                token = self._observation[time_idx].tokens[geometry_idx]
-                if (self._observation.red_light_token in token) or (token in proposal_collided_track_ids[proposal_idx]):
-                    continue
-
-                ego_in_multiple_lanes_or_nondrivable_area = (
-                    self._ego_areas[proposal_idx, time_idx, EgoAreaIndex.MULTIPLE_LANES]
-                    or self._ego_areas[proposal_idx, time_idx, EgoAreaIndex.NON_DRIVABLE_AREA]
-                )
+            ego_in_multiple_lanes_or_nondrivable_area = (
+                self._ego_areas[proposal_idx, time_idx, EgoAreaIndex.MULTIPLE_LANES]
+                or self._ego_areas[proposal_idx, time_idx, EgoAreaIndex.NON_DRIVABLE_AREA]
+            )
 
-                tracked_object = self._observation.unique_objects[token]
+            tracked_object = self._observation.unique_objects[token]
 
-                # classify collision
-                collision_type: CollisionType = get_collision_type(
-                    self._states[proposal_idx, time_idx],
-                    self._ego_polygons[proposal_idx, time_idx],
-                    tracked_object,
-                    self._observation[time_idx][token],
+            # classify collision
+            collision_type: CollisionType = get_collision_type(
+                self._states[proposal_idx, time_idx],
+                self._ego_polygons[proposal_idx, time_idx],
+                tracked_object,
+                self._observation[time_idx][token],
+            )
+            collisions_at_stopped_track_or_active_front: bool = collision_type in [
+                CollisionType.ACTIVE_FRONT_COLLISION,
+                CollisionType.STOPPED_TRACK_COLLISION,
+            ]
+            collision_at_lateral: bool = collision_type == CollisionType.ACTIVE_LATERAL_COLLISION
+
+            # 1. at fault collision
+            if collisions_at_stopped_track_or_active_front or (
+                ego_in_multiple_lanes_or_nondrivable_area and collision_at_lateral
+            ):
+                no_at_fault_collision_score = 0.0 if tracked_object.tracked_object_type in AGENT_TYPES else 0.5
+                no_at_fault_collision_scores[proposal_idx] = np.minimum(
+                    no_at_fault_collision_scores[proposal_idx],
+                    no_at_fault_collision_score,
                 )
-                collisions_at_stopped_track_or_active_front: bool = collision_type in [
-                    CollisionType.ACTIVE_FRONT_COLLISION,
-                    CollisionType.STOPPED_TRACK_COLLISION,
-                ]
-                collision_at_lateral: bool = collision_type == CollisionType.ACTIVE_LATERAL_COLLISION
-
-                # 1. at fault collision
-                if collisions_at_stopped_track_or_active_front or (
-                    ego_in_multiple_lanes_or_nondrivable_area and collision_at_lateral
-                ):
-                    no_at_fault_collision_score = 0.0 if tracked_object.tracked_object_type in AGENT_TYPES else 0.5
-                    no_at_fault_collision_scores[proposal_idx] = np.minimum(
-                        no_at_fault_collision_scores[proposal_idx],
-                        no_at_fault_collision_score,
-                    )
-                    self._collision_time_idcs[proposal_idx] = min(time_idx, self._collision_time_idcs[proposal_idx])
-
-                else:  # 2. no at fault collision
-                    proposal_collided_track_ids[proposal_idx].append(token)
+                self._collision_time_idcs[proposal_idx] = min(time_idx, self._collision_time_idcs[proposal_idx])
+
+            else:  # 2. no at fault collision
+                proposal_collided_track_ids[proposal_idx].append(token)
 
         self._multi_metrics[MultiMetricIndex.NO_COLLISION] = no_at_fault_collision_scores
 
@@ -443,15 +536,9 @@ class PDMScorer:
         oncoming_traffic_masks = self._ego_areas[:, :, EgoAreaIndex.ONCOMING_TRAFFIC]
 
         # remove intersection
-        for proposal_idx in range(self._num_proposals):
-            for time_idx in range(self.proposal_sampling.num_poses + 1):
-                ego_position = Point(*center_coordinates[proposal_idx, time_idx])
-                is_in_intersection = self._drivable_area_map.is_in_layer(ego_position, SemanticMapLayer.INTERSECTION)
-                if not oncoming_traffic_masks[proposal_idx, time_idx] or is_in_intersection:
-                    oncoming_progress[proposal_idx, time_idx] = 0.0
+        oncoming_progress[~oncoming_traffic_masks | self._get_ego_centers_in_intersection()] = 0.0
 
         # aggregate
-        driving_direction_compliance_scores = np.ones(self._num_proposals, dtype=np.float64)
         horizon = int(self._config.driving_direction_horizon / self.proposal_sampling.interval_length)
 
         oncoming_progress_over_horizon = np.concatenate(
@@ -463,13 +550,12 @@ class PDMScorer:
             axis=-1,
         )
 
-        for proposal_idx, progress in enumerate(oncoming_progress_over_horizon.max(axis=-1)):
-            if progress < self._config.driving_direction_compliance_threshold:
-                driving_direction_compliance_scores[proposal_idx] = 1.0
-            elif progress < self._config.driving_direction_violation_threshold:
-                driving_direction_compliance_scores[proposal_idx] = 0.5
-            else:
-                driving_direction_compliance_scores[proposal_idx] = 0.0
+        max_oncoming_progress = oncoming_progress_over_horizon.max(axis=-1)
+        driving_direction_compliance_scores = np.where(
+            max_oncoming_progress < self._config.driving_direction_compliance_threshold,
+            1.0,
+            np.where(max_oncoming_progress < self._config.driving_direction_violation_threshold, 0.5, 0.0),
+        )
 
         self._multi_metrics[MultiMetricIndex.DRIVING_DIRECTION] = driving_direction_compliance_scores
 
@@ -479,13 +565,10 @@ class PDMScorer:
         Calculates progress along the centerline.
         """
 
-        # calculate raw progress in meter
-        progress_in_meter = np.zeros(self._num_proposals, dtype=np.float64)
-        for proposal_idx in range(self._num_proposals):
-            start_point = Point(*self._ego_coords[proposal_idx, 0, BBCoordsIndex.CENTER])
-            end_point = Point(*self._ego_coords[proposal_idx, -1, BBCoordsIndex.CENTER])
-            progress = self._centerline.project([start_point, end_point])
-            progress_in_meter[proposal_idx] = progress[1] - progress[0]
+        # calculate raw progress in meter, projecting start and end points of all proposals at once
+        start_end_points = creation.points(self._ego_coords[:, [0, -1], BBCoordsIndex.CENTER])
+        progress = self._centerline.project(start_end_points)
+        progress_in_meter = progress[:, 1] - progress[:, 0]
 
         self._progress_raw = np.clip(progress_in_meter, a_min=0, a_max=None)
 
@@ -535,47 +618,38 @@ class PDMScorer:
 
         n_proposal_steps_to_evaluate = self.proposal_sampling.num_poses - max(future_time_idcs)
         # check collision for each proposal and projection
-        for time_idx in range(n_proposal_steps_to_evaluate + 1):
-            for step_idx, future_time_idx in enumerate(future_time_idcs):
-                current_time_idx = time_idx + future_time_idx
-                polygons_at_time_step = polygons[:, time_idx, step_idx]
-                intersecting = self._observation[current_time_idx].query(polygons_at_time_step, predicate="intersects")
-
-                if len(intersecting) == 0:
-                    continue
+        polygons = polygons[:, : n_proposal_steps_to_evaluate + 1]
+        for proposal_idx, time_idx, step_idx, geometry_idx in self._get_ttc_intersections(polygons, future_time_idcs):
+            current_time_idx = time_idx + future_time_idcs[step_idx]
+            token = self._observation[current_time_idx].tokens[geometry_idx]
+            if (
+                (self._observation.red_light_token in token)
+                or (token in temp_collided_track_ids[proposal_idx])
+                or (speeds[proposal_idx, time_idx] < self._config.stopped_speed_threshold)
+            ):
+                continue
 
-                for proposal_idx, geometry_idx in zip(intersecting[0], intersecting[1]):
-                    token = self._observation[current_time_idx].tokens[geometry_idx]
-                    if (
-                        (self._observation.red_light_token in token)
-                        or (token in temp_collided_track_ids[proposal_idx])
-                        or (speeds[proposal_idx, time_idx] < self._config.stopped_speed_threshold)
-                    ):
-                        continue
-
-                    ego_in_multiple_lanes_or_nondrivable_area = (
-                        self._ego_areas[proposal_idx, time_idx, EgoAreaIndex.MULTIPLE_LANES]
-                        or self._ego_areas[proposal_idx, time_idx, EgoAreaIndex.NON_DRIVABLE_AREA]
-                    )
-                    ego_rear_axle: StateSE2 = StateSE2(*self._states[proposal_idx, time_idx, StateIndex.STATE_SE2])
-
-                    centroid = self._observation[current_time_idx][token].centroid
-                    track_heading = self._observation.unique_objects[token].box.center.heading
-                    track_state = StateSE2(centroid.x, centroid.y, track_heading)
-                    # TODO: fix ego_area for intersection
-                    if is_agent_ahead(ego_rear_axle, track_state) or (
-                        (
-                            ego_in_multiple_lanes_or_nondrivable_area
-                            or self._drivable_area_map.is_in_layer(
-                                ego_rear_axle.point, layer=SemanticMapLayer.INTERSECTION
-                            )
-                        )
-                        and not is_agent_behind(ego_rear_axle, track_state)
-                    ):
-                        ttc_scores[proposal_idx] = np.minimum(ttc_scores[proposal_idx], 0.0)
-                        self._ttc_time_idcs[proposal_idx] = min(time_idx, self._ttc_time_idcs[proposal_idx])
-                    else:
-                        temp_collided_track_ids[proposal_idx].append(token)
+            ego_in_multiple_lanes_or_nondrivable_area = (
+                self._ego_areas[proposal_idx, time_idx, EgoAreaIndex.MULTIPLE_LANES]
+                or self._ego_areas[proposal_idx, time_idx, EgoAreaIndex.NON_DRIVABLE_AREA]
+            )
+            ego_rear_axle: StateSE2 = StateSE2(*self._states[proposal_idx, time_idx, StateIndex.STATE_SE2])
+
+            centroid = self._observation[current_time_idx][token].centroid
+            track_heading = self._observation.unique_objects[token].box.center.heading
+            track_state = StateSE2(centroid.x, centroid.y, track_heading)
+            # TODO: fix ego_area for intersection
+            if is_agent_ahead(ego_rear_axle, track_state) or (
+                (
+                    ego_in_multiple_lanes_or_nondrivable_area
+                    or self._drivable_area_map.is_in_layer(ego_rear_axle.point, layer=SemanticMapLayer.INTERSECTION)
+                )
+                and not is_agent_behind(ego_rear_axle, track_state)
+            ):
+                ttc_scores[proposal_idx] = np.minimum(ttc_scores[proposal_idx], 0.0)
+                self._ttc_time_idcs[proposal_idx] = min(time_idx, self._ttc_time_idcs[proposal_idx])
+            else:
+                temp_collided_track_ids[proposal_idx].append(token)
 
         self._weighted_metrics[WeightedMetricIndex.TTC] = ttc_scores
 
@@ -586,28 +660,17 @@ class PDMScorer:
         # Initialize scores for all proposals to 1 (compliant by default)
         traffic_light_compliance_scores = np.ones(self._num_proposals, dtype=np.float64)
 
-        # Iterate over each time step within the horizon
-        for time_idx in range(self.proposal_sampling.num_poses + 1):
-            # Get ego polygons (vehicle shapes) at the current time step
-            ego_polygons = self._ego_polygons[:, time_idx]
-            # Query objects intersecting with the ego polygons
-            intersecting = self._observation[time_idx].query(ego_polygons, predicate="intersects")
-
-            # If no intersections, skip this time step
-            if len(intersecting) == 0:
+        # Iterate over each object intersecting with the ego polygons (vehicle shapes), ordered by time step
+        for proposal_idx, time_idx, geometry_idx in zip(*self._get_ego_intersections()):
+            # Skip if the score is already 0
+            if traffic_light_compliance_scores[proposal_idx] == 0.0:
                 continue
 
-            # Iterate over each intersecting object
-            for proposal_idx, geometry_idx in zip(intersecting[0], intersecting[1]):
-                # Skip if the score is already 0
-                if traffic_light_compliance_scores[proposal_idx] == 0.0:
-                    continue
+            token = self._observation[time_idx].tokens[geometry_idx]
 
-                token = self._observation[time_idx].tokens[geometry_idx]
-
-                # Check if the intersecting object is a red light
-                if token.startswith(self._observation.red_light_token):
-                    traffic_light_compliance_scores[proposal_idx] = 0.0
+            # Check if the intersecting object is a red light
+            if token.startswith(self._observation.red_light_token):
+                traffic_light_compliance_scores[proposal_idx] = 0.0
 
         # Store the scores in the multi-metrics system for later evaluation
         self._multi_metrics[MultiMetricIndex.TRAFFIC_LIGHT_COMPLIANCE] = traffic_light_compliance_scores
@@ -626,30 +689,27 @@ class PDMScorer:
         interval_length = self.proposal_sampling.interval_length
         continuous_steps_required = int(np.ceil(self._config.lane_keeping_horizon_window / interval_length))
 
-        centerline = self._centerline.linestring
-
-        for proposal_idx in range(self._num_proposals):
-            consecutive_exceeds = 0
-            for time_idx in range(self.proposal_sampling.num_poses + 1):
-                ego_position = Point(*self._ego_coords[proposal_idx, time_idx, BBCoordsIndex.CENTER])
-
-                is_in_intersection = self._drivable_area_map.is_in_layer(
-                    ego_position, layer=SemanticMapLayer.INTERSECTION
-                )
-
-                if is_in_intersection:
-                    continue
-
-                lateral_deviation = ego_position.distance(centerline)
-
-                if lateral_deviation > lateral_deviation_limit:
-                    consecutive_exceeds += 1
-                else:
-                    consecutive_exceeds = 0
+        ego_centers = creation.points(self._ego_coords[:, :, BBCoordsIndex.CENTER])
+        lateral_deviations = measurement.distance(ego_centers, self._centerline.linestring)
+
+        # steps in intersections are skipped, i.e. neither extend nor interrupt a deviation
+        is_in_intersection = self._get_ego_centers_in_intersection()
+        exceeds = (lateral_deviations > lateral_deviation_limit) & ~is_in_intersection
+        resets = ~(lateral_deviations > lateral_deviation_limit) & ~is_in_intersection
+
+        # consecutive exceeds as cumulative exceeds since the last reset
+        cumulative_exceeds = np.cumsum(exceeds, axis=-1)
+        time_idcs = np.arange(exceeds.shape[-1])
+        last_reset_idcs = np.maximum.accumulate(np.where(resets, time_idcs, -1), axis=-1)
+        exceeds_until_reset = np.where(
+            last_reset_idcs >= 0,
+            np.take_along_axis(cumulative_exceeds, np.maximum(last_reset_idcs, 0), axis=-1),
+            0,
+        )
+        consecutive_exceeds = cumulative_exceeds - exceeds_until_reset
 
-                if consecutive_exceeds >= continuous_steps_required:
-                    lane_keeping_scores[proposal_idx] = 0.0
-                    break
+        failing_mask = np.any((consecutive_exceeds >= continuous_steps_required) & ~is_in_intersection, axis=-1)
+        lane_keeping_scores[failing_mask] = 0.0
 
         self._weighted_metrics[WeightedMetricIndex.LANE_KEEPING] = lane_keeping_scores
 
@@ -10,6 +10,7 @@ from tqdm import tqdm
 
 from navsim.common.dataloader import SceneLoader
 from navsim.planning.training.abstract_feature_target_builder import AbstractFeatureBuilder, AbstractTargetBuilder
+from navsim.planning.utils.multithreading.token_scheduler import time_tokens
 
 logger = logging.getLogger(__name__)
 
@@ -241,8 +242,8 @@ class Dataset(torch.utils.data.Dataset):
         if self._force_cache_computation:
             tokens_to_cache = self._scene_loader.tokens
         else:
-            tokens_to_cache = set(self._scene_loader.tokens) - set(self._valid_cache_paths.keys())
-            tokens_to_cache = list(tokens_to_cache)
+            # keep the log order of the scene loader, such that overlapping scenes can share decoded sensor blobs
+            tokens_to_cache = [token for token in self._scene_loader.tokens if token not in self._valid_cache_paths]
             logger.info(
                 f"""
                 Starting caching of {len(tokens_to_cache)} tokens.
@@ -252,7 +253,9 @@ class Dataset(torch.utils.data.Dataset):
             )
 
         for token in tqdm(tokens_to_cache, desc="Caching Dataset"):
-            self._cache_scene_with_token(token)
+            # timed for the cost history of run_dataset_caching.py, no-op otherwise
+            with time_tokens(self._scene_loader.scene_catalog.get_record(token).log_name):
+                self._cache_scene_with_token(token)
 
     def __len__(self) -> None:
         """
@@ -0,0 +1,351 @@
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from functools import partial
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from nuplan.planning.utils.multithreading.worker_pool import Task, WorkerPool
+from omegaconf import DictConfig
+
+logger = logging.getLogger(__name__)
+
+DataPoint = Dict[str, Any]
+
+# per-thread token timings of the running batch, None outside of token_batch_map
+_token_timings = threading.local()
+
+
+@dataclass
+class BatchStats:
+    """Execution statistics of a token batch."""
+
+    worker_id: str  # host, process and thread of the executing worker
+    log_names: List[str]
+    num_tokens: List[int]  # number of tokens per log
+    start_time: float
+    end_time: float
+    token_times: Dict[str, float] = field(default_factory=dict)  # [s] timed processing of tokens per log
+    num_timed_tokens: Dict[str, int] = field(default_factory=dict)  # number of timed tokens per log
+
+    @property
+    def duration(self) -> float:
+        """
+        :return: wall time of the batch in seconds.
+        """
+        return self.end_time - self.start_time
+
+    @property
+    def setup_time(self) -> Optional[float]:
+        """
+        :return: wall time of the batch outside of timed tokens (e.g. loading scenes), None if no token was timed.
+        """
+        if len(self.token_times) == 0:
+            return None
+        return max(self.duration - sum(self.token_times.values()), 0.0)
+
+
+@contextmanager
+def time_tokens(log_name: str, num_tokens: int = 1) -> Iterator[None]:
+    """
+    Context manager for worker functions to time the processing of tokens of a log. The cost history then excludes
+    the setup of a batch and charges each log of a batch its own time. No-op outside of token_batch_map.
+    :param log_name: name of the log of the tokens
+    :param num_tokens: number of processed tokens, defaults to 1
+    """
+    timings: Optional[Dict[str, List[float]]] = getattr(_token_timings, "timings", None)
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        if timings is not None:
+            log_timings = timings.setdefault(log_name, [0.0, 0])
+            log_timings[0] += time.perf_counter() - start_time
+            log_timings[1] += num_tokens
+
+
+def _run_timed_batch(batch: List[DataPoint], fn: Callable[..., List[Any]]) -> Tuple[List[Any], BatchStats]:
+    """
+    Helper function to run a worker function on a batch, and to record on which worker and how long it ran.
+    :param batch: list of data points with log names and tokens
+    :param fn: worker function
+    :return: tuple of the results of the worker function and the batch statistics
+    """
+    _token_timings.timings = {}
+    start_time = time.time()
+    try:
+        results = fn(batch)
+        end_time = time.time()
+        timings = _token_timings.timings
+    finally:
+        _token_timings.timings = None
+    stats = BatchStats(
+        worker_id=f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}",
+        log_names=[data_point["log_file"] for data_point in batch],
+        num_tokens=[len(data_point["tokens"]) for data_point in batch],
+        start_time=start_time,
+        end_time=end_time,
+        token_times={log_name: log_timings[0] for log_name, log_timings in timings.items()},
+        num_timed_tokens={log_name: log_timings[1] for log_name, log_timings in timings.items()},
+    )
+    return results, stats
+
+
+class TokenCostHistory:
+    """Historical cost in seconds per token of each log and setup time per batch of a job, updated with every run."""
+
+    def __init__(self, history_path: Optional[Path] = None, job_name: str = "default", momentum: float = 0.5):
+        """
+        Initializes the cost history.
+        :param history_path: json file of the history, costs are estimated from token counts only if None
+        :param job_name: key of the job in the history, as costs of e.g. metric caching and scoring differ
+        :param momentum: weight of the previous cost in the exponential moving average
+        """
+        self._history_path = Path(history_path) if history_path is not None else None
+        self._job_name = job_name
+        self._momentum = momentum
+        self._cost_per_token: Dict[str, float] = {}
+        self._setup_time: Optional[float] = None
+        job_history = self._load().get(job_name, {})
+        if isinstance(job_history, dict):
+            self._cost_per_token = dict(job_history.get("cost_per_token", {}))
+            self._setup_time = job_history.get("setup_time", None)
+
+    def _load(self) -> Dict[str, Any]:
+        """
+        Helper function to load the histories of all jobs.
+        :return: dictionary of job names and their history, empty if the file does not exist
+        """
+        if self._history_path is None or not self._history_path.is_file():
+            return {}
+        with open(self._history_path, "r") as f:
+            return json.load(f)
+
+    @property
+    def setup_time(self) -> Optional[float]:
+        """
+        :return: estimated setup time per batch in seconds, None if unknown.
+        """
+        return self._setup_time
+
+    def get_cost_per_token(self, log_name: str) -> float:
+        """
+        :param log_name: name of the log
+        :return: estimated cost per token, the mean over all logs if the log is unknown and 1.0 without history.
+        """
+        if log_name in self._cost_per_token:
+            return self._cost_per_token[log_name]
+        if len(self._cost_per_token) > 0:
+            return float(np.mean(list(self._cost_per_token.values())))
+        return 1.0
+
+    def _update_average(self, previous: Optional[float], observed: float) -> float:
+        """
+        Helper function for the exponential moving average.
+        :param previous: previous estimate, None if unknown
+        :param observed: observed value
+        :return: updated estimate
+        """
+        if previous is None:
+            return observed
+        return self._momentum * previous + (1 - self._momentum) * observed
+
+    def update(self, batch_stats: List[BatchStats]) -> None:
+        """
+        Updates the cost per token of the logs and the setup time with the measured batches.
+        Logs with timed tokens are charged their own time, otherwise each log is charged the mean cost of the batch.
+        :param batch_stats: statistics of the executed batches
+        """
+        observed_costs: Dict[str, List[float]] = {}
+        observed_setup_times: List[float] = []
+        for stats in batch_stats:
+            total_tokens = sum(stats.num_tokens)
+            if total_tokens == 0:
+                continue
+            if stats.setup_time is not None:
+                observed_setup_times.append(stats.setup_time)
+            for log_name in stats.log_names:
+                if stats.num_timed_tokens.get(log_name, 0) > 0:
+                    observed_cost = stats.token_times[log_name] / stats.num_timed_tokens[log_name]
+                else:
+                    observed_cost = stats.duration / total_tokens
+                observed_costs.setdefault(log_name, []).append(observed_cost)
+
+        for log_name, costs in observed_costs.items():
+            self._cost_per_token[log_name] = self._update_average(
+                self._cost_per_token.get(log_name, None), float(np.mean(costs))
+            )
+        if len(observed_setup_times) > 0:
+            self._setup_time = self._update_average(self._setup_time, float(np.mean(observed_setup_times)))
+
+    def save(self) -> None:
+        """Writes the history of the job atomically, if a path is given. Histories of other jobs are kept."""
+        if self._history_path is None:
+            return
+        # entries of the former format without jobs (i.e. costs per log) are dropped
+        history = {job_name: job_history for job_name, job_history in self._load().items() if isinstance(job_history, dict)}
+        history[self._job_name] = {"cost_per_token": self._cost_per_token, "setup_time": self._setup_time}
+        self._history_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self._history_path.with_name(f"{self._history_path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(history, f)
+        os.replace(tmp_path, self._history_path)
+
+
+def build_token_batches(
+    tokens_list_per_log: Dict[str, List[str]],
+    cost_history: TokenCostHistory,
+    num_batches: int,
+    min_batch_size: int,
+    extra_items: Optional[Dict[str, Any]] = None,
+) -> List[List[DataPoint]]:
+    """
+    Splits the tokens into batches of similar estimated cost, ordered by decreasing cost.
+    Logs are split into contiguous chunks of at most the target cost, small chunks are packed together.
+    :param tokens_list_per_log: dictionary of log names and tokens
+    :param cost_history: estimator of the cost per token of each log
+    :param num_batches: targeted number of batches
+    :param min_batch_size: minimum number of tokens per batch, if available
+    :param extra_items: additional items of each data point, e.g. the config
+    :return: list of batches, where each batch is a list of data points with log name and tokens
+    """
+    extra_items = extra_items if extra_items is not None else {}
+    costs_per_token = {log_name: cost_history.get_cost_per_token(log_name) for log_name in tokens_list_per_log.keys()}
+    total_cost = sum(costs_per_token[log_name] * len(tokens) for log_name, tokens in tokens_list_per_log.items())
+    num_tokens = sum(len(tokens) for tokens in tokens_list_per_log.values())
+    if num_tokens == 0:
+        return []
+
+    mean_cost_per_token = total_cost / num_tokens
+    target_cost = max(total_cost / max(num_batches, 1), min_batch_size * mean_cost_per_token)
+
+    # split logs into chunks with at most the target cost
+    chunks: List[Tuple[float, str, List[str]]] = []
+    for log_name, tokens in tokens_list_per_log.items():
+        if len(tokens) == 0:
+            continue
+        chunk_size = max(int(target_cost / costs_per_token[log_name]), 1)
+        num_chunks = int(np.ceil(len(tokens) / chunk_size))
+        for chunk_tokens in np.array_split(np.array(tokens, dtype=object), num_chunks):
+            chunks.append((costs_per_token[log_name] * len(chunk_tokens), log_name, chunk_tokens.tolist()))
+
+    # pack chunks into batches with first-fit decreasing
+    chunks.sort(key=lambda chunk: chunk[0], reverse=True)
+    batch_costs: List[float] = []
+    batches: List[List[DataPoint]] = []
+    for cost, log_name, tokens in chunks:
+        data_point = {**extra_items, "log_file": log_name, "tokens": tokens}
+        for batch_idx, batch_cost in enumerate(batch_costs):
+            if batch_cost + cost <= target_cost:
+                batch_costs[batch_idx] += cost
+                batches[batch_idx].append(data_point)
+                break
+        else:
+            batch_costs.append(cost)
+            batches.append([data_point])
+
+    # split logs must still cover every token exactly once, which is checked before any work is dispatched
+    batched_tokens = [token for batch in batches for data_point in batch for token in data_point["tokens"]]
+    assert len(batched_tokens) == num_tokens and set(batched_tokens) == {
+        token for tokens in tokens_list_per_log.values() for token in tokens
+    }, "build_token_batches: batches do not cover every token exactly once!"
+
+    # the most expensive batches are dispatched first, such that cheap batches fill the gaps at the end
+    batch_order = np.argsort(batch_costs, kind="stable")[::-1]
+    return [batches[batch_idx] for batch_idx in batch_order]
+
+
+def log_worker_utilization(batch_stats: List[BatchStats]) -> Dict[str, Dict[str, float]]:
+    """
+    Logs the busy time, setup time outside of timed tokens, number of batches and tokens, and utilization of each worker.
+    :param batch_stats: statistics of the executed batches
+    :return: dictionary of worker ids and their utilization statistics
+    """
+    if len(batch_stats) == 0:
+        return {}
+    wall_time = max(stats.end_time for stats in batch_stats) - min(stats.start_time for stats in batch_stats)
+
+    utilization: Dict[str, Dict[str, float]] = {}
+    for stats in batch_stats:
+        worker_utilization = utilization.setdefault(
+            stats.worker_id, {"num_batches": 0, "num_tokens": 0, "busy_time": 0.0, "utilization": 0.0}
+        )
+        worker_utilization["num_batches"] += 1
+        worker_utilization["num_tokens"] += sum(stats.num_tokens)
+        worker_utilization["busy_time"] += stats.duration
+        if stats.setup_time is not None:
+            worker_utilization["setup_time"] = worker_utilization.get("setup_time", 0.0) + stats.setup_time
+    for worker_utilization in utilization.values():
+        worker_utilization["utilization"] = worker_utilization["busy_time"] / wall_time if wall_time > 0 else 1.0
+
+    lines: List[str] = []
+    for worker_id, u in sorted(utilization.items()):
+        setup = f" (setup {u['setup_time']:.1f}s)" if "setup_time" in u else ""
+        lines.append(
+            f"{worker_id}: {int(u['num_batches'])} batches, {int(u['num_tokens'])} tokens, "
+            f"busy {u['busy_time']:.1f}s{setup}, utilization {100 * u['utilization']:.1f}%"
+        )
+    mean_utilization = np.mean([u["utilization"] for u in utilization.values()])
+    logger.info(
+        f"Worker utilization over {wall_time:.1f}s wall time (mean {100 * mean_utilization:.1f}%):\n" + "\n".join(lines)
+    )
+    return utilization
+
+
+def token_batch_map(
+    worker: WorkerPool,
+    fn: Callable[..., List[Any]],
+    tokens_list_per_log: Dict[str, List[str]],
+    scheduler_cfg: DictConfig,
+    extra_items: Optional[Dict[str, Any]] = None,
+    job_name: Optional[str] = None,
+) -> List[Any]:
+    """
+    Maps tokens through a worker in size-balanced batches, instead of one static chunk of logs per worker as worker_map.
+    All worker pools dispatch the batches dynamically, such that idle workers pick up the remaining batches.
+    Logs may be split across batches, i.e. workers must only load the tokens of their batch (incl. synthetic scenes).
+    Workers should wrap the processing of each token in time_tokens, such that the cost history excludes their setup.
+    :param worker: worker pool to use for parallelization
+    :param fn: worker function, called with a list of data points containing "log_file" and "tokens"
+    :param tokens_list_per_log: dictionary of log names and tokens
+    :param scheduler_cfg: config of the scheduler, see default_common.yaml
+    :param extra_items: additional items of each data point, e.g. the config
+    :param job_name: key of the job in the cost history, defaults to the module and name of the worker function
+    :return: flattened list of the results of the worker function
+    """
+    job_name = job_name if job_name is not None else f"{fn.__module__}.{fn.__name__}"
+    cost_history = TokenCostHistory(scheduler_cfg.cost_history_path, job_name)
+    num_threads = max(worker.number_of_threads, 1)
+    batches = build_token_batches(
+        tokens_list_per_log,
+        cost_history,
+        num_batches=num_threads * scheduler_cfg.batches_per_worker,
+        min_batch_size=scheduler_cfg.min_batch_size,
+        extra_items=extra_items,
+    )
+    logger.info(
+        f"Scheduling {sum(len(tokens) for tokens in tokens_list_per_log.values())} tokens of "
+        f"{len(tokens_list_per_log)} logs in {len(batches)} batches on {num_threads} workers..."
+    )
+    if len(batches) == 0:
+        return []
+
+    task_fn = partial(_run_timed_batch, fn=fn)
+    if worker.number_of_threads == 0:
+        batch_results = [task_fn(batch) for batch in batches]
+    else:
+        batch_results = worker.map(Task(fn=task_fn), batches)
+
+    batch_stats = [stats for _, stats in batch_results]
+    log_worker_utilization(batch_stats)
+    cost_history.update(batch_stats)
+    if cost_history.setup_time is not None:
+        logger.info(f"Estimated setup time per batch of {job_name}: {cost_history.setup_time:.2f}s")
+    cost_history.save()
+    return [result for results, _ in batch_results for result in results]
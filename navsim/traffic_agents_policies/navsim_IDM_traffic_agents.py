@@ -8,10 +8,10 @@ from nuplan.common.actor_state.dynamic_car_state import DynamicCarState
 from nuplan.common.actor_state.ego_state import EgoState
 from nuplan.common.actor_state.state_representation import StateSE2, StateVector2D, TimeDuration, TimePoint
 from nuplan.common.actor_state.tracked_objects_types import TrackedObjectType
-from nuplan.common.maps.nuplan_map.map_factory import get_maps_api
 from nuplan.planning.simulation.observation.observation_type import DetectionsTracks
 from nuplan.planning.simulation.trajectory.trajectory_sampling import TrajectorySampling
 
+from navsim.common.map_registry import get_map_api
 from navsim.planning.metric_caching.metric_cache import MetricCache
 from navsim.planning.simulation.observation.navsim_idm_agents import NavsimIDMAgents
 from navsim.planning.simulation.planner.pdm_planner.utils.pdm_enums import StateIndex
@@ -86,7 +86,7 @@ class NavsimIDMTrafficAgents(AbstractTrafficAgentsPolicy):
         initial_ego_state = metric_cache.ego_state
         # map api
         map_root = self._map_root_override or metric_cache.map_parameters.map_root
-        map_api = get_maps_api(
+        map_api = get_map_api(
             map_root,
             metric_cache.map_parameters.map_version,
             metric_cache.map_parameters.map_name,
@@ -0,0 +1,115 @@
+from types import SimpleNamespace
+from typing import Dict, List
+
+import numpy as np
+import pytest
+import shapely
+
+pytest.importorskip("nuplan")
+
+from nuplan.common.actor_state.state_representation import Point2D  # noqa: E402
+from nuplan.common.maps.maps_datatypes import SemanticMapLayer  # noqa: E402
+
+from navsim.planning.simulation.planner.pdm_planner.observation.pdm_drivable_area_cache import (  # noqa: E402
+    DrivableAreaTileCache,
+)
+
+LAYERS = [
+    SemanticMapLayer.ROADBLOCK,
+    SemanticMapLayer.ROADBLOCK_CONNECTOR,
+    SemanticMapLayer.INTERSECTION,
+    SemanticMapLayer.CARPARK_AREA,
+]
+
+
+class _FakeMap:
+    """Map api returning the objects of each layer in the order of their rows, as the GPKG maps of nuPlan."""
+
+    map_name = "fake-map"
+
+    def __init__(self, seed: int, numeric_ids: bool = True, shuffle_rows: bool = False):
+        rng = np.random.default_rng(seed)
+        self._layers: Dict[SemanticMapLayer, List[SimpleNamespace]] = {}
+        feature_id = 0
+        for layer in LAYERS:
+            map_objects = []
+            for _ in range(300):
+                feature_id += int(rng.integers(1, 5))
+                x, y = rng.uniform(-500, 500, 2)
+                width, height = rng.uniform(2, 40, 2)
+                interior_edges = [
+                    SimpleNamespace(id=f"{feature_id}_{idx}", polygon=shapely.box(x, y + idx, x + width, y + idx + 1))
+                    for idx in range(rng.integers(0, 4))
+                ]
+                map_object_id = str(feature_id) if numeric_ids else f"object_{feature_id}"
+                map_objects.append(
+                    SimpleNamespace(
+                        id=map_object_id,
+                        polygon=shapely.box(x, y, x + width, y + height),
+                        interior_edges=interior_edges,
+                    )
+                )
+            if shuffle_rows:
+                rng.shuffle(map_objects)
+            self._layers[layer] = map_objects
+        self.num_queries = 0
+
+    def get_proximal_map_objects(
+        self, point: Point2D, radius: float, layers: List[SemanticMapLayer]
+    ) -> Dict[SemanticMapLayer, List[SimpleNamespace]]:
+        self.num_queries += 1
+        patch = shapely.box(point.x - radius, point.y - radius, point.x + radius, point.y + radius)
+        return {layer: [obj for obj in self._layers[layer] if obj.polygon.intersects(patch)] for layer in layers}
+
+
+def _sample_points(rng: np.random.Generator, num_points: int) -> List[Point2D]:
+    """Helper function to sample query points of neighbouring scenes, scattered scenes, and on tile corners."""
+    points = [Point2D(100.0 + dx, 100.0 + dy) for dx, dy in rng.normal(0, 5, (num_points, 2))]
+    points += [Point2D(x, y) for x, y in rng.uniform(-400, 400, (num_points, 2))]
+    points += [Point2D(64.0, -128.0), Point2D(0.0, 0.0)]
+    return points
+
+
+@pytest.mark.parametrize("max_bytes", [256 * 1024**2, 20000])
+def test_matches_map_api(max_bytes: int) -> None:
+    """Assembled map objects match the map api in ids, order, polygons and roadblock lanes, also with evictions."""
+    rng = np.random.default_rng(0)
+    map_api = _FakeMap(seed=0)
+    tile_cache = DrivableAreaTileCache(max_bytes, tile_size=64.0)
+    for point in _sample_points(rng, 50):
+        expected = map_api.get_proximal_map_objects(point, 50.0, LAYERS)
+        result = tile_cache.get_proximal_map_objects(map_api, point, 50.0, LAYERS)
+        for layer in LAYERS:
+            assert [obj.id for obj in result[layer]] == [obj.id for obj in expected[layer]]
+            for obj, expected_obj in zip(result[layer], expected[layer]):
+                assert obj.polygon.equals(expected_obj.polygon)
+                if layer in [SemanticMapLayer.ROADBLOCK, SemanticMapLayer.ROADBLOCK_CONNECTOR]:
+                    assert [edge.id for edge in obj.interior_edges] == [edge.id for edge in expected_obj.interior_edges]
+
+    stats = tile_cache.get_stats()
+    assert stats["hits"] > 0 and stats["num_forwarded"] == 0
+    assert stats["num_bytes"] <= max_bytes
+
+
+def test_non_numeric_ids_are_forwarded() -> None:
+    """Queries with non-numeric ids return the map api result, since their order is unknown."""
+    map_api = _FakeMap(seed=1, numeric_ids=False)
+    tile_cache = DrivableAreaTileCache(256 * 1024**2)
+    point = Point2D(10.0, 10.0)
+    result = tile_cache.get_proximal_map_objects(map_api, point, 50.0, LAYERS)
+    expected = map_api.get_proximal_map_objects(point, 50.0, LAYERS)
+    for layer in LAYERS:
+        assert [obj.id for obj in result[layer]] == [obj.id for obj in expected[layer]]
+    assert tile_cache.get_stats()["num_forwarded"] == 1
+
+
+def test_check_equivalence() -> None:
+    """The equivalence check detects maps which do not return objects in the order of their feature ids."""
+    point = Point2D(10.0, 10.0)
+    DrivableAreaTileCache(256 * 1024**2, check_equivalence=True).get_proximal_map_objects(
+        _FakeMap(seed=2), point, 50.0, LAYERS
+    )
+    with pytest.raises(AssertionError, match="differ from the map api"):
+        DrivableAreaTileCache(256 * 1024**2, check_equivalence=True).get_proximal_map_objects(
+            _FakeMap(seed=2, shuffle_rows=True), point, 50.0, LAYERS
+        )
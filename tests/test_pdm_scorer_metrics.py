@@ -0,0 +1,320 @@
+import os
+from pathlib import Path
+from typing import List, Tuple
+
+import numpy as np
+import numpy.typing as npt
+import pandas as pd
+import pytest
+import shapely
+
+pytest.importorskip("nuplan")
+
+from nuplan.common.actor_state.state_representation import Point2D, StateSE2  # noqa: E402
+from nuplan.common.actor_state.tracked_objects import TrackedObjects  # noqa: E402
+from nuplan.common.actor_state.vehicle_parameters import get_pacifica_parameters  # noqa: E402
+from nuplan.common.maps.maps_datatypes import SemanticMapLayer  # noqa: E402
+from nuplan.planning.simulation.observation.observation_type import DetectionsTracks  # noqa: E402
+from nuplan.planning.simulation.trajectory.trajectory_sampling import TrajectorySampling  # noqa: E402
+
+from navsim.planning.simulation.planner.pdm_planner.observation.pdm_observation import PDMObservation  # noqa: E402
+from navsim.planning.simulation.planner.pdm_planner.observation.pdm_occupancy_map import PDMDrivableMap  # noqa: E402
+from navsim.planning.simulation.planner.pdm_planner.scoring.pdm_scorer import PDMScorer, PDMScorerConfig  # noqa: E402
+from navsim.planning.simulation.planner.pdm_planner.utils.pdm_enums import (  # noqa: E402
+    BBCoordsIndex,
+    EgoAreaIndex,
+    StateIndex,
+)
+from navsim.planning.simulation.planner.pdm_planner.utils.pdm_path import PDMPath  # noqa: E402
+
+# Metric caches are not part of the repository, such that the metrics are compared on synthetic scenes by default,
+# which also cover their boundary cases. Set NAVSIM_TEST_METRIC_CACHE_PATH to additionally compare them on a metric cache.
+METRIC_CACHE_PATH = os.environ.get("NAVSIM_TEST_METRIC_CACHE_PATH")
+NUM_METRIC_CACHE_TOKENS = 20
+
+NUM_PROPOSALS = 16
+NUM_POSES = 40
+INTERVAL_LENGTH = 0.1
+CONFIG = PDMScorerConfig()
+VEHICLE_PARAMETERS = get_pacifica_parameters()
+
+
+def _make_drivable_map(rng: np.random.Generator, with_raster: bool) -> Tuple[PDMDrivableMap, List[str]]:
+    """Helper function to build a drivable area map of random lanes, roadblocks and intersections, and a route."""
+    geometries: List[shapely.Polygon] = []
+    map_types: List[SemanticMapLayer] = []
+    for _ in range(12):
+        x, y = rng.uniform(-10, 80, 2)
+        geometries.append(shapely.box(x, y, x + rng.uniform(3, 15), y + rng.uniform(3, 15)))
+        map_types.append(SemanticMapLayer.INTERSECTION)
+    for _ in range(30):
+        x, y = rng.uniform(-10, 80, 2)
+        geometries.append(shapely.box(x, y, x + 30, y + 3.5))
+        map_types.append([SemanticMapLayer.LANE, SemanticMapLayer.ROADBLOCK][rng.integers(2)])
+
+    # intersection whose boundary lies exactly at the lane keeping deviation limit of the centerline
+    geometries.append(shapely.box(0, -0.5, 20, 0.5))
+    map_types.append(SemanticMapLayer.INTERSECTION)
+    # lane of the straight part of the centerline, in a roadblock such that proposals close to it are drivable
+    geometries.append(shapely.box(-20, -1.75, 30, 1.75))
+    map_types.append(SemanticMapLayer.LANE)
+    geometries.append(shapely.box(-40, -6, 120, 6))
+    map_types.append(SemanticMapLayer.ROADBLOCK)
+
+    tokens = [str(idx) for idx in range(len(geometries))]
+    route_lane_ids = [
+        token for idx, token in enumerate(tokens) if map_types[idx] == SemanticMapLayer.LANE and idx % 2 == 1
+    ]
+    drivable_map = PDMDrivableMap(tokens, map_types, geometries)
+    if with_raster:
+        drivable_map.build_raster(Point2D(30.0, 0.0), radius=64.0, resolution=0.5)
+    return drivable_map, route_lane_ids
+
+
+def _make_centerline() -> PDMPath:
+    """Helper function to build a centerline, straight along the x-axis up to x=30 and curved afterwards."""
+    xs = np.linspace(-20, 100, 241)
+    ys = np.where(xs < 30, 0.0, 3 * np.sin((xs - 30) / 15))
+    headings = np.arctan2(np.gradient(ys), np.gradient(xs))
+    return PDMPath([StateSE2(x, y, heading) for x, y, heading in zip(xs, ys, headings)])
+
+
+def _make_centers(rng: np.random.Generator) -> Tuple[npt.NDArray[np.float64], npt.NDArray[np.float64]]:
+    """Helper function to sample ego centers and headings of proposals, including boundary cases of the metrics."""
+    time_s = np.arange(NUM_POSES + 1) * INTERVAL_LENGTH
+    speeds = rng.uniform(0, 15, NUM_PROPOSALS)
+    headings = rng.normal(0, 0.15, NUM_PROPOSALS)
+    centers = np.zeros((NUM_PROPOSALS, NUM_POSES + 1, 2), dtype=np.float64)
+    centers[..., 0] = speeds[:, None] * time_s * np.cos(headings)[:, None]
+    centers[..., 1] = (
+        speeds[:, None] * time_s * np.sin(headings)[:, None]
+        + rng.normal(0, 1.0, NUM_PROPOSALS)[:, None]
+        + rng.normal(0, 0.3, (NUM_PROPOSALS, NUM_POSES + 1))
+    )
+
+    headings[:4] = 0.0
+    # deviations exactly at the limit, on the boundary of an intersection
+    centers[0, :, 0] = np.linspace(-5, 25, NUM_POSES + 1)
+    centers[0, :, 1] = 0.0
+    centers[0, ::3, 1] = 0.5
+    # deviations exactly at the limit, outside of intersections
+    centers[1, :, 0] = np.linspace(-19, -1, NUM_POSES + 1)
+    centers[1, :, 1] = -0.5
+    # standing on the corner of an intersection
+    centers[2, 10:20] = [20.0, 0.5]
+    # driving backwards
+    centers[3, :, 0] = -10 * time_s
+    return centers, headings
+
+
+def _score(
+    centers: npt.NDArray[np.float64],
+    headings: npt.NDArray[np.float64],
+    drivable_map: PDMDrivableMap,
+    route_lane_ids: List[str],
+) -> Tuple[PDMScorer, pd.DataFrame]:
+    """Helper function to score proposals with given ego centers in a scene without other agents."""
+    sampling = TrajectorySampling(num_poses=NUM_POSES, interval_length=INTERVAL_LENGTH)
+    states = np.zeros((*centers.shape[:2], StateIndex.size()), dtype=np.float64)
+    states[..., StateIndex.HEADING] = headings[:, None]
+    rear_axle_offsets = np.stack([np.cos(headings), np.sin(headings)], axis=-1) * VEHICLE_PARAMETERS.rear_axle_to_center
+    states[..., StateIndex.POINT] = centers - rear_axle_offsets[:, None]
+
+    observation = PDMObservation(sampling, sampling, map_radius=100.0)
+    num_detections_tracks = NUM_POSES + int(1 / INTERVAL_LENGTH) + 1
+    observation.update_detections_tracks(
+        [DetectionsTracks(TrackedObjects([]))] * num_detections_tracks,
+        traffic_light_data=[[]] * num_detections_tracks,
+        route_lane_dict={},
+        compute_traffic_light_data=True,
+    )
+
+    scorer = PDMScorer(sampling, CONFIG, VEHICLE_PARAMETERS)
+    results = scorer.score_proposals(states, observation, _make_centerline(), route_lane_ids, drivable_map)
+    return scorer, pd.concat(results, ignore_index=True)
+
+
+def _make_scored_scene(seed: int, with_raster: bool) -> Tuple[PDMScorer, pd.DataFrame]:
+    """Helper function to score synthetic proposals in a synthetic scene."""
+    rng = np.random.default_rng(seed)
+    centers, headings = _make_centers(rng)
+    return _score(centers, headings, *_make_drivable_map(rng, with_raster))
+
+
+def _driving_direction_compliance_loop(scorer: PDMScorer) -> npt.NDArray[np.float64]:
+    """Reference loop implementation of the driving direction compliance metric, on the inputs of the last scoring."""
+    config, num_poses = CONFIG, scorer.proposal_sampling.num_poses
+    center_coordinates = scorer._ego_coords[:, :, BBCoordsIndex.CENTER]
+    oncoming_progress = np.zeros((scorer._num_proposals, num_poses + 1), dtype=np.float64)
+    oncoming_progress[:, 1:] = np.linalg.norm(center_coordinates[:, 1:] - center_coordinates[:, :-1], axis=-1)
+    oncoming_traffic_masks = scorer._ego_areas[:, :, EgoAreaIndex.ONCOMING_TRAFFIC]
+    for proposal_idx in range(scorer._num_proposals):
+        for time_idx in range(num_poses + 1):
+            ego_position = shapely.Point(*center_coordinates[proposal_idx, time_idx])
+            is_in_intersection = scorer._drivable_area_map.is_in_layer(ego_position, SemanticMapLayer.INTERSECTION)
+            if not oncoming_traffic_masks[proposal_idx, time_idx] or is_in_intersection:
+                oncoming_progress[proposal_idx, time_idx] = 0.0
+
+    scores = np.ones(scorer._num_proposals, dtype=np.float64)
+    horizon = int(config.driving_direction_horizon / scorer.proposal_sampling.interval_length)
+    for proposal_idx in range(scorer._num_proposals):
+        max_oncoming_progress = max(
+            oncoming_progress[proposal_idx, max(0, time_idx - horizon) : time_idx + 1].sum()
+            for time_idx in range(num_poses + 1)
+        )
+        if max_oncoming_progress < config.driving_direction_compliance_threshold:
+            scores[proposal_idx] = 1.0
+        elif max_oncoming_progress < config.driving_direction_violation_threshold:
+            scores[proposal_idx] = 0.5
+        else:
+            scores[proposal_idx] = 0.0
+    return scores
+
+
+def _progress_loop(scorer: PDMScorer) -> npt.NDArray[np.float64]:
+    """Reference loop implementation of the raw progress metric, on the inputs of the last scoring."""
+    progress_in_meter = np.zeros(scorer._num_proposals, dtype=np.float64)
+    for proposal_idx in range(scorer._num_proposals):
+        start_point = shapely.Point(*scorer._ego_coords[proposal_idx, 0, BBCoordsIndex.CENTER])
+        end_point = shapely.Point(*scorer._ego_coords[proposal_idx, -1, BBCoordsIndex.CENTER])
+        progress = scorer._centerline.project([start_point, end_point])
+        progress_in_meter[proposal_idx] = progress[1] - progress[0]
+    return np.clip(progress_in_meter, a_min=0, a_max=None)
+
+
+def _lane_keeping_loop(scorer: PDMScorer) -> npt.NDArray[np.float64]:
+    """Reference loop implementation of the lane keeping metric, on the inputs of the last scoring."""
+    config = CONFIG
+    scores = np.ones(scorer._num_proposals, dtype=np.float64)
+    continuous_steps_required = int(
+        np.ceil(config.lane_keeping_horizon_window / scorer.proposal_sampling.interval_length)
+    )
+    for proposal_idx in range(scorer._num_proposals):
+        consecutive_exceeds = 0
+        for time_idx in range(scorer.proposal_sampling.num_poses + 1):
+            ego_position = shapely.Point(*scorer._ego_coords[proposal_idx, time_idx, BBCoordsIndex.CENTER])
+            if scorer._drivable_area_map.is_in_layer(ego_position, layer=SemanticMapLayer.INTERSECTION):
+                continue
+            if ego_position.distance(scorer._centerline.linestring) > config.lane_keeping_deviation_limit:
+                consecutive_exceeds += 1
+            else:
+                consecutive_exceeds = 0
+            if consecutive_exceeds >= continuous_steps_required:
+                scores[proposal_idx] = 0.0
+                break
+    return scores
+
+
+def _normalized_progress(progress_raw: npt.NDArray[np.float64], results: pd.DataFrame) -> npt.NDArray[np.float64]:
+    """Helper function to normalize raw progress by the best progress of proposals without multiplicative penalties."""
+    norm_constant_progress = np.max(progress_raw * results["multiplicative_metrics_prod"].to_numpy())
+    if norm_constant_progress > CONFIG.progress_distance_threshold:
+        return np.clip(progress_raw / norm_constant_progress, 0.0, 1.0)
+    return np.ones(len(progress_raw), dtype=np.float64)
+
+
+def _assert_metrics_match_loops(scorer: PDMScorer, results: pd.DataFrame) -> None:
+    """Helper function to compare the scored metrics with the loop implementations."""
+    np.testing.assert_array_equal(
+        results["driving_direction_compliance"].to_numpy(), _driving_direction_compliance_loop(scorer)
+    )
+    np.testing.assert_array_equal(
+        results["ego_progress"].to_numpy(), _normalized_progress(_progress_loop(scorer), results)
+    )
+    np.testing.assert_array_equal(results["lane_keeping"].to_numpy(), _lane_keeping_loop(scorer))
+
+
+@pytest.mark.parametrize("seed", range(10))
+@pytest.mark.parametrize("with_raster", [False, True])
+def test_driving_direction_compliance(seed: int, with_raster: bool) -> None:
+    """Vectorized driving direction compliance matches the loop implementation."""
+    scorer, results = _make_scored_scene(seed, with_raster)
+    np.testing.assert_array_equal(
+        results["driving_direction_compliance"].to_numpy(), _driving_direction_compliance_loop(scorer)
+    )
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_progress(seed: int) -> None:
+    """Vectorized progress matches the loop implementation."""
+    scorer, results = _make_scored_scene(seed, with_raster=False)
+    np.testing.assert_array_equal(
+        results["ego_progress"].to_numpy(), _normalized_progress(_progress_loop(scorer), results)
+    )
+
+
+@pytest.mark.parametrize("seed", range(10))
+@pytest.mark.parametrize("with_raster", [False, True])
+def test_lane_keeping(seed: int, with_raster: bool) -> None:
+    """Vectorized lane keeping matches the loop implementation."""
+    scorer, results = _make_scored_scene(seed, with_raster)
+    expected = _lane_keeping_loop(scorer)
+    np.testing.assert_array_equal(results["lane_keeping"].to_numpy(), expected)
+
+    # deviations at the limit do not fail lane keeping, in and outside of intersections
+    assert expected[0] == 1.0 and expected[1] == 1.0
+
+
+def test_lane_keeping_intersection_does_not_reset() -> None:
+    """Steps in intersections neither extend nor interrupt a lateral deviation."""
+    rng = np.random.default_rng(0)
+    centers, headings = _make_centers(rng)
+    continuous_steps_required = int(np.ceil(CONFIG.lane_keeping_horizon_window / INTERVAL_LENGTH))
+    deviation = 1.0 + CONFIG.lane_keeping_deviation_limit
+    headings[4:6] = 0.0
+    centers[4] = [-10.0, deviation]  # deviating outside of intersections
+    centers[4, continuous_steps_required // 2 :: 2] = [10.0, 0.0]  # alternating with steps in an intersection
+    centers[5] = [-10.0, deviation]
+    centers[5, continuous_steps_required - 1 :: continuous_steps_required] = [-10.0, 0.0]  # interrupted on the lane
+
+    scorer, results = _score(centers, headings, *_make_drivable_map(rng, with_raster=False))
+    scores = results["lane_keeping"].to_numpy()
+    np.testing.assert_array_equal(scores, _lane_keeping_loop(scorer))
+    assert scores[4] == 0.0 and scores[5] == 1.0
+
+
+@pytest.mark.skipif(METRIC_CACHE_PATH is None, reason="NAVSIM_TEST_METRIC_CACHE_PATH is not set")
+def test_metrics_on_metric_cache() -> None:
+    """Vectorized metrics match the loop implementations on proposals around the PDM-Closed and human trajectory."""
+    from navsim.common.dataloader import MetricCacheLoader
+    from navsim.planning.script.run_pdm_scorer_benchmark import build_proposals
+    from navsim.planning.simulation.planner.pdm_planner.simulation.pdm_simulator import PDMSimulator
+
+    sampling = TrajectorySampling(num_poses=NUM_POSES, interval_length=INTERVAL_LENGTH)
+    simulator = PDMSimulator(sampling)
+    metric_cache_loader = MetricCacheLoader(Path(METRIC_CACHE_PATH))
+    for seed, token in enumerate(metric_cache_loader.tokens[:NUM_METRIC_CACHE_TOKENS]):
+        metric_cache = metric_cache_loader.get_from_token(token)
+        scorer = PDMScorer(sampling, CONFIG)
+        results = scorer.score_proposals(
+            build_proposals(metric_cache, simulator, NUM_PROPOSALS, seed),
+            metric_cache.observation,
+            metric_cache.centerline,
+            metric_cache.route_lane_ids,
+            metric_cache.drivable_area_map,
+        )
+        _assert_metrics_match_loops(scorer, pd.concat(results, ignore_index=True))
+
+
+@pytest.mark.parametrize("with_raster", [False, True])
+def test_points_in_layer(with_raster: bool) -> None:
+    """Vectorized layer lookup matches is_in_layer, also on polygon vertices and edges."""
+    rng = np.random.default_rng(0)
+    drivable_map, _ = _make_drivable_map(rng, with_raster)
+
+    vertices = shapely.get_coordinates(drivable_map.geometries)
+    edge_points = vertices[:-1] + rng.uniform(0, 1, (len(vertices) - 1, 1)) * (vertices[1:] - vertices[:-1])
+    points = np.concatenate(
+        [
+            rng.uniform(-20, 100, (2000, 2)),
+            vertices,
+            edge_points,
+            np.round(rng.uniform(-20, 100, (500, 2)) * 2) / 2,  # raster cell corners
+            [[200.0, 200.0]],  # outside of the raster
+        ]
+    )
+
+    for layer in [SemanticMapLayer.INTERSECTION, SemanticMapLayer.LANE, SemanticMapLayer.ROADBLOCK]:
+        expected = np.array([drivable_map.is_in_layer(Point2D(x, y), layer) for x, y in points])
+        np.testing.assert_array_equal(drivable_map.points_in_layer(points, layer), expected)
+        np.testing.assert_array_equal(drivable_map.points_in_layer(points[None], layer), expected[None])